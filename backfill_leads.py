@@ -0,0 +1,286 @@
+"""
+PARE India AI Assistant - Lead Backfill
+Recovers leads from stored conversation transcripts that live capture missed.
+
+When the agent never called the lead capture tool, a customer's city and
+square footage are still in the transcript. This script streams transcript
+files, extracts location, requirement type and quantity with the local rules
+in src/modules/lead_extraction.py, merges them with the lead data captured
+live, and writes the leads that are complete only after the merge, one per
+session, ready for bulk upload to the CRM.
+
+Transcripts are JSONL, one conversation per line: {"session_id", "lead_data",
+"messages": [{"role", "content"}]}. Saved sessions (SessionState.to_dict,
+with "memory" instead of "messages") are accepted too. Files ending in .gz
+are decompressed on the fly. Lines are read lazily and handed to a process
+pool in chunks, with a bounded number of chunks in flight, so memory stays
+flat however many transcripts there are.
+
+The report compares extraction with live capture for each field: how many
+sessions had the field captured live, how many of those the rules found too
+(recall against live capture), and how many more the rules filled in.
+
+Usage:
+    python backfill_leads.py transcripts.jsonl [more.jsonl.gz ...]
+    python backfill_leads.py transcripts.jsonl --workers 8 --output data/backfill_leads.jsonl
+    python backfill_leads.py transcripts.jsonl --upload     # also deliver the leads to the CRM
+"""
+
+import argparse
+import gzip
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from src.modules.lead_capture import LEAD_FIELDS, LEAD_FORM
+from src.modules.lead_extraction import extract_lead_fields, merge_lead_data, summary_messages
+
+DEFAULT_OUTPUT_PATH = os.path.join("data", "backfill_leads.jsonl")
+DEFAULT_REPORT_PATH = "backfill_report.json"
+DEFAULT_CHUNK_SIZE = 2000  # transcripts per task sent to a worker process
+DEFAULT_UPLOAD_BATCH = 50  # leads per CRM request when uploading
+
+# Chunks queued per worker process; bounds memory while keeping every worker busy
+CHUNKS_PER_WORKER = 2
+
+FIELDS = [field["name"] for field in LEAD_FIELDS]
+
+# One processed transcript: (sequence number, session id, captured lead data, extracted lead data)
+Result = Tuple[int, str, Dict[str, Optional[str]], Dict[str, Optional[str]]]
+
+
+def read_lines(paths: Iterable[str]) -> Iterator[str]:
+    """Yield the non-empty lines of each transcript file in turn."""
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield line
+
+
+def chunked(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Group lines into lists of up to `size`."""
+    iterator = iter(lines)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def transcript_messages(record: Dict) -> List[Dict[str, str]]:
+    """Messages of a transcript, oldest first, from either transcript format."""
+    if "messages" in record:
+        return record["messages"]
+    memory = record.get("memory") or {}
+    return summary_messages(memory.get("summary_lines", [])) + memory.get("recent", [])
+
+
+def process_chunk(first: int, lines: List[str]) -> Tuple[List[Result], int]:
+    """Extract lead fields from a chunk of transcript lines. Runs in a worker process."""
+    results = []
+    invalid = 0
+    for offset, line in enumerate(lines):
+        try:
+            record = json.loads(line)
+            session_id = str(record["session_id"])
+        except (ValueError, KeyError, TypeError):
+            invalid += 1
+            continue
+        live = record.get("lead_data") or {}
+        captured = {field: live.get(field) or None for field in FIELDS}
+        extracted = extract_lead_fields(transcript_messages(record))
+        results.append((first + offset, session_id, captured, extracted))
+    return results, invalid
+
+
+class RecallReport:
+    """Field-by-field comparison of rule extraction with live capture."""
+
+    def __init__(self):
+        self.transcripts = 0
+        self.invalid = 0
+        self.fields = {field: {"live": 0, "extracted": 0, "found_live": 0, "agree": 0, "filled": 0} for field in FIELDS}
+        self.complete_live = 0
+        self.complete_merged = 0
+
+    def add(self, captured: Dict[str, Optional[str]], extracted: Dict[str, Optional[str]]):
+        self.transcripts += 1
+        for field, counts in self.fields.items():
+            live, found = captured.get(field), extracted.get(field)
+            counts["live"] += bool(live)
+            counts["extracted"] += bool(found)
+            if live and found:
+                counts["found_live"] += 1
+                counts["agree"] += _same_value(field, live, found)
+            elif found:
+                counts["filled"] += 1
+        self.complete_live += LEAD_FORM.is_complete(captured)
+        self.complete_merged += LEAD_FORM.is_complete(merge_lead_data(captured, extracted))
+
+    def to_dict(self) -> Dict:
+        fields = {}
+        for field, counts in self.fields.items():
+            fields[field] = dict(counts)
+            fields[field]["live_rate"] = _rate(counts["live"], self.transcripts)
+            fields[field]["merged_rate"] = _rate(counts["live"] + counts["filled"], self.transcripts)
+            fields[field]["recall_vs_live"] = _rate(counts["found_live"], counts["live"])
+            fields[field]["agreement"] = _rate(counts["agree"], counts["found_live"])
+        return {
+            "transcripts": self.transcripts,
+            "invalid_lines": self.invalid,
+            "complete_live": self.complete_live,
+            "complete_merged": self.complete_merged,
+            "fields": fields,
+        }
+
+
+def _rate(count: int, total: int) -> float:
+    return round(count / total, 4) if total else 0.0
+
+
+def _same_value(field: str, live: str, found: str) -> bool:
+    # Live values are written many ways ("Bombay", "1200"); compare them in canonical form, as the form parses them
+    live = LEAD_FORM.parse(field, live, asked=True) or live
+    return live.strip().lower() == found.strip().lower()
+
+
+def run_backfill(
+    paths: List[str],
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[Dict[str, Dict[str, Optional[str]]], RecallReport]:
+    """
+    Process transcript files and return the recovered leads by session id, and the recall report.
+
+    A lead is recovered when merging extracted fields completes it and it was
+    not complete from live capture, since live capture already sent those to
+    the CRM. A session that appears more than once (say, in two exports) is
+    judged by its last transcript.
+    """
+    workers = workers or os.cpu_count() or 1
+    report = RecallReport()
+    latest: Dict[str, Tuple[int, bool, Optional[Dict[str, Optional[str]]]]] = {}
+
+    def collect(future: Future):
+        results, invalid = future.result()
+        report.invalid += invalid
+        for sequence, session_id, captured, extracted in results:
+            report.add(captured, extracted)
+            previous = latest.get(session_id)
+            if previous is not None and previous[0] > sequence:
+                continue
+            merged = merge_lead_data(captured, extracted)
+            recovered = LEAD_FORM.is_complete(merged) and not LEAD_FORM.is_complete(captured)
+            # Only recovered leads keep their data; other sessions cost one small tuple
+            latest[session_id] = (sequence, recovered, merged if recovered else None)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Set[Future] = set()
+        first = 0
+        for chunk in chunked(read_lines(paths), chunk_size):
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future)
+            pending.add(pool.submit(process_chunk, first, chunk))
+            first += len(chunk)
+        for future in pending:
+            collect(future)
+
+    leads = {session_id: merged for session_id, (_, recovered, merged) in latest.items() if recovered}
+    return leads, report
+
+
+def backfill_lead(session_id: str, lead_data: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """CRM lead for a recovered session, tagged so that sales can tell it from live capture."""
+    lead = {key: value for key, value in lead_data.items() if value}
+    lead["session_id"] = session_id
+    lead["source"] = "transcript_backfill"
+    return lead
+
+
+def write_leads(leads: Dict[str, Dict[str, Optional[str]]], path: str) -> int:
+    """Write recovered leads as JSONL, one CRM lead per line."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for session_id, lead_data in leads.items():
+            f.write(json.dumps(backfill_lead(session_id, lead_data), ensure_ascii=False) + "\n")
+    return len(leads)
+
+
+def upload_leads(leads: Dict[str, Dict[str, Optional[str]]], batch_size: int = DEFAULT_UPLOAD_BATCH) -> Dict:
+    """
+    Deliver recovered leads through the CRM delivery pipeline, batched, and return its metrics.
+
+    Leads go through the lead index first, so a customer who is already in
+    the CRM is updated rather than posted again.
+    """
+    from src.utils.crm import DEFAULT_SPOOL_PATH, LeadDeliveryPipeline
+    from src.utils.lead_index import get_lead_index
+
+    pipeline = LeadDeliveryPipeline(
+        spool_path=os.getenv("CRM_SPOOL_PATH", DEFAULT_SPOOL_PATH),
+        batch_size=batch_size,
+    ).start()
+    for session_id, lead_data in leads.items():
+        # Wait for room rather than overflow; overflowed leads would only go out on the next start
+        while pipeline.queue.full():
+            time.sleep(0.05)
+        _, lead = get_lead_index().resolve(backfill_lead(session_id, lead_data), session_id=session_id)
+        if lead is not None:
+            pipeline.submit(lead)
+    pipeline.stop(timeout=max(60.0, len(leads) / batch_size))
+    return pipeline.metrics()
+
+
+def print_report(report: Dict, leads: int, elapsed: float):
+    print(
+        f"Processed {report['transcripts']} transcripts in {elapsed:.1f}s "
+        f"({report['transcripts'] / elapsed if elapsed else 0:.0f}/s), {report['invalid_lines']} invalid lines"
+    )
+    print(f"Complete leads: {report['complete_live']} live, {report['complete_merged']} after extraction")
+    print(f"Recovered leads: {leads}")
+    print(f"\n{'field':<18}{'live':>10}{'merged':>10}{'recall':>10}{'agree':>10}{'filled':>10}")
+    for field, stats in report["fields"].items():
+        print(
+            f"{field:<18}{stats['live_rate']:>10.1%}{stats['merged_rate']:>10.1%}"
+            f"{stats['recall_vs_live']:>10.1%}{stats['agreement']:>10.1%}{stats['filled']:>10}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recover leads from conversation transcripts.")
+    parser.add_argument("paths", nargs="+", help="transcript JSONL files (.jsonl or .jsonl.gz)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="where to write the recovered leads")
+    parser.add_argument("--report", default=DEFAULT_REPORT_PATH, help="where to write the recall report")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="transcripts per worker task")
+    parser.add_argument("--upload", action="store_true", help="deliver the recovered leads to the CRM")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_UPLOAD_BATCH, help="leads per CRM request")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    leads, report = run_backfill(args.paths, workers=args.workers, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    result = report.to_dict()
+    print_report(result, len(leads), elapsed)
+    print(f"\nWrote {write_leads(leads, args.output)} leads to {args.output}")
+    with open(args.report, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"Report saved to {args.report}")
+
+    if args.upload:
+        metrics = upload_leads(leads, batch_size=args.batch_size)
+        print(f"CRM upload: {metrics['delivered']} delivered, {metrics['failed']} failed, {metrics['requests']} requests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+PARE India AI Assistant - Benchmark Suite
+Measures the overhead PareAgent adds on top of the model, without an API key.
+
+The agent runs against a MockModel with zero latency, so every millisecond
+measured here is spent in our own code and the Agents SDK. Cold start (import
+and first construction) is measured in fresh interpreters. Results can be
+saved as a baseline; later runs compare against it and exit with status 1
+when a metric regresses beyond the threshold.
+
+Usage:
+    python benchmark.py                         # print results
+    python benchmark.py --save-baseline         # save results as the baseline
+    python benchmark.py --check                 # compare against the baseline
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from typing import Callable, Dict
+
+from agents import RunContextWrapper, set_tracing_disabled
+
+from src.agent import PareAgent
+from src.utils.mock_model import MockModel, ends_with_tool_output, tool_call
+from src.utils.session_store import InMemorySessionStore
+
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+
+# A metric regresses when it grows by more than this fraction of its baseline...
+DEFAULT_THRESHOLD = 0.25
+# ...and, for timings, by more than this many milliseconds (sub-millisecond timings are noisy)
+MIN_TIME_DELTA_MS = 0.05
+
+# Fresh interpreters started by the startup benchmark (each takes about a second)
+STARTUP_RUNS = 5
+
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+from src.agent import PareAgent
+imported = time.perf_counter()
+from src.utils.mock_model import MockModel
+from src.utils.session_store import InMemorySessionStore
+model, store = MockModel(), InMemorySessionStore()
+constructing = time.perf_counter()
+PareAgent(model=model, session_store=store)
+done = time.perf_counter()
+print(json.dumps({"import_agent_ms": (imported - start) * 1000, "first_construction_ms": (done - constructing) * 1000}))
+"""
+
+# History lengths (user/assistant exchanges) for the instruction size benchmark
+HISTORY_LENGTHS = [0, 2, 8, 32, 128]
+
+# Arguments for each tool in the dispatch benchmark
+TOOL_ARGUMENTS = {
+    "tool_company_info": {},
+    "tool_product_info": {"product_category": "ceiling"},
+    "tool_lead_capture": {"field": "location", "value": "Pune"},
+    "tool_pricing_info": {},
+    "tool_support_request": {"request_type": "callback"},
+    "tool_send_brochure": {"brochure_type": "easy+"},
+}
+
+
+def _median_ms(func: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _benchmark_responder(input):
+    # Product questions call the product tool; everything else gets a text reply
+    if ends_with_tool_output(input):
+        return "Here is what I found."
+    text = input if isinstance(input, str) else str(input[-1].get("content", ""))
+    if "panel" in text.lower():
+        return tool_call("tool_product_info", product_category="wall")
+    return "We would be happy to help with your project. Could you tell me more about it?"
+
+
+def _new_agent(**kwargs) -> PareAgent:
+    return PareAgent(model=MockModel(responder=_benchmark_responder), session_store=InMemorySessionStore(), **kwargs)
+
+
+def bench_construction(repeat: int) -> Dict[str, float]:
+    """Time to build another PareAgent once the shared agent definition exists."""
+    return {"construction_ms": _median_ms(_new_agent, repeat)}
+
+
+def bench_startup(repeat: int) -> Dict[str, float]:
+    """Cold start in a fresh interpreter: importing src.agent, then building the first PareAgent."""
+    timings = {"import_agent_ms": [], "first_construction_ms": []}
+    for _ in range(min(repeat, STARTUP_RUNS)):
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            capture_output=True, text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout
+        for name, value in json.loads(output).items():
+            timings[name].append(value)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def bench_prompt(repeat: int) -> Dict[str, float]:
+    """Time and size of the model input built for a turn as the conversation grows."""
+    agent = _new_agent()
+    results = {}
+    for turns in HISTORY_LENGTHS:
+        session = agent.sessions.get(f"history-{turns}")
+        session.lead_data.update({"location": "Pune", "requirement_type": "Residential"})
+        for i in range(turns):
+            session.add_to_history("user", f"Message {i}: we need wall panels for a 3BHK flat, around 1200 sqft")
+            session.add_to_history("assistant", f"Reply {i}. Our Linea and Pyramid wall panels suit homes well. What finish do you like?")
+        message = "Which finish would you suggest for the living room?"
+        results[f"prompt_{turns}_turns_ms"] = _median_ms(lambda: agent.build_input(session, message), repeat)
+        items = agent.build_input(session, message)
+        results[f"prompt_{turns}_turns_items"] = len(items)
+        results[f"prompt_{turns}_turns_tokens"] = session.prompt_tokens
+    return results
+
+
+def bench_tool_dispatch(repeat: int) -> Dict[str, float]:
+    """Time to invoke each tool through the SDK's function tool wrapper (argument parsing included)."""
+    agent = _new_agent()
+    tools = {tool.name: tool for tool in agent.agent.tools}
+    results = {}
+    for name, arguments in TOOL_ARGUMENTS.items():
+        session = agent.sessions.get(f"dispatch-{name}")
+        context = RunContextWrapper(context=session)
+        payload = json.dumps(arguments)
+        results[f"dispatch_{name}_ms"] = _median_ms(
+            lambda: agent.run_coroutine(tools[name].on_invoke_tool(context, payload)), repeat
+        )
+    return results
+
+
+def bench_process_message(repeat: int) -> Dict[str, float]:
+    """End-to-end process_message time with a zero-latency model, i.e. our own overhead per turn."""
+    agent = _new_agent()
+    scenarios = {
+        # Answered by the model with text
+        "text": "We are planning to renovate our office reception",
+        # The model calls a direct-return tool, whose message is the reply
+        "tool": "Which panel options do you have for a living room wall in my new apartment?",
+        # Answered by the local intent router without the model
+        "fast_path": "price?",
+    }
+    results = {}
+    for name, message in scenarios.items():
+        # A fresh session per turn, so history length stays constant
+        results[f"process_message_{name}_ms"] = _median_ms(
+            lambda: agent.process_message(uuid.uuid4().hex, message), repeat
+        )
+    return results
+
+
+def run_benchmarks(repeat: int) -> Dict[str, float]:
+    """Run every benchmark and return a flat dict of metrics."""
+    set_tracing_disabled(True)
+    metrics = {}
+    metrics.update(bench_startup(repeat))
+    metrics.update(bench_construction(repeat))
+    metrics.update(bench_prompt(repeat))
+    metrics.update(bench_tool_dispatch(repeat))
+    metrics.update(bench_process_message(repeat))
+    return {name: round(value, 4) for name, value in metrics.items()}
+
+
+def find_regressions(metrics: Dict[str, float], baseline: Dict[str, float], threshold: float) -> Dict[str, Dict[str, float]]:
+    """Return the metrics that grew beyond the threshold, with their baseline and current values."""
+    regressions = {}
+    for name, value in metrics.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if name.endswith("_ms") and value - base <= MIN_TIME_DELTA_MS:
+            continue
+        if value > base * (1 + threshold):
+            regressions[name] = {"baseline": base, "current": value}
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PareAgent overhead with a mock model.")
+    parser.add_argument("--repeat", type=int, default=50, help="runs per measurement (the median is reported)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="save results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="fail if results regress against the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed relative regression")
+    args = parser.parse_args()
+
+    metrics = run_benchmarks(args.repeat)
+    width = max(len(name) for name in metrics)
+    for name, value in metrics.items():
+        print(f"{name:<{width}}  {value:>12,.4f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(metrics, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+
+    if args.check:
+        if not os.path.exists(args.baseline):
+            print(f"\nNo baseline at {args.baseline}; run with --save-baseline first.")
+            sys.exit(1)
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(metrics, baseline, args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}:")
+            for name, values in regressions.items():
+                print(f"  {name}: {values['baseline']} -> {values['current']}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """
 PARE India AI Assistant - CLI Interface
-Command-line interface for testing the assistant.
+Command-line interface for testing the assistant, as a client of the chat API (server.py).
 """
 
 import os
@@ -10,8 +10,8 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
-# Import the PareAgent
-from src.agent import PareAgent
+# Import the chat API client
+from src.client import ChatClient
 
 # ASCII art for the CLI
 PARE_ASCII = """
@@ -31,9 +31,10 @@ def main():
     print("Type 'exit' or 'quit' to end the conversation.\n")
     
     try:
-        # Initialize the agent
-        print("Initializing AI assistant...")
-        agent = PareAgent()
+        # Connect to the chat API and start a conversation
+        print("Connecting to AI assistant...")
+        client = ChatClient()
+        session_id = client.create_session()
         print("AI assistant ready!\n")
         
         # Main conversation loop
@@ -50,25 +51,32 @@ def main():
                 # Show thinking indicator
                 print("\nThinking (New Conversation)...\n")
                 
-                # Get response from agent
-                response = agent.process_message(user_message)
+                # Stream the response from the agent as it is generated
+                print("Assistant: ", end="", flush=True)
+                streamed_text = False
+                for event in client.stream_message(session_id, user_message):
+                    if event["type"] == "text_delta":
+                        print(event["delta"], end="", flush=True)
+                        streamed_text = True
+                    elif event["type"] == "message":
+                        # A tool produced the reply; start it on a fresh line if text was already shown
+                        if streamed_text:
+                            print("\nAssistant: ", end="")
+                        print(event["message"], end="", flush=True)
+                        streamed_text = True
+                    elif event["type"] == "brochure":
+                        # Mention the brochure as soon as a tool selects it
+                        print(f"\n[Sending {event['brochure']} brochure]")
                 
-                # Print the response
-                print(f"Assistant: {response['response']}")
-                
-                # If a brochure is included, mention it
-                if response.get("brochure"):
-                    print(f"\n[Sending {response['brochure']} brochure]")
-                
-                print()  # Empty line for better readability
+                print("\n")  # Empty line for better readability
                 
             except Exception as e:
                 print(f"\nError during processing: {str(e)}")
                 print("Please try again with a different query.")
                 
     except Exception as e:
-        print(f"\nError initializing AI assistant: {str(e)}")
-        print("Please make sure you have a valid OpenAI API key in your .env file.")
+        print(f"\nError connecting to AI assistant: {str(e)}")
+        print("Please make sure the API server is running (python server.py) and PARE_API_URL points to it.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
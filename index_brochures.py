@@ -0,0 +1,33 @@
+"""
+PARE India AI Assistant - Brochure Indexer
+Builds the search index used by the catalog search tool.
+
+Run after adding or changing files in public/brochures. Only brochures whose
+content changed are extracted again.
+
+Usage:
+    python index_brochures.py [--brochures public/brochures] [--index data/brochure_index]
+"""
+
+import argparse
+import time
+
+from src.utils.brochure_search import DEFAULT_BROCHURE_DIR, DEFAULT_INDEX_DIR, build_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the brochure search index.")
+    parser.add_argument("--brochures", default=DEFAULT_BROCHURE_DIR, help="directory with brochure files")
+    parser.add_argument("--index", default=DEFAULT_INDEX_DIR, help="directory for the index files")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stats = build_index(args.brochures, args.index)
+    print(
+        f"Indexed {stats['brochures']} brochures ({stats['chunks']} chunks) in {time.perf_counter() - start:.2f}s: "
+        f"{stats['extracted']} extracted, {stats['reused']} unchanged, {stats['removed']} removed"
+    )
+
+
+if __name__ == "__main__":
+    main()
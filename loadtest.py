@@ -0,0 +1,450 @@
+"""
+PARE India AI Assistant - Load Test
+Drives concurrent scripted conversations through the assistant to find how many customers one box can carry.
+
+Every simulated customer walks the lead funnel (company, product, pricing,
+lead fields, callback) in a new session, then starts over. Model calls are
+answered by a simulated model with log-normal latency, so no API key is
+needed. Concurrency is stepped up level by level; each level reports
+throughput and turn latency percentiles, and the saturation point is where
+p99 latency breaks the SLO or throughput stops growing with concurrency.
+
+Modes:
+    in-process (default)  PareAgent runs in this process, on one event loop
+    HTTP (--url)          conversations go to the chat API; start it with
+                          python server.py --simulated-model 0.6,1.8
+
+Usage:
+    python loadtest.py                                   # in-process, default levels
+    python loadtest.py --concurrency 1,10,100 --duration 10
+    python loadtest.py --url http://127.0.0.1:8000 --output http_results.json
+    python loadtest.py --compare loadtest_results.json   # compare with an earlier run
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    from src.agent import PareAgent
+
+DEFAULT_OUTPUT_PATH = "loadtest_results.json"
+DEFAULT_CONCURRENCY = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+DEFAULT_DURATION = 5.0  # seconds per concurrency level
+DEFAULT_LATENCY = (0.6, 1.8)  # simulated model latency median and p95, in seconds
+DEFAULT_P99_SLO = 5.0  # seconds
+
+# Throughput must grow by at least this fraction when concurrency goes up a level
+MIN_THROUGHPUT_GAIN = 0.1
+
+# Conversations measured for memory per session
+MEMORY_SESSIONS = 200
+
+# One scripted customer: (funnel step, message)
+FUNNEL = [
+    ("company", "Tell me about your company"),
+    ("product", "What wall panels do you have for a living room?"),
+    ("pricing", "How much do they cost?"),
+    ("location", "We are in Pune"),
+    ("requirement_type", "It is a residential project"),
+    ("quantity", "Around 1200 sq ft"),
+    ("callback", "Please arrange a callback"),
+]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """Mean and p50/p95/p99 of turn latencies, in milliseconds."""
+    return {
+        "mean": round(statistics.fmean(seconds) * 1000, 2) if seconds else 0.0,
+        "p50": round(percentile(seconds, 0.50) * 1000, 2),
+        "p95": round(percentile(seconds, 0.95) * 1000, 2),
+        "p99": round(percentile(seconds, 0.99) * 1000, 2),
+    }
+
+
+class _StandInCRM(BaseHTTPRequestHandler):
+    # Accepts every lead, so completed funnels exercise delivery without a real CRM
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stand_in_crm() -> ThreadingHTTPServer:
+    """Serve a local CRM stand-in and point lead delivery at it."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInCRM)
+    threading.Thread(target=server.serve_forever, name="stand-in-crm", daemon=True).start()
+    os.environ["CRM_API_URL"] = f"http://127.0.0.1:{server.server_port}/leads"
+    os.environ["CRM_API_KEY"] = "loadtest"
+    os.environ["CRM_SPOOL_PATH"] = os.path.join(tempfile.mkdtemp(), "crm_spool.jsonl")
+    os.environ["LEAD_INDEX_PATH"] = os.path.join(tempfile.mkdtemp(), "lead_index.db")
+    return server
+
+
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 JSON client on asyncio streams, one per simulated customer."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, method: str, path: str, body: Optional[Dict] = None) -> Tuple[int, Dict]:
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        head = (
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+        ).encode("latin-1")
+        for attempt in range(2):
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self._writer.write(head + payload)
+                await self._writer.drain()
+                return await self._read_response()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # The server closed an idle keep-alive connection; reconnect once
+                self.close()
+                if attempt:
+                    raise
+        raise ConnectionError("unreachable")
+
+    async def _read_response(self) -> Tuple[int, Dict]:
+        status_line = await self._reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        body = await self._reader.readexactly(length) if length else b"{}"
+        return status, json.loads(body)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+class Target:
+    """Where simulated customers send their messages."""
+
+    async def converse(self, latencies: Dict[str, List[float]]):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InProcessTarget(Target):
+    """PareAgent in this process, with a simulated model."""
+
+    def __init__(self, agent: "PareAgent"):
+        self.agent = agent
+
+    async def converse(self, latencies: Dict[str, List[float]]):
+        session_id = uuid.uuid4().hex
+        for step, message in FUNNEL:
+            start = time.perf_counter()
+            await self.agent.aprocess_message(session_id, message)
+            latencies[step].append(time.perf_counter() - start)
+
+
+class HTTPTarget(Target):
+    """The chat API, one keep-alive connection per simulated customer."""
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 80
+        self._connections: Dict[int, HTTPConnection] = {}
+
+    async def converse(self, latencies: Dict[str, List[float]]):
+        task_id = id(asyncio.current_task())
+        connection = self._connections.get(task_id)
+        if connection is None:
+            connection = self._connections[task_id] = HTTPConnection(self.host, self.port)
+        status, body = await connection.request("POST", "/sessions")
+        if status != 201:
+            raise RuntimeError(f"POST /sessions returned {status}")
+        session_id = body["session_id"]
+        for step, message in FUNNEL:
+            start = time.perf_counter()
+            status, body = await connection.request("POST", f"/sessions/{session_id}/messages", {"message": message})
+            if status != 200:
+                raise RuntimeError(f"POST messages returned {status}: {body.get('error')}")
+            latencies[step].append(time.perf_counter() - start)
+
+    def close(self):
+        for connection in self._connections.values():
+            connection.close()
+        self._connections.clear()
+
+
+async def run_level(target: Target, concurrency: int, duration: float) -> Dict:
+    """Run `concurrency` customers for `duration` seconds and summarize their turns."""
+    latencies: Dict[str, List[float]] = {step: [] for step, _ in FUNNEL}
+    counts = {"conversations": 0, "errors": 0}
+    deadline = time.perf_counter() + duration
+
+    async def customer():
+        while time.perf_counter() < deadline:
+            try:
+                await target.converse(latencies)
+                counts["conversations"] += 1
+            except Exception:
+                counts["errors"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(customer() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    target.close()
+
+    all_turns = [seconds for step_latencies in latencies.values() for seconds in step_latencies]
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "turns": len(all_turns),
+        "conversations": counts["conversations"],
+        "errors": counts["errors"],
+        "throughput_turns_per_s": round(len(all_turns) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": latency_summary(all_turns),
+        "step_latency_ms": {step: latency_summary(values) for step, values in latencies.items()},
+    }
+
+
+def find_saturation(levels: List[Dict], p99_slo: float, min_gain: float = MIN_THROUGHPUT_GAIN) -> Dict:
+    """
+    Return the highest sustainable concurrency: the last level before p99 latency
+    exceeds the SLO or throughput stops growing with concurrency.
+    """
+    best = max(levels, key=lambda level: level["throughput_turns_per_s"], default=None)
+    result = {
+        "sustainable_concurrency": levels[-1]["concurrency"] if levels else 0,
+        "saturated_at": None,
+        "reason": None,
+        "max_throughput_turns_per_s": best["throughput_turns_per_s"] if best else 0.0,
+    }
+    previous = None
+    for level in levels:
+        reason = None
+        if level["latency_ms"]["p99"] > p99_slo * 1000:
+            reason = "p99_latency_above_slo"
+        elif level["errors"]:
+            reason = "errors"
+        elif previous is not None and level["throughput_turns_per_s"] < previous["throughput_turns_per_s"] * (1 + min_gain):
+            reason = "throughput_stopped_growing"
+        if reason:
+            result.update(
+                sustainable_concurrency=previous["concurrency"] if previous else 0,
+                saturated_at=level["concurrency"],
+                reason=reason,
+            )
+            break
+        previous = level
+    return result
+
+
+def simulated_agent(latency: Optional[Tuple[float, float]] = None) -> "PareAgent":
+    """PareAgent with a simulated model. The agent is imported here, so HTTP runs never load it."""
+    from agents import set_tracing_disabled
+    from src.agent import PareAgent
+    from src.utils.mock_model import MockModel, funnel_responder, lognormal_latency
+    from src.utils.telemetry import Telemetry
+
+    set_tracing_disabled(True)
+    model = MockModel(responder=funnel_responder, latency=lognormal_latency(*latency) if latency else 0.0)
+    return PareAgent(model=model, telemetry=Telemetry())
+
+
+def measure_memory_per_session(latency: Tuple[float, float], sessions: int = MEMORY_SESSIONS) -> int:
+    """Bytes retained per finished conversation in the session pool (traced Python allocations)."""
+    target = InProcessTarget(simulated_agent())
+    latencies = {step: [] for step, _ in FUNNEL}
+
+    async def converse(count: int):
+        for _ in range(count):
+            await target.converse(latencies)
+
+    # Warm up caches first, so only per-session state is measured
+    asyncio.run(converse(20))
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    asyncio.run(converse(sessions))
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return max(0, (after - before) // sessions)
+
+
+def _build() -> Dict[str, Optional[str]]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "platform": platform.platform()}
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def run_load_test(
+    concurrency_levels: List[int],
+    duration: float,
+    latency: Tuple[float, float],
+    p99_slo: float,
+    url: Optional[str] = None,
+) -> Dict:
+    """Run every concurrency level and return the results as a JSON-serializable dict."""
+    if url:
+        target: Target = HTTPTarget(url)
+    else:
+        start_stand_in_crm()
+        target = InProcessTarget(simulated_agent(latency))
+
+    levels = []
+    for concurrency in concurrency_levels:
+        level = asyncio.run(run_level(target, concurrency, duration))
+        levels.append(level)
+        print(
+            f"concurrency {concurrency:>5}: {level['throughput_turns_per_s']:>9,.1f} turns/s  "
+            f"p50 {level['latency_ms']['p50']:>8,.1f} ms  p95 {level['latency_ms']['p95']:>8,.1f} ms  "
+            f"p99 {level['latency_ms']['p99']:>8,.1f} ms  errors {level['errors']}"
+        )
+
+    return {
+        "build": _build(),
+        "mode": "http" if url else "in_process",
+        "url": url,
+        "timestamp": time.time(),
+        "config": {
+            "concurrency": concurrency_levels,
+            "duration_s": duration,
+            "model_latency_s": {"median": latency[0], "p95": latency[1]},
+            "p99_slo_s": p99_slo,
+            "funnel": [step for step, _ in FUNNEL],
+        },
+        "levels": levels,
+        "saturation": find_saturation(levels, p99_slo),
+        # Session memory lives in the server process in HTTP mode
+        "memory_per_session_bytes": None if url else measure_memory_per_session(latency),
+        "peak_rss_bytes": None if url else _peak_rss_bytes(),
+    }
+
+
+def compare(results: Dict, other: Dict):
+    """Print throughput and p99 latency per concurrency level against an earlier run."""
+    previous = {level["concurrency"]: level for level in other.get("levels", [])}
+    print(f"\nCompared with {other.get('build', {}).get('commit')} ({other.get('mode')}):")
+    for level in results["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        print(
+            f"concurrency {level['concurrency']:>5}: "
+            f"throughput {before['throughput_turns_per_s']:,.1f} -> {level['throughput_turns_per_s']:,.1f} turns/s, "
+            f"p99 {before['latency_ms']['p99']:,.1f} -> {level['latency_ms']['p99']:,.1f} ms"
+        )
+    print(
+        f"sustainable concurrency: {other.get('saturation', {}).get('sustainable_concurrency')} -> "
+        f"{results['saturation']['sustainable_concurrency']}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the PARE assistant with simulated customers.")
+    parser.add_argument("--url", help="chat API URL (HTTP mode); in-process when omitted")
+    parser.add_argument(
+        "--concurrency",
+        default=",".join(str(level) for level in DEFAULT_CONCURRENCY),
+        help="comma-separated concurrent customers per level",
+    )
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds per level")
+    parser.add_argument(
+        "--latency",
+        default=",".join(str(value) for value in DEFAULT_LATENCY),
+        metavar="MEDIAN,P95",
+        help="simulated model latency in seconds (in-process mode)",
+    )
+    parser.add_argument("--p99-slo", type=float, default=DEFAULT_P99_SLO, help="p99 turn latency SLO in seconds")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help="results JSON file")
+    parser.add_argument("--compare", help="earlier results JSON file to compare with")
+    args = parser.parse_args()
+
+    other = None
+    if args.compare:
+        # Read first, since the output may overwrite the same file
+        with open(args.compare) as f:
+            other = json.load(f)
+
+    median, p95 = (float(value) for value in args.latency.split(","))
+    results = run_load_test(
+        [int(level) for level in args.concurrency.split(",")],
+        args.duration,
+        (median, p95),
+        args.p99_slo,
+        url=args.url,
+    )
+
+    saturation = results["saturation"]
+    print(f"\nMax throughput: {saturation['max_throughput_turns_per_s']:,.1f} turns/s")
+    if saturation["reason"]:
+        print(
+            f"Saturated at {saturation['saturated_at']} customers ({saturation['reason']}); "
+            f"sustainable: {saturation['sustainable_concurrency']}"
+        )
+    else:
+        print("Not saturated at the highest level tested")
+    if results["memory_per_session_bytes"] is not None:
+        print(f"Memory per session: {results['memory_per_session_bytes']:,} bytes")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {args.output}")
+
+    if other is not None:
+        compare(results, other)
+
+
+if __name__ == "__main__":
+    main()
@@ -32,6 +32,12 @@ fi
 echo -e "${GREEN}Installing dependencies...${NC}"
 pip install -r requirements.txt
 
+# Start the chat API server; the Streamlit app is a client of it
+echo -e "${GREEN}Starting the chat API server...${NC}"
+python3 server.py &
+SERVER_PID=$!
+trap "kill $SERVER_PID" EXIT
+
 # Start the Streamlit app
 echo -e "${GREEN}Starting PARE India AI Assistant...${NC}"
 echo -e "The app will open in your browser shortly."
@@ -0,0 +1,40 @@
+"""
+PARE India AI Assistant - HTTP API Server
+Runs the chat API (src/api.py) under uvicorn, with one worker process per core by default.
+"""
+
+import argparse
+import os
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the PARE India chat API.")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"), help="interface to listen on")
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", 8000)), help="port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument(
+        "--simulated-model",
+        metavar="MEDIAN,P95",
+        help="answer with a simulated model of this latency (seconds) instead of OpenAI, for load tests",
+    )
+    args = parser.parse_args()
+
+    if args.simulated_model:
+        # Read by every worker process when it builds its agent
+        os.environ["SIMULATED_MODEL_LATENCY"] = args.simulated_model
+
+    try:
+        import uvicorn
+    except ImportError:
+        raise SystemExit("The API server requires uvicorn: pip install uvicorn")
+
+    uvicorn.run("src.api:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,92 +1,211 @@
 import os
 import json
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
-from dotenv import load_dotenv
-from agents import Agent, Runner, function_tool
+import asyncio
+import functools
+import queue
+import threading
+import time
+from typing import Dict, List, Any, Optional, AsyncIterator, Iterator, Union
+import openai
+from agents import Agent, Model, Runner, RunContextWrapper, function_tool, set_default_openai_key
+from agents.result import RunResultBase, RunResultStreaming
 
 # Import modules
 from src.modules.company_info import handle_company_query
-from src.modules.product_info import handle_product_query
-from src.modules.lead_capture import handle_lead_capture, send_lead_to_crm
-from src.modules.support import get_pricing_info, handle_support_request, close_conversation
+from src.modules.product_info import get_brochure_message, handle_product_query
+from src.modules.lead_capture import LEAD_SUBMITTED, capture_lead_fields, get_next_field_to_capture, handle_lead_capture, is_question
+from src.modules.lead_extraction import asked_field
+from src.modules.localization import localize
+from src.modules.support import CONTACT_FIELDS, QUOTE_CONTACT_REQUEST, get_pricing_info, handle_support_request, close_conversation
+from src.modules.router import IntentRouter, classify_intent, DEFAULT_CONFIDENCE_THRESHOLD
+from src.utils.admission import AdmissionController, AdmissionModel, get_admission_controller
+from src.utils.brochure_search import search_brochures, DEFAULT_TOP_K
+from src.utils.crm import get_lead_pipeline
+from src.utils.deadline import CircuitBreaker, deadline, get_circuit_breaker, remaining, DEFAULT_TURN_DEADLINE
+from src.utils.environment import load_environment
+from src.utils.hedging import HedgedModel
+from src.utils.lead_index import get_lead_index
+from src.utils.memory import estimate_tokens, DEFAULT_KEEP_TURNS, DEFAULT_TOKEN_BUDGET
+from src.utils.model_cascade import CascadeModel, model_tier, DEFAULT_SMALL_MODEL
+from src.utils.session_store import SessionStore, default_session_store
+from src.utils.sessions import SessionManager, SessionState, current_session, DEFAULT_MAX_SESSIONS, DEFAULT_SESSION_TTL
+from src.utils.telemetry import Telemetry, TracedModel, TurnTrace, current_telemetry, get_telemetry
+from src.utils.tool_policy import DirectReturnModel, DIRECT, REPHRASE
+from src.utils.tool_results import current_tool_result
 
-# Load environment variables
-load_dotenv()
+# Default model for the assistant
+DEFAULT_MODEL = "gpt-4o"
 
-# Set OpenAI API key
-from agents import set_default_openai_key
-set_default_openai_key(os.getenv("OPENAI_API_KEY"))
+# How each tool's result reaches the customer: DIRECT tools' messages are the reply
+# and end the run; REPHRASE tools' results are passed back to the model to answer
+TOOL_RETURN_POLICY = {
+    "tool_company_info": DIRECT,
+    "tool_product_info": DIRECT,
+    "tool_lead_capture": DIRECT,
+    "tool_pricing_info": DIRECT,
+    "tool_support_request": DIRECT,
+    "tool_send_brochure": DIRECT,
+    "tool_search_catalog": REPHRASE,
+}
+
+# Tools that read or write the session's lead data; these run one at a time, in call order,
+# while the other tool calls of a model step run concurrently
+LEAD_DATA_TOOLS = {"tool_lead_capture", "tool_pricing_info"}
+
+# System prompt, identical for every turn and session so that it stays a cacheable prefix.
+# Conversation state is passed as input items instead (see build_input).
+INSTRUCTIONS = """You are a helpful assistant for PARE India, a leading manufacturer of decorative surfaces for walls, ceilings, and facades.
+
+Follow these guidelines:
+1. When customers ask about the company, provide information and ask about their requirements.
+2. When customers ask about products, explain the options based on their interests (walls, ceilings, facades).
+3. Capture lead information (location, requirement_type, quantity; for commercial projects, the kind of space) in a conversational way, and the customer's name, phone and email when offered. Pass the customer's own words as the value; they are parsed for you.
+4. Provide pricing information when asked.
+5. Offer support options (callbacks, site visits) when appropriate.
+6. Once customer has narrowed down the requirement, capture the lead information and set a callback and close the conversation.
+7. Subtly lead to capture the lead information and closing the conversation.
+8. Always be professional, helpful and enthusiastic.
+9. Respond in the language of the customer. (normall English, Hindi or Hinglish)
+10. Keep in mind the context of the conversation: the earlier messages, and the developer note before the latest message (summary of earlier messages and known lead details).
+11. For detailed product questions (specifications, sizes, installation, maintenance), search the brochures and answer only from the snippets found.
+
+Remember to use the appropriate tools based on the customer's query."""
+
+INSTRUCTIONS_TOKENS = estimate_tokens(INSTRUCTIONS)
 
 class PareAgent:
-    def __init__(self):
-        # Initialize lead data
-        self.lead_data = {
-            "location": None,
-            "requirement_type": None,
-            "quantity": None,
-        }
+    """
+    Shared agent definition for all conversations.
+
+    The Agent and its tool schemas are built once per process (see
+    agent_definition) and each PareAgent binds them to its own model;
+    per-conversation state (lead data, history, the turn's tool results) lives in a
+    SessionState that is passed to each run as the context.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        session_ttl: float = DEFAULT_SESSION_TTL,
+        memory_turns: int = DEFAULT_KEEP_TURNS,
+        memory_token_budget: int = DEFAULT_TOKEN_BUDGET,
+        router_threshold: float = DEFAULT_CONFIDENCE_THRESHOLD,
+        model: Union[str, Model] = DEFAULT_MODEL,
+        small_model: Union[str, Model, None] = None,
+        tool_return_policy: Optional[Dict[str, str]] = None,
+        session_store: Optional[SessionStore] = None,
+        shared_sessions: bool = False,
+        telemetry: Optional[Telemetry] = None,
+        admission: Optional[AdmissionController] = None,
+        turn_deadline: Optional[float] = None,
+        hedge: Optional[bool] = None,
+        circuit_breaker: Optional[CircuitBreaker] = None,
+    ):
+        configure_openai()
         
-        # Initialize conversation history
-        self.conversation_history = []
-        
-        # Create OpenAI agent
-        self.agent = Agent(
-            name="pare_assistant",
-            instructions=self.dynamic_instructions,
-            tools=[
-                function_tool(self.tool_company_info),
-                function_tool(self.tool_product_info),
-                function_tool(self.tool_lead_capture),
-                function_tool(self.tool_pricing_info),
-                function_tool(self.tool_support_request),
-                function_tool(self.tool_send_brochure)
-            ],
-            model="gpt-4o"
+        # Per-session state, keyed by session id; persisted when a store is configured, and
+        # reloaded every turn when the store is shared with other worker processes
+        self.sessions = SessionManager(
+            max_sessions=max_sessions,
+            session_ttl=session_ttl,
+            memory_turns=memory_turns,
+            memory_token_budget=memory_token_budget,
+            store=session_store if session_store is not None else default_session_store(),
+            shared=shared_sessions,
         )
         
-        # Variables to keep track of the latest tool outputs
-        self.last_brochure = None
-        self.last_message = None
-    
-    def add_to_history(self, role: str, content: str):
-        """Add a message to the conversation history."""
-        self.conversation_history.append({"role": role, "content": content})
+        # Local intent router that answers obvious queries without the model
+        self.router = IntentRouter(threshold=router_threshold)
+        
+        # Spans, counters and sampled per-turn traces
+        self.telemetry = telemetry or get_telemetry()
+        
+        # Tools, instrumented so that each call is timed and counted
+        self.tools = TOOLS
+        
+        # Background event loop used by the synchronous wrappers
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        
+        # Cheaper model tried first, escalating to `model` when needed. Defaults to SMALL_MODEL
+        # (or gpt-4o-mini) when `model` is a model name; SMALL_MODEL="" turns the cascade off
+        if small_model is None and isinstance(model, str):
+            small_model = os.getenv("SMALL_MODEL", DEFAULT_SMALL_MODEL) or None
+        
+        # Each call to the API waits for admission (rate limits, adaptive concurrency, lead-capture
+        # priority) and is retried on 429s; shared by all agents in the process when `model` is a name
+        if admission is None and isinstance(model, str):
+            admission = get_admission_controller()
+        self.admission = admission
+        
+        # Seconds a turn may take (TURN_DEADLINE_SECONDS; 0 for none) before it is answered locally
+        # in degraded mode, as are turns while the circuit breaker is open after repeated failures.
+        # The breaker is shared by all agents in the process when `model` is a name
+        if turn_deadline is None:
+            turn_deadline = float(os.getenv("TURN_DEADLINE_SECONDS", DEFAULT_TURN_DEADLINE))
+        self.turn_deadline = turn_deadline or None
+        if circuit_breaker is None:
+            circuit_breaker = get_circuit_breaker() if isinstance(model, str) else CircuitBreaker(telemetry=self.telemetry)
+        self.breaker = circuit_breaker
+        
+        # Calls slower than the model's recent p95 latency are sent again, and the first answer
+        # is used (HEDGE_REQUESTS=1). Hedging runs inside admission, so queueing time does not
+        # count toward the delay, and nothing is hedged while calls are waiting for admission
+        if hedge is None:
+            hedge = os.getenv("HEDGE_REQUESTS", "").lower() in ("1", "true", "yes")
+        
+        def guarded(tier_model):
+            if hedge:
+                tier_model = HedgedModel(tier_model, telemetry=self.telemetry, admission=admission)
+            return AdmissionModel(tier_model, admission) if admission is not None else tier_model
+        
+        self.cascade = None
+        if small_model is not None:
+            small, large = model_tier("small", small_model), model_tier("large", model)
+            small = small._replace(model=guarded(small.model))
+            large = large._replace(model=guarded(large.model))
+            self.cascade = CascadeModel(small, large, self.telemetry)
+            model = self.cascade
+        else:
+            model = guarded(model)
+        
+        # Bind the shared OpenAI agent definition to this agent's model
+        self.agent = agent_definition().clone(
+            model=DirectReturnModel(
+                TracedModel(model, self.telemetry), tool_return_policy or TOOL_RETURN_POLICY, default_policy=REPHRASE
+            )
+        )
     
-    def dynamic_instructions(self, context, agent):
-        return f"""
-            You are a helpful assistant for PARE India, a leading manufacturer of decorative surfaces for walls, ceilings, and facades.
-            
-            Follow these guidelines:
-            1. When customers ask about the company, provide information and ask about their requirements.
-            2. When customers ask about products, explain the options based on their interests (walls, ceilings, facades).
-            3. Capture lead information (location, requirement_type, quantity) in a conversational way.
-            4. Provide pricing information when asked.
-            5. Offer support options (callbacks, site visits) when appropriate.
-            6. Once customer has narrowed down the requirement, capture the lead information and set a callback and close the conversation.
-            7. Subtly lead to capture the lead information and closing the conversation.
-            8. Always be professional, helpful and enthusiastic.
-            9. Respond in the language of the customer. (normall English, Hindi or Hinglish)
-            10. Keep in mind the context/history of the conversation in the CONVERSATION_HISTORY variable.
-
-            CONVERSATION_HISTORY: {self.conversation_history}
-            
-            Remember to use the appropriate tools based on the customer's query.
+    def build_input(self, session: SessionState, user_message: str) -> List[Dict[str, str]]:
         """
-
+        Build the model input for a turn: earlier messages as input items, then the new message.
+        
+        The instructions are the same for every turn and session, so the provider
+        can serve them, and the earlier turns that follow, from its prompt cache.
+        """
+        with self.telemetry.span("prompt"):
+            items, memory_tokens = session.memory.render_items(session.lead_data)
+            items.append({"role": "user", "content": user_message})
+            
+            # Record the prompt size for this turn
+            session.prompt_tokens = INSTRUCTIONS_TOKENS + memory_tokens + estimate_tokens(user_message)
+            return items
+    
     # Tool definitions
-    def tool_company_info(self) -> Dict:
+    @staticmethod
+    def tool_company_info(ctx: RunContextWrapper[SessionState]) -> Dict:
         """Provide information about PARE India company."""
-        result = handle_company_query()
-        # Store message for response processing
-        self.last_message = result["message"]
+        result = handle_company_query(language=ctx.context.language)
+        # Record message for response processing
+        ctx.context.results.add(message=result["message"])
         
         return {
             "message": result["message"],
             "next_action": "lead_capture"
         }
     
-    def tool_product_info(self, product_category: Optional[str] = None, specific_product: Optional[str] = None) -> Dict:
+    @staticmethod
+    def tool_product_info(ctx: RunContextWrapper[SessionState], product_category: Optional[str] = None, specific_product: Optional[str] = None) -> Dict:
         """
         Provide information about PARE products.
         
@@ -94,10 +213,9 @@ class PareAgent:
             product_category: Category of interest (wall, ceiling, facade, unsure, all, none)
             specific_product: Specific product of interest
         """
-        result = handle_product_query(category=product_category, specific_product=specific_product)
-        # Store message and brochure for response processing
-        self.last_message = result["message"]
-        self.last_brochure = result.get("brochure")
+        result = handle_product_query(category=product_category, specific_product=specific_product, language=ctx.context.language)
+        # Record message and brochure for response processing
+        ctx.context.results.add(message=result["message"], brochure=result.get("brochure"))
         
         return {
             "message": result["message"],
@@ -105,22 +223,30 @@ class PareAgent:
             "next_action": result.get("next_module", "lead_capture")
         }
     
-    def tool_lead_capture(self, field: str, value: Optional[str] = None) -> Dict:
+    @staticmethod
+    def tool_lead_capture(ctx: RunContextWrapper[SessionState], field: str, value: Optional[str] = None) -> Dict:
         """
         Capture customer lead information.
         
         Args:
-            field: Lead data field to capture (name, phone, email, etc.)
-            value: Value provided by the customer
+            field: Lead data field to capture (location, requirement_type, space_type, quantity, name, phone, email)
+            value: The customer's answer, in their words (e.g. "around 2k sqft"); other details in it are captured too
         """
-        result = handle_lead_capture(self.lead_data, field=field, value=value)
-        # Store message for response processing
-        self.last_message = result["message"]
+        session = ctx.context
+        result = handle_lead_capture(session.lead_data, field=field, value=value, language=session.language)
+        message = result["message"]
         
         # Check if lead capture is complete
         if result.get("is_complete", False):
-            send_lead_to_crm(self.lead_data)
-            self.last_message = "Thank you for providing your details. Someone will be in touch with you shortly."
+            # A returning customer's lead is merged into the one already sent, and only re-posted if it changed
+            _, lead = get_lead_index().resolve(session.lead_data, session_id=session.session_id)
+            if lead is not None:
+                # Delivered in the background so a slow CRM does not hold up the reply
+                get_lead_pipeline().submit(lead)
+            message = localize(LEAD_SUBMITTED, session.language)
+        
+        # Record message for response processing
+        session.results.add(message=message)
         
         return {
             "message": result["message"],
@@ -129,32 +255,44 @@ class PareAgent:
             "next_action": result.get("next_module", "lead_capture")
         }
     
-    def tool_pricing_info(self) -> Dict:
-        """Provide pricing information for PARE products."""
-        result = get_pricing_info()
-        # Store message for response processing
-        self.last_message = result["message"]
+    @staticmethod
+    def tool_pricing_info(ctx: RunContextWrapper[SessionState], product: Optional[str] = None, finish: Optional[str] = None) -> Dict:
+        """
+        Provide pricing information for PARE products, with an estimate for the customer's quantity.
+        
+        Args:
+            product: Product or category the customer asked about, if any (e.g. Linea, Soffit, wall)
+            finish: Finish the customer asked about, if any (wooden, marble, pastel)
+        """
+        session = ctx.context
+        result = get_pricing_info(session.lead_data, product=product, finish=finish, language=session.language)
+        
+        # Without an estimate, try to capture lead if customer shows interest
+        has_required_fields = all(session.lead_data.get(field) for field in ["name", "phone"])
+        if result["estimate"] is None and not has_required_fields:
+            missing_field = "name" if not session.lead_data.get("name") else "phone"
+            field_name = localize(CONTACT_FIELDS, session.language)[missing_field]
+            result["message"] += "\n\n" + localize(QUOTE_CONTACT_REQUEST, session.language).format(field=field_name)
         
-        # After sharing pricing, try to capture lead if customer shows interest
-        has_required_fields = all(self.lead_data.get(field) for field in ["name", "phone"])
-        if not has_required_fields:
-            missing_field = "name" if not self.lead_data.get("name") else "phone"
-            result["message"] += f"\n\nTo provide a more personalized quote, could you please share your {missing_field}?"
-            self.last_message = result["message"]
+        # Record message for response processing
+        session.results.add(message=result["message"])
         
         return {
             "message": result["message"],
+            "estimate": result["estimate"],
             "next_action": "lead_capture"
         }
     
-    def tool_support_request(self, request_type: str) -> Dict:
+    @staticmethod
+    def tool_support_request(ctx: RunContextWrapper[SessionState], request_type: str) -> Dict:
         """
         Handle customer support or callback requests.
         
         Args:
             request_type: Type of support request (callback, whatsapp, site_visit)
         """
-        result = handle_support_request(request_type)
+        language = ctx.context.language
+        result = handle_support_request(request_type, language=language)
         
         response = {
             "message": result["message"],
@@ -162,57 +300,459 @@ class PareAgent:
         }
         
         if result.get("next_module") == "closing":
-            response["message"] += "\n\n" + close_conversation()
+            response["message"] += "\n\n" + close_conversation(language)
         
-        # Store message for response processing
-        self.last_message = response["message"]
+        # Record message for response processing
+        ctx.context.results.add(message=response["message"])
         
         return response
     
-    def tool_send_brochure(self, brochure_type: str) -> Dict:
+    @staticmethod
+    def tool_send_brochure(ctx: RunContextWrapper[SessionState], brochure_type: str) -> Dict:
         """
         Send product brochure to customer.
         
         Args:
             brochure_type: Type of brochure to send (easy+, innov+, dura+, company)
         """
-        # Store brochure for response processing
-        self.last_brochure = brochure_type
-        self.last_message = f"Here's our {brochure_type} brochure for your reference."
+        # Record brochure for response processing
+        message = get_brochure_message(brochure_type, ctx.context.language)
+        ctx.context.results.add(message=message, brochure=brochure_type)
         
         return {
-            "message": self.last_message,
+            "message": message,
             "brochure": brochure_type
         }
     
-    def process_message(self, user_message: str) -> Dict[str, Any]:
-        """Process user message using the OpenAI Agent and return a response."""
-        # Reset stored values
-        self.last_brochure = None
-        self.last_message = None
+    @staticmethod
+    def tool_search_catalog(ctx: RunContextWrapper[SessionState], query: str, top_k: int = DEFAULT_TOP_K) -> Dict:
+        """
+        Search the product brochures for details to answer a customer's question.
+        
+        Args:
+            query: What to look for, e.g. "soffit outdoor maintenance"
+            top_k: Number of snippets to return
+        """
+        results = search_brochures(query, top_k=max(1, min(top_k, 10)))
+        if results is None:
+            return {
+                "message": "Detailed brochure information is not available right now; offer to send the brochure instead.",
+                "results": []
+            }
+        
+        return {
+            "results": results
+        }
+    
+    async def aprocess_message(self, session_id: str, user_message: str) -> Dict[str, Any]:
+        """
+        Process a user message for one session using the OpenAI Agent and return a response.
+        
+        Turns for different sessions run concurrently on the caller's event loop;
+        turns for the same session are serialized by the session lock. A turn
+        still running at its deadline, or failed by the model, is answered in
+        degraded mode (see _degraded_turn).
+        """
+        session = self.sessions.get(session_id)
+        trace = self.telemetry.start_turn(session_id)
+        error = None
         
-        import asyncio
         try:
-            asyncio.get_running_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        # Send message to agent
-        result = Runner.run_sync(self.agent, user_message)
+            with self.telemetry.activate(trace):
+                async with session.lock:
+                    # Reset stored values
+                    session.reset_turn()
+                    self.sessions.refresh(session)
+                    session.update_language(user_message)
+                    
+                    # Answer obvious queries, and plain answers to a lead prompt, locally without calling the model
+                    lead_route = self._capture_lead(session, user_message)
+                    route = self.router.route(user_message) or lead_route
+                    if route:
+                        trace.path = "fast_path"
+                        await self._dispatch_intent(session, route)
+                        return self._finish_turn(session, user_message, None)
+                    
+                    # While the circuit is open the model is not called at all
+                    if not self.breaker.allow():
+                        return await self._degraded_turn(session, user_message, trace, "circuit_open")
+                    
+                    # Send message to agent, attributing its model calls to this session; the run's
+                    # model calls see the deadline, and the run is cancelled when it passes
+                    token = current_session.set(session)
+                    try:
+                        with deadline(self.turn_deadline):
+                            result = await asyncio.wait_for(
+                                Runner.run(self.agent, self.build_input(session, user_message), context=session),
+                                timeout=remaining(),
+                            )
+                    except (asyncio.TimeoutError, openai.OpenAIError) as e:
+                        return await self._degraded_turn(session, user_message, trace, self._record_model_failure(e))
+                    finally:
+                        current_session.reset(token)
+                    
+                    self.breaker.record_success()
+                    return self._finish_turn(session, user_message, result)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.telemetry.finish_turn(trace, error)
+    
+    async def astream_message(self, session_id: str, user_message: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Process a user message and yield events as the answer is generated.
+        
+        Events are dicts with a "type" key:
+            text_delta: {"delta"} - a chunk of model text
+            tool_called: {"tool"} - the model called a tool
+            message: {"message"} - a tool produced the reply; replaces any text so far
+            brochure: {"brochure"} - a tool selected a brochure to send
+            done: the final response, as returned by aprocess_message
         
-        # Build response using final output and stored values from tool calls
+        A turn still running at its deadline ends with a degraded-mode message.
+        """
+        session = self.sessions.get(session_id)
+        trace = self.telemetry.start_turn(session_id)
+        error = None
+        
+        try:
+            async with session.lock:
+                # Reset stored values
+                session.reset_turn()
+                self.sessions.refresh(session)
+                session.update_language(user_message)
+                
+                # Answer obvious queries, and plain answers to a lead prompt, locally without calling the model
+                lead_route = self._capture_lead(session, user_message)
+                route = self.router.route(user_message) or lead_route
+                if route or not self.breaker.allow():
+                    with self.telemetry.activate(trace):
+                        if route:
+                            trace.path = "fast_path"
+                            await self._dispatch_intent(session, route)
+                            response = self._finish_turn(session, user_message, None)
+                        else:
+                            # While the circuit is open the model is not called at all
+                            response = await self._degraded_turn(session, user_message, trace, "circuit_open")
+                    yield {"type": "message", "message": response["response"]}
+                    for brochure in response["brochures"]:
+                        yield {"type": "brochure", "brochure": brochure}
+                    yield {"type": "done", **response}
+                    return
+                
+                # The run's background task copies the current context, so set the session, trace and deadline first
+                with self.telemetry.activate(trace), deadline(self.turn_deadline) as expires:
+                    token = current_session.set(session)
+                    try:
+                        result = Runner.run_streamed(self.agent, self.build_input(session, user_message), context=session)
+                    finally:
+                        current_session.reset(token)
+                sent_brochures = 0
+                degraded = None
+                try:
+                    async for event in _stream_until(result, expires):
+                        if event.type == "raw_response_event":
+                            # Once a tool has produced the reply, later model text is not shown
+                            if event.data.type == "response.output_text.delta" and not session.results.message:
+                                yield {"type": "text_delta", "delta": event.data.delta}
+                        elif event.type == "run_item_stream_event":
+                            if event.name == "tool_called":
+                                yield {"type": "tool_called", "tool": event.item.raw_item.name}
+                            elif event.name == "tool_output":
+                                # The reply so far, merged across the step's tools, and any brochures not yet sent
+                                if session.results.message:
+                                    yield {"type": "message", "message": session.results.message}
+                                brochures = session.results.brochures
+                                for brochure in brochures[sent_brochures:]:
+                                    yield {"type": "brochure", "brochure": brochure}
+                                sent_brochures = len(brochures)
+                except (asyncio.TimeoutError, openai.OpenAIError) as e:
+                    degraded = self._record_model_failure(e)
+                
+                with self.telemetry.activate(trace):
+                    if degraded:
+                        response = await self._degraded_turn(session, user_message, trace, degraded)
+                    else:
+                        self.breaker.record_success()
+                        response = self._finish_turn(session, user_message, result)
+                if degraded:
+                    # Replaces any model text streamed before the deadline
+                    yield {"type": "message", "message": response["response"]}
+                    for brochure in response["brochures"][sent_brochures:]:
+                        yield {"type": "brochure", "brochure": brochure}
+            
+            yield {"type": "done", **response}
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.telemetry.finish_turn(trace, error)
+    
+    def stream_message(self, session_id: str, user_message: str) -> Iterator[Dict[str, Any]]:
+        """Synchronous wrapper around astream_message, for the CLI and Streamlit."""
+        events = queue.Queue()
+        
+        async def produce():
+            try:
+                async for event in self.astream_message(session_id, user_message):
+                    events.put(event)
+            except Exception as e:
+                events.put(e)
+            finally:
+                events.put(None)
+        
+        asyncio.run_coroutine_threadsafe(produce(), self._get_loop())
+        while True:
+            event = events.get()
+            if event is None:
+                break
+            if isinstance(event, Exception):
+                raise event
+            yield event
+    
+    def _capture_lead(self, session: SessionState, user_message: str) -> Optional[Dict[str, Any]]:
+        """
+        Capture the lead details in a customer message with the local lead form.
+        
+        Returns a route to the lead capture tool when the message simply answers
+        the lead prompt of the previous reply (it filled the field asked for,
+        and asks nothing), so the next prompt needs no model call.
+        """
+        recent = session.memory.recent
+        pending = asked_field(recent[-1]["content"]) if recent and recent[-1]["role"] == "assistant" else None
+        captured = capture_lead_fields(session.lead_data, user_message, asked=pending)
+        if pending in captured and not is_question(user_message):
+            return {"intent": "lead", "args": {"field": pending}}
+        return None
+    
+    async def _dispatch_intent(self, session: SessionState, route: Dict[str, Any]):
+        """Call the tool for a routed intent directly, as the model would have."""
+        tools = {
+            "company": "tool_company_info",
+            "product": "tool_product_info",
+            "pricing": "tool_pricing_info",
+            "support": "tool_support_request",
+            "brochure": "tool_send_brochure",
+            "lead": "tool_lead_capture",
+        }
+        await self.tools[tools[route["intent"]]](RunContextWrapper(context=session), **route["args"])
+    
+    def _record_model_failure(self, error: BaseException) -> str:
+        """Count a turn the model did not answer in time or at all, and return the degraded-mode reason."""
+        self.breaker.record_failure()
+        if isinstance(error, asyncio.TimeoutError):
+            self.telemetry.increment("turn_deadline_misses_total")
+            return "deadline"
+        return "error"
+    
+    async def _degraded_turn(self, session: SessionState, user_message: str, trace: TurnTrace, reason: str) -> Dict[str, Any]:
+        """
+        Answer a turn without the model, from the local handlers and the lead form.
+        
+        Whatever the turn's tools already replied before the model was given up
+        on is kept. Otherwise the router's best guess at the intent is answered,
+        however unsure, followed by the next lead prompt; with nothing left to
+        ask, a callback is offered. So the funnel keeps moving while the model
+        is slow or down.
+        """
+        trace.path = "degraded"
+        self.telemetry.increment("degraded_turns_total", reason=reason)
+        if not session.results.message:
+            intent = classify_intent(user_message)
+            if intent["intent"] is not None:
+                await self._dispatch_intent(session, intent)
+            next_field = get_next_field_to_capture(session.lead_data)
+            # Pricing and support replies already end with their own next step
+            if next_field is not None and intent["intent"] not in ("pricing", "support"):
+                await self._dispatch_intent(session, {"intent": "lead", "args": {"field": next_field["name"]}})
+            elif intent["intent"] is None:
+                await self._dispatch_intent(session, {"intent": "support", "args": {"request_type": "callback"}})
+        return self._finish_turn(session, user_message, None, degraded=True)
+    
+    def _finish_turn(self, session: SessionState, user_message: str, result: Optional[RunResultBase], degraded: bool = False) -> Dict[str, Any]:
+        # Build response using final output and stored values from tool calls.
+        # result is None when the turn was answered by the intent router, or in degraded mode.
+        brochures = session.results.brochures
         response = {
-            "response": result.final_output,
-            "brochure": self.last_brochure
+            "response": result.final_output if result else None,
+            # Every brochure the turn's tools sent, in call order; "brochure" is the first of them
+            "brochure": brochures[0] if brochures else None,
+            "brochures": brochures,
+            # Run time of each tool call, in call order
+            "tool_timings": session.results.timings(),
+            "fast_path": result is None and not degraded,
+            # Answered locally because the model missed the turn's deadline, failed, or its circuit was open
+            "degraded": degraded,
+            # Estimated size of the latest prompt, and actual input tokens across the turn's model calls
+            "prompt_tokens": session.prompt_tokens,
+            "input_tokens": sum(r.usage.input_tokens for r in result.raw_responses) if result else 0,
+            # Input tokens served from the provider's prompt cache; the rest were billed at the full rate
+            "cached_input_tokens": session.cached_input_tokens,
+            # Model tier that produced the reply, when a model cascade is used
+            "model_tier": session.model_tier,
+            # Model calls made and skipped by direct-return tools, for the whole conversation
+            "usage": session.usage_stats(),
         }
         
-        # If a tool was used and provided a message, use that instead of the model's response
-        if self.last_message:
-            response["response"] = self.last_message
+        # Token usage of the turn's model calls
+        if result:
+            self.telemetry.record_usage(result.raw_responses, cached_input_tokens=session.cached_input_tokens)
+        
+        # If tools were used and provided messages, use them (merged in call order) instead of the model's response
+        if session.results.message:
+            response["response"] = session.results.message
         
         # Add to conversation history
-        self.add_to_history("user", user_message)
-        self.add_to_history("assistant", response["response"])
-            
-        return response 
\ No newline at end of file
+        session.add_to_history("user", user_message)
+        session.add_to_history("assistant", response["response"])
+        
+        # Queue the updated session for write-behind persistence
+        self.sessions.save(session)
+        
+        return response
+    
+    def process_message(self, session_id: str, user_message: str) -> Dict[str, Any]:
+        """
+        Synchronous wrapper around aprocess_message.
+        
+        Runs the turn on the agent's background event loop, so calls from many
+        threads share one loop instead of creating a new loop per turn.
+        Do not call this from code already running on an event loop; await
+        aprocess_message instead.
+        """
+        return self.run_coroutine(self.aprocess_message(session_id, user_message))
+    
+    def run_coroutine(self, coro):
+        """Run a coroutine on the background event loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_loop()).result()
+    
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        # Start the background loop on first use
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name="pare-agent-loop", daemon=True)
+                thread.start()
+            return self._loop 
+
+
+async def _stream_until(result: RunResultStreaming, expires: Optional[float]) -> AsyncIterator[Any]:
+    """A streamed run's events, raising asyncio.TimeoutError once the run is cancelled at `expires`."""
+    events = result.stream_events().__aiter__()
+    while True:
+        timeout = max(0.0, expires - time.monotonic()) if expires is not None else None
+        try:
+            # Read in this task rather than a wait_for task: the SDK ends the run's trace in the context that started it
+            async with asyncio.timeout(timeout):
+                event = await events.__anext__()
+        except StopAsyncIteration:
+            # A stream cancelled while waiting for its next event ends quietly, without completing the run
+            if not result.is_complete:
+                raise asyncio.TimeoutError
+            return
+        yield event
+
+
+async def _finish_thread(call: asyncio.Future):
+    """
+    Wait for a tool's worker thread, even when the run is cancelled meanwhile.
+    
+    A thread cannot be stopped, so a run cancelled at the turn's deadline
+    waits here until the thread is done, with the session's lead-data lock
+    still held. Only then does the degraded-mode reply read or change the lead.
+    """
+    cancelled = None
+    while True:
+        try:
+            result = await asyncio.shield(call)
+        except asyncio.CancelledError as e:
+            if call.done():
+                raise
+            cancelled = e
+            continue
+        if cancelled is not None:
+            raise cancelled
+        return result
+
+
+def traced_tool(tool):
+    """
+    Wrap a tool so that each call runs in a worker thread, with its output collected in call order.
+    
+    The SDK starts all the tool calls of one model step together, so tools that
+    wait on I/O (the lead index, brochure search) overlap instead of queueing.
+    Tools in LEAD_DATA_TOOLS still run one at a time per session, in call order.
+    Each call is recorded as a span and as the turn's chosen tool, in the
+    turn's telemetry, and its run time in the turn's results.
+    """
+    name = tool.__name__
+    
+    @functools.wraps(tool)
+    async def traced(ctx: RunContextWrapper[SessionState], *args, **kwargs):
+        telemetry = current_telemetry.get() or get_telemetry()
+        telemetry.record_tool(name)
+        session = ctx.context
+        # Reserved before the first await, so slots follow the order the calls were made
+        result = session.results.begin(name)
+        
+        def run():
+            start = time.perf_counter()
+            try:
+                with telemetry.span("tool", tool=name):
+                    return tool(ctx, *args, **kwargs)
+            finally:
+                result.elapsed = time.perf_counter() - start
+        
+        # The worker thread copies this context, so the tool records into its own slot
+        token = current_tool_result.set(result)
+        try:
+            if name in LEAD_DATA_TOOLS:
+                async with session.lead_data_lock:
+                    return await _finish_thread(asyncio.ensure_future(asyncio.to_thread(run)))
+            return await asyncio.to_thread(run)
+        finally:
+            current_tool_result.reset(token)
+    
+    return traced
+
+
+# Tools shared by every PareAgent, by name
+TOOLS = {
+    tool.__name__: traced_tool(tool)
+    for tool in [
+        PareAgent.tool_company_info,
+        PareAgent.tool_product_info,
+        PareAgent.tool_lead_capture,
+        PareAgent.tool_pricing_info,
+        PareAgent.tool_support_request,
+        PareAgent.tool_send_brochure,
+        PareAgent.tool_search_catalog,
+    ]
+}
+
+
+@functools.lru_cache(maxsize=None)
+def agent_definition() -> Agent:
+    """
+    The OpenAI agent's instructions and tools, built on first use and shared by every PareAgent.
+    
+    Deriving the tools' JSON schemas is most of the cost of building an Agent;
+    each PareAgent clones this definition with its own model instead.
+    """
+    return Agent(
+        name="pare_assistant",
+        instructions=INSTRUCTIONS,
+        tools=[function_tool(tool) for tool in TOOLS.values()],
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def configure_openai():
+    """Load .env and set the OpenAI API key, once per process, when the first PareAgent is built rather than on import."""
+    load_environment()
+    
+    # Also used for exporting SDK traces, whose exporter read the environment before .env was loaded
+    api_key = os.getenv("OPENAI_API_KEY")
+    if api_key:
+        set_default_openai_key(api_key)
@@ -0,0 +1,241 @@
+"""
+Chat API
+ASGI HTTP service that exposes PareAgent to any number of worker processes.
+
+Session state lives in a shared SQLite store written through on every turn,
+so any worker can serve any session and workers can be added per core. The
+app has no framework dependency; run it with an ASGI server, e.g.
+`python server.py --workers 4` or `uvicorn src.api:app --workers 4`.
+
+Endpoints:
+    GET    /health                   liveness, with this worker's session and admission stats
+    GET    /metrics                  this worker's metrics in the Prometheus text format
+    POST   /sessions                 start a conversation: {"session_id"}
+    GET    /sessions/{id}            lead data and recent messages of a saved conversation (404 if none)
+    POST   /sessions/{id}/reset      forget a conversation (also DELETE /sessions/{id})
+    POST   /sessions/{id}/messages   {"message", "stream"}: the turn's response, or with
+                                     "stream": true (or Accept: text/event-stream) the
+                                     agent's events as server-sent events
+
+A message whose conversation was changed by another worker while it was being
+answered (concurrent messages for one session) gets 409, or a final "conflict"
+event when streamed; send it again.
+"""
+
+import json
+import logging
+import os
+import re
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.agent import PareAgent, DEFAULT_MODEL
+from src.utils.session_store import SessionConflict, SQLiteSessionStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_DB_PATH = os.path.join("data", "sessions.db")
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 64 * 1024
+
+# Error of a message whose conversation another worker changed while it was answered
+CONFLICT_MESSAGE = "The conversation changed while this message was answered; send it again"
+
+_SESSION_PATH = re.compile(r"^/sessions/([A-Za-z0-9_-]{1,128})(/messages|/reset)?$")
+
+
+class HTTPError(Exception):
+    """Error returned to the client as a JSON body with the given status."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def create_agent() -> PareAgent:
+    """
+    Build the agent for one worker process.
+
+    Sessions are kept in the SQLite database at SESSION_DB_PATH (default
+    data/sessions.db), shared by all workers and written through on each turn.
+    Each worker delivers leads from its own CRM spool, and serves its own
+    /metrics; METRICS_PORT is ignored.
+
+    SIMULATED_MODEL_LATENCY="<median>,<p95>" (seconds) replaces the OpenAI
+    model with a simulated one, for load tests without an API key.
+    """
+    os.environ.setdefault("CRM_SPOOL_PER_WORKER", "1")
+    # Every worker serves its own /metrics, so a separate METRICS_PORT would be bound by each of them
+    os.environ.pop("METRICS_PORT", None)
+    store = SQLiteSessionStore(os.getenv("SESSION_DB_PATH", DEFAULT_SESSION_DB_PATH), flush_interval=0)
+
+    model = DEFAULT_MODEL
+    simulated = os.getenv("SIMULATED_MODEL_LATENCY")
+    if simulated:
+        from src.utils.mock_model import MockModel, funnel_responder, lognormal_latency
+        median, p95 = (float(value) for value in simulated.split(","))
+        model = MockModel(responder=funnel_responder, latency=lognormal_latency(median, p95))
+    return PareAgent(model=model, session_store=store, shared_sessions=True)
+
+
+class ChatAPI:
+    """ASGI application serving the chat endpoints."""
+
+    def __init__(self, agent_factory: Callable[[], PareAgent] = create_agent):
+        self.agent_factory = agent_factory
+        self._agent: Optional[PareAgent] = None
+
+    @property
+    def agent(self) -> PareAgent:
+        # Built on first use (or at startup), so importing the app does not open the database
+        if self._agent is None:
+            self._agent = self.agent_factory()
+        return self._agent
+
+    async def __call__(self, scope: Dict, receive: Callable, send: Callable):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive: Callable, send: Callable):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.agent
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self._agent is not None and self._agent.sessions.store is not None:
+                    self._agent.sessions.store.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _http(self, scope: Dict, receive: Callable, send: Callable):
+        method = scope["method"]
+        path = scope["path"].rstrip("/") or "/"
+        try:
+            if path == "/health" and method == "GET":
+                health = {"status": "ok", "pid": os.getpid(), "sessions": self.agent.sessions.stats()}
+                if self.agent.admission is not None:
+                    health["admission"] = self.agent.admission.stats()
+                await self._send_json(send, 200, health)
+            elif path == "/metrics" and method == "GET":
+                body = self.agent.telemetry.prometheus_text().encode("utf-8")
+                await self._send(send, 200, body, "text/plain; version=0.0.4")
+            elif path == "/sessions" and method == "POST":
+                await self._send_json(send, 201, {"session_id": uuid.uuid4().hex})
+            else:
+                match = _SESSION_PATH.match(path)
+                if match is None:
+                    raise HTTPError(404, "Not found")
+                session_id, action = match.groups()
+                if action is None and method == "GET":
+                    await self._send_json(send, 200, self._session_info(session_id))
+                elif (action == "/reset" and method == "POST") or (action is None and method == "DELETE"):
+                    self.agent.sessions.reset(session_id)
+                    await self._send_json(send, 200, {"session_id": session_id, "reset": True})
+                elif action == "/messages" and method == "POST":
+                    await self._message(scope, receive, send, session_id)
+                else:
+                    raise HTTPError(405, "Method not allowed")
+        except HTTPError as e:
+            await self._send_json(send, e.status, {"error": e.message})
+        except SessionConflict:
+            await self._send_json(send, 409, {"error": CONFLICT_MESSAGE})
+        except Exception as e:
+            logger.exception("Error handling %s %s", method, path)
+            await self._send_json(send, 500, {"error": str(e)})
+
+    def _session_info(self, session_id: str) -> Dict[str, Any]:
+        # A snapshot from the shared store: neither pools the session nor touches one whose turn is running
+        store = self.agent.sessions.store
+        saved = store.load(session_id) if store is not None else None
+        if saved is None:
+            raise HTTPError(404, "Session not found")
+        return {
+            "session_id": session_id,
+            "lead_data": saved.get("lead_data", {}),
+            "messages": saved.get("memory", {}).get("recent", []),
+        }
+
+    async def _message(self, scope: Dict, receive: Callable, send: Callable, session_id: str):
+        body = await self._read_json(receive)
+        message = body.get("message")
+        if not isinstance(message, str) or not message.strip():
+            raise HTTPError(400, "Request body needs a non-empty \"message\"")
+
+        accept = dict(scope.get("headers", [])).get(b"accept", b"").decode("latin-1")
+        if not (body.get("stream") or "text/event-stream" in accept):
+            response = await self.agent.aprocess_message(session_id, message)
+            await self._send_json(send, 200, response)
+            return
+
+        # Server-sent events: one event per agent event, named by its type
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+        try:
+            async for event in self.agent.astream_message(session_id, message):
+                await send({"type": "http.response.body", "body": _sse(event), "more_body": True})
+        except SessionConflict:
+            # The streamed counterpart of a 409: the client sends the message again
+            conflict = {"type": "conflict", "error": CONFLICT_MESSAGE}
+            await send({"type": "http.response.body", "body": _sse(conflict), "more_body": True})
+        except Exception as e:
+            # Headers are already sent, so report the error as a final event
+            logger.exception("Error streaming a message for session %s", session_id)
+            await send({"type": "http.response.body", "body": _sse({"type": "error", "error": str(e)}), "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    @staticmethod
+    async def _read_json(receive: Callable) -> Dict[str, Any]:
+        body = b""
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise HTTPError(400, "Client disconnected")
+            body += message.get("body", b"")
+            if len(body) > MAX_BODY_BYTES:
+                raise HTTPError(413, "Request body too large")
+            if not message.get("more_body"):
+                break
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return data
+
+    @staticmethod
+    async def _send(send: Callable, status: int, body: bytes, content_type: str):
+        headers: List[Tuple[bytes, bytes]] = [
+            (b"content-type", content_type.encode("latin-1")),
+            (b"content-length", str(len(body)).encode("latin-1")),
+        ]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_json(self, send: Callable, status: int, data: Dict[str, Any]):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        await self._send(send, status, body, "application/json")
+
+
+def _sse(event: Dict[str, Any]) -> bytes:
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+# The ASGI app, for `uvicorn src.api:app`
+app = ChatAPI()
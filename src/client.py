@@ -0,0 +1,80 @@
+"""
+Chat API Client
+Thin HTTP client for the chat API (src/api.py), used by the CLI and Streamlit.
+
+The API URL is taken from PARE_API_URL (default http://127.0.0.1:8000).
+Streamed turns yield the same event dicts as PareAgent.stream_message.
+"""
+
+import json
+import os
+from typing import Any, Dict, Iterator, Optional
+
+import requests
+
+DEFAULT_API_URL = "http://127.0.0.1:8000"
+DEFAULT_TIMEOUT = (3.05, 120)  # connect, read seconds
+
+
+class ChatAPIError(Exception):
+    """Error reported by the chat API."""
+
+
+class ChatClient:
+    """Client for one chat API server."""
+
+    def __init__(self, base_url: Optional[str] = None, timeout=DEFAULT_TIMEOUT):
+        self.base_url = (base_url or os.getenv("PARE_API_URL", DEFAULT_API_URL)).rstrip("/")
+        self.timeout = timeout
+        self.http = requests.Session()
+
+    def create_session(self) -> str:
+        """Start a conversation and return its session id."""
+        return self._request("POST", "/sessions")["session_id"]
+
+    def get_session(self, session_id: str) -> Dict[str, Any]:
+        """Return the lead data and recent messages of a conversation."""
+        return self._request("GET", f"/sessions/{session_id}")
+
+    def reset_session(self, session_id: str):
+        """Forget a conversation."""
+        self._request("POST", f"/sessions/{session_id}/reset")
+
+    def send_message(self, session_id: str, message: str) -> Dict[str, Any]:
+        """Send a message and return the turn's response."""
+        return self._request("POST", f"/sessions/{session_id}/messages", {"message": message})
+
+    def stream_message(self, session_id: str, message: str) -> Iterator[Dict[str, Any]]:
+        """Send a message and yield the agent's events as they arrive."""
+        response = self.http.post(
+            f"{self.base_url}/sessions/{session_id}/messages",
+            json={"message": message, "stream": True},
+            headers={"Accept": "text/event-stream"},
+            stream=True,
+            timeout=self.timeout,
+        )
+        with response:
+            self._raise_for_status(response)
+            for line in response.iter_lines(decode_unicode=True):
+                # Each event's "data:" line carries the whole event, including its type
+                if not line or not line.startswith("data:"):
+                    continue
+                event = json.loads(line[len("data:"):])
+                if event.get("type") == "error":
+                    raise ChatAPIError(event.get("error", "Unknown error"))
+                yield event
+
+    def _request(self, method: str, path: str, body: Optional[Dict] = None) -> Dict[str, Any]:
+        response = self.http.request(method, f"{self.base_url}{path}", json=body, timeout=self.timeout)
+        self._raise_for_status(response)
+        return response.json()
+
+    @staticmethod
+    def _raise_for_status(response: requests.Response):
+        if response.status_code < 400:
+            return
+        try:
+            message = response.json().get("error", response.reason)
+        except ValueError:
+            message = response.reason
+        raise ChatAPIError(f"{response.status_code}: {message}")
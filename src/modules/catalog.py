@@ -0,0 +1,297 @@
+"""
+Product Catalog Module
+Loads the product catalog from src/data/products.json into an immutable index.
+
+Products can be looked up by category, finish, application and name. Names
+are matched exactly first (including aliases and Hindi spellings), then with a
+character-trigram fuzzy matcher, so typos and transliterations such as
+"soffitt", "easy plus" or "linia" still find the right product. The catalog
+file is reloaded automatically when it changes.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATALOG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "products.json")
+
+# Minimum trigram similarity (Dice coefficient) for a fuzzy name match
+DEFAULT_FUZZY_THRESHOLD = 0.5
+
+# Stricter minimum for words inside a longer text, where common words can resemble short names
+PHRASE_FUZZY_THRESHOLD = 0.65
+
+# Longest run of words tried as a product name inside a longer text
+MAX_NAME_WORDS = 3
+
+# Trigrams found in more than this fraction of names (and at least this many) are "common"
+COMMON_GRAM_FRACTION = 0.05
+COMMON_GRAM_MIN_POSTINGS = 100
+
+# Fuzzy lookups remembered per index
+FUZZY_CACHE_SIZE = 4096
+
+# Seconds between checks of the catalog file's modification time
+DEFAULT_RELOAD_INTERVAL = 2.0
+
+# Anything but letters, digits and Devanagari (whose vowel signs are not word characters)
+_NON_WORD = re.compile(r"[^\w\u0900-\u097F]+", re.UNICODE)
+
+
+class Product(NamedTuple):
+    """A catalog product."""
+
+    id: str
+    name: str
+    category: str
+    description: str
+    finishes: Tuple[str, ...]
+    applications: Tuple[str, ...]
+    aliases: Tuple[str, ...]
+    featured: bool
+    # Language -> translated text fields, e.g. {"hi": {"description": ...}}
+    translations: Mapping[str, Mapping[str, str]] = MappingProxyType({})
+
+    def localized(self, field: str, language: Optional[str] = None) -> str:
+        """A text field in `language`, falling back to English."""
+        return self.translations.get(language, {}).get(field) or getattr(self, field)
+
+
+def localized_category(category: Mapping, field: str, language: Optional[str] = None) -> str:
+    """A category's text field (name, intro, listing) in `language`, falling back to English."""
+    return category.get("translations", {}).get(language, {}).get(field) or category[field]
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase, spell out "+" and collapse punctuation and spaces, so "Easy+" matches "easy plus"."""
+    text = text.lower().replace("+", " plus ")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """Character trigrams of a normalized name, padded so that word starts weigh more."""
+    padded = f"  {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CatalogIndex:
+    """Immutable lookup index over a list of products."""
+
+    def __init__(self, categories: Dict[str, Dict], products: List[Product], fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.categories: Mapping[str, Mapping] = MappingProxyType(
+            {key: MappingProxyType(dict(value)) for key, value in categories.items()}
+        )
+        self.products: Mapping[str, Product] = MappingProxyType({p.id: p for p in products})
+
+        by_category: Dict[str, List[str]] = {}
+        by_finish: Dict[str, List[str]] = {}
+        by_application: Dict[str, List[str]] = {}
+        names: Dict[str, str] = {}
+        for product in products:
+            by_category.setdefault(product.category, []).append(product.id)
+            for finish in product.finishes:
+                by_finish.setdefault(finish, []).append(product.id)
+            for application in product.applications:
+                by_application.setdefault(application, []).append(product.id)
+            for name in (product.id, product.name) + product.aliases:
+                names.setdefault(normalize_name(name), product.id)
+
+        self._by_category = MappingProxyType({k: tuple(v) for k, v in by_category.items()})
+        self._by_finish = MappingProxyType({k: tuple(v) for k, v in by_finish.items()})
+        self._by_application = MappingProxyType({k: tuple(v) for k, v in by_application.items()})
+        self._names = MappingProxyType(names)
+
+        # Trigram -> names containing it, for fuzzy matching without scanning every name
+        grams: Dict[str, List[str]] = {}
+        self._name_grams = MappingProxyType({name: trigrams(name) for name in names})
+        for name, name_grams in self._name_grams.items():
+            for gram in name_grams:
+                grams.setdefault(gram, []).append(name)
+        self._grams = MappingProxyType({k: tuple(v) for k, v in grams.items()})
+        self._min_name_size = min((len(g) for g in self._name_grams.values()), default=1)
+        self._fuzzy_cache: Dict[str, Tuple[Optional[Product], float]] = {}
+
+    @classmethod
+    def from_dict(cls, data: Dict, fuzzy_threshold: float = DEFAULT_FUZZY_THRESHOLD) -> "CatalogIndex":
+        """Build an index from the parsed catalog file."""
+        products = [
+            Product(
+                id=item["id"],
+                name=item["name"],
+                category=item["category"],
+                description=item.get("description", ""),
+                finishes=tuple(item.get("finishes", [])),
+                applications=tuple(item.get("applications", [])),
+                aliases=tuple(item.get("aliases", [])),
+                featured=item.get("featured", True),
+                translations=MappingProxyType(
+                    {language: MappingProxyType(dict(fields)) for language, fields in item.get("translations", {}).items()}
+                ),
+            )
+            for item in data.get("products", [])
+        ]
+        return cls(data.get("categories", {}), products, fuzzy_threshold)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def by_category(self, category: str) -> List[Product]:
+        """Products in a category (wall, ceiling, facade)."""
+        return [self.products[pid] for pid in self._by_category.get(category.lower(), ())]
+
+    def by_finish(self, finish: str) -> List[Product]:
+        """Products available in a finish (wooden, marble, pastel)."""
+        return [self.products[pid] for pid in self._by_finish.get(finish.lower(), ())]
+
+    def by_application(self, application: str) -> List[Product]:
+        """Products suited to an application (interior, exterior, residential, commercial)."""
+        return [self.products[pid] for pid in self._by_application.get(application.lower(), ())]
+
+    def find(self, name: str) -> Optional[Product]:
+        """
+        Return the product best matching a product name, or None.
+
+        Tries an exact match on names and aliases, then fuzzy trigram matching on
+        the whole text, then on each run of up to MAX_NAME_WORDS words, so a
+        product named inside a longer phrase is still found.
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        if key in self._names:
+            return self.products[self._names[key]]
+
+        match = self._fuzzy(key)
+        if match is not None:
+            return match
+
+        # A product named inside a longer text: exact matches on word runs first, then fuzzy ones
+        words = key.split()
+        windows = [
+            " ".join(words[start:start + size])
+            for size in range(min(MAX_NAME_WORDS, len(words) - 1), 0, -1)
+            for start in range(len(words) - size + 1)
+        ]
+        for window in windows:
+            if window in self._names:
+                return self.products[self._names[window]]
+
+        best, best_score = None, 0.0
+        for window in windows:
+            product, score = self._best_fuzzy(window)
+            if score > best_score:
+                best, best_score = product, score
+        return best if best_score >= max(self.fuzzy_threshold, PHRASE_FUZZY_THRESHOLD) else None
+
+    def _fuzzy(self, key: str) -> Optional[Product]:
+        product, score = self._best_fuzzy(key)
+        return product if score >= self.fuzzy_threshold else None
+
+    def _best_fuzzy(self, key: str) -> Tuple[Optional[Product], float]:
+        cached = self._fuzzy_cache.get(key)
+        if cached is not None:
+            return cached
+
+        query = trigrams(key)
+        size = len(query)
+        postings = [self._grams.get(gram, ()) for gram in query]
+
+        # Trigrams shared by a large part of the catalog (e.g. "  s") cost the most to count and
+        # say the least. When a name sharing only those could not reach the threshold anyway,
+        # collect candidates from the rarer trigrams and score just those.
+        common_limit = max(COMMON_GRAM_MIN_POSTINGS, len(self._name_grams) * COMMON_GRAM_FRACTION)
+        rare = [names for names in postings if len(names) <= common_limit]
+        common_count = len(postings) - len(rare)
+        if common_count and 2 * common_count / (size + self._min_name_size) < self.fuzzy_threshold:
+            candidates = set(chain.from_iterable(rare))
+            shared = {name: len(query & self._name_grams[name]) for name in candidates}
+        else:
+            # Count shared trigrams per candidate name; Counter does the counting in C
+            shared = Counter(chain.from_iterable(postings))
+
+        result = (None, 0.0)
+        if shared:
+            # Dice coefficient between the query's and each candidate name's trigrams
+            name_grams = self._name_grams
+            name, score = max(
+                ((name, 2 * count / (size + len(name_grams[name]))) for name, count in shared.items()),
+                key=itemgetter(1),
+            )
+            result = (self.products[self._names[name]], score)
+
+        # The index never changes, so results can be cached for its lifetime
+        if len(self._fuzzy_cache) >= FUZZY_CACHE_SIZE:
+            self._fuzzy_cache.clear()
+        self._fuzzy_cache[key] = result
+        return result
+
+
+class ProductCatalog:
+    """Holds the current catalog index and reloads it when the catalog file changes."""
+
+    def __init__(self, path: str = DEFAULT_CATALOG_PATH, reload_interval: float = DEFAULT_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._index = self._load()
+
+    @property
+    def index(self) -> CatalogIndex:
+        """The current index, reloaded first if the file has changed since the last check."""
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self.reload_if_changed(now)
+        return self._index
+
+    def reload_if_changed(self, now: Optional[float] = None) -> bool:
+        """Rebuild the index if the catalog file was modified. Returns True if it was reloaded."""
+        with self._lock:
+            self._checked_at = time.monotonic() if now is None else now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return False
+            if mtime == self._mtime:
+                return False
+            try:
+                # The new index replaces the old one in a single assignment; readers never see a partial index
+                self._index = self._load()
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Could not reload product catalog %s: %s", self.path, e)
+                self._mtime = mtime
+                return False
+            logger.info("Reloaded product catalog %s (%d products)", self.path, len(self._index))
+            return True
+
+    def _load(self) -> CatalogIndex:
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, encoding="utf-8") as f:
+            index = CatalogIndex.from_dict(json.load(f))
+        self._mtime = mtime
+        return index
+
+
+_catalog: Optional[ProductCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> CatalogIndex:
+    """Return the current product catalog index, loading it on first use."""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = ProductCatalog(os.getenv("PRODUCT_CATALOG_PATH", DEFAULT_CATALOG_PATH))
+    return _catalog.index
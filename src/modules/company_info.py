@@ -3,23 +3,43 @@ Company Information Module
 Handles queries about PARE company.
 """
 
-# Company information template
-COMPANY_INFO = """
+from typing import Optional
+
+from src.modules.localization import localize
+
+# Company information template, by language
+COMPANY_INFO = {
+    "en": """
 PARÉ is a leading manufacturer of innovative decorative surfaces for walls, ceilings, and facades. 
 We serve both residential and commercial projects across India.
-"""
+""",
+    "hi": """
+PARÉ दीवारों, छतों और फसाड के लिए नए ज़माने की सजावटी सतहों का एक अग्रणी निर्माता है। 
+हम पूरे भारत में आवासीय और व्यावसायिक, दोनों तरह के प्रोजेक्ट्स के लिए काम करते हैं।
+""",
+    "hinglish": """
+PARÉ walls, ceilings aur facades ke liye innovative decorative surfaces ka leading manufacturer hai. 
+Hum poore India mein residential aur commercial, dono tarah ke projects serve karte hain.
+""",
+}
+
+REQUIREMENT_QUESTION = {
+    "en": "Please share details about your current requirement?",
+    "hi": "कृपया अपनी मौजूदा ज़रूरत के बारे में बताएं?",
+    "hinglish": "Please apni current requirement ke baare mein batayein?",
+}
 
-def get_company_info() -> str:
+def get_company_info(language: Optional[str] = None) -> str:
     """Return company information."""
-    return COMPANY_INFO.strip()
+    return localize(COMPANY_INFO, language).strip()
 
-def handle_company_query() -> dict:
-    """Handle a query about the company."""
-    response = f"{get_company_info()}\n\nPlease share details about your current requirement?"
+def handle_company_query(language: Optional[str] = None) -> dict:
+    """Handle a query about the company, in the customer's language."""
+    response = f"{get_company_info(language)}\n\n{localize(REQUIREMENT_QUESTION, language)}"
     
     # Return response and set next module to lead capture
     return {
         "message": response,
         "next_module": "lead_capture",
         "brochure": None
-    } 
\ No newline at end of file
+    } 
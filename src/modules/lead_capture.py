@@ -1,51 +1,174 @@
 """
 Lead Capture Module
 Handles lead information collection.
+
+LEAD_FIELDS declares the lead form (see lead_form.py): each field's type,
+prompts and checks, in the order they are asked. Answers are parsed
+locally, so "around 2k sqft" is stored as "2,000 sq.ft." and "our office"
+as "Commercial" without another model turn.
 """
 
+import re
 from typing import Dict, Optional
 
-# Lead fields to capture
+from src.modules.lead_extraction import MAX_QUANTITY, MIN_QUANTITY
+from src.modules.lead_form import LeadForm
+from src.modules.localization import localize
+
+# Lead fields to capture, in order, with their types, checks and prompts by language.
+# Fields with "required": False are kept when the customer gives them but never asked for here.
 LEAD_FIELDS = [
     {
         "name": "location",
-        "prompt": "Which location and city are you from?"
+        "type": "city",
+        "prompt": {
+            "en": "Which location and city are you from?",
+            "hi": "आप किस जगह और शहर से हैं?",
+            "hinglish": "Aap kis location aur city se hain?",
+        }
     },
     {
         "name": "requirement_type",
-        "prompt": "What type of requirement do you have? (Residential / Commercial)"
+        "type": "requirement",
+        "choices": ["Residential", "Commercial"],
+        "prompt": {
+            "en": "What type of requirement do you have? (Residential / Commercial)",
+            "hi": "आपकी ज़रूरत किस तरह की है? (आवासीय / व्यावसायिक)",
+            "hinglish": "Aapki requirement kis type ki hai? (Residential / Commercial)",
+        }
+    },
+    {
+        "name": "space_type",
+        "type": "space",
+        "when": {"requirement_type": "Commercial"},
+        "prompt": {
+            "en": "What kind of commercial space is it? (Office / Shop / Restaurant / Hotel / Clinic / School)",
+            "hi": "यह किस तरह की व्यावसायिक जगह है? (ऑफिस / दुकान / रेस्टोरेंट / होटल / क्लिनिक / स्कूल)",
+            "hinglish": "Yeh kis type ki commercial space hai? (Office / Shop / Restaurant / Hotel / Clinic / School)",
+        }
     },
     {
         "name": "quantity",
-        "prompt": "What quantity (in sq.ft.) are you looking for our panels?"
-    }
+        "type": "area",
+        "min": MIN_QUANTITY,
+        "max": MAX_QUANTITY,
+        "prompt": {
+            "en": "What quantity (in sq.ft.) are you looking for our panels?",
+            "hi": "आपको हमारे पैनल कितनी मात्रा (वर्ग फुट में) में चाहिए?",
+            "hinglish": "Aapko hamare panels kitni quantity (sq.ft. mein) mein chahiye?",
+        }
+    },
+    {
+        "name": "name",
+        "type": "name",
+        "required": False,
+        "prompt": {
+            "en": "Could you please share your name?",
+            "hi": "क्या आप अपना नाम बता सकते हैं?",
+            "hinglish": "Kya aap apna naam share kar sakte hain?",
+        }
+    },
+    {
+        "name": "phone",
+        "type": "phone",
+        "required": False,
+        "pattern": r"\+91[6-9]\d{9}",
+        "prompt": {
+            "en": "Could you please share your phone number?",
+            "hi": "क्या आप अपना फ़ोन नंबर बता सकते हैं?",
+            "hinglish": "Kya aap apna phone number share kar sakte hain?",
+        }
+    },
+    {
+        "name": "email",
+        "type": "email",
+        "required": False,
+        "pattern": r"[^@\s]+@[^@\s]+\.[a-z]{2,}",
+        "prompt": {
+            "en": "Could you please share your email address?",
+            "hi": "क्या आप अपना ईमेल पता बता सकते हैं?",
+            "hinglish": "Kya aap apna email address share kar sakte hain?",
+        }
+    },
 ]
 
+LEAD_FORM = LeadForm(LEAD_FIELDS)
+
+# Asked again when an answer cannot be read
+INVALID_ANSWER = {
+    "en": "Sorry, I couldn't quite get that. {prompt}",
+    "hi": "माफ़ कीजिए, मैं ठीक से समझ नहीं पाया। {prompt}",
+    "hinglish": "Sorry, main theek se samajh nahi paaya. {prompt}",
+}
+
+# A message that asks something rather than only answering a lead prompt
+_QUESTION = re.compile(
+    r"\?|\b(?:what|which|how|why|when|where|can you|could you|do you|does|is there|are there|is it|are they|will it|can it"
+    r"|kya|kaun|kaunsa|kaise|kitna|kitne|kitni|kyun|kab|kahan)\b|क्या|कौन|कैसे|कितना|कितने|क्यों|कब|कहाँ",
+    re.IGNORECASE,
+)
+
+LEAD_COMPLETE = {
+    "en": "Thank you for sharing your details. This will help us offer the best recommendations and support for your project.",
+    "hi": "अपनी जानकारी साझा करने के लिए धन्यवाद। इससे हम आपके प्रोजेक्ट के लिए सबसे अच्छे सुझाव और सहायता दे पाएंगे।",
+    "hinglish": "Apni details share karne ke liye thank you. Isse hum aapke project ke liye best recommendations aur support de payenge.",
+}
+
+# Sent once a completed lead has been handed to the CRM
+LEAD_SUBMITTED = {
+    "en": "Thank you for providing your details. Someone will be in touch with you shortly.",
+    "hi": "अपनी जानकारी देने के लिए धन्यवाद। हमारी टीम जल्द ही आपसे संपर्क करेगी।",
+    "hinglish": "Details dene ke liye thank you. Hamari team jald hi aapse contact karegi.",
+}
+
 def get_next_field_to_capture(lead_data: Dict[str, Optional[str]]) -> Optional[Dict]:
     """
     Determine the next field to capture from the customer.
     """
-    for field_info in LEAD_FIELDS:
-        field_name = field_info["name"]
-        if lead_data.get(field_name) is None:
-            return field_info
-    return None
+    return LEAD_FORM.next_field(lead_data)
+
+def capture_lead_fields(lead_data: Dict[str, Optional[str]], text: str, asked: Optional[str] = None) -> Dict[str, str]:
+    """
+    Capture every lead field found in a customer's message, and return the fields captured.
+    
+    `asked` is the field whose prompt the message answers; its value replaces
+    any earlier one. Other fields mentioned in passing only fill gaps, so a
+    question about another city does not overwrite the customer's location.
+    """
+    found = LEAD_FORM.parse_all(text, asked=asked)
+    captured = {field: value for field, value in found.items() if field == asked or not lead_data.get(field)}
+    lead_data.update(captured)
+    return captured
+
+def is_question(text: str) -> bool:
+    """Whether a message asks something, rather than only answering."""
+    return bool(_QUESTION.search(text))
 
 def update_lead_data(lead_data: Dict[str, Optional[str]], field: str, value: str) -> Dict[str, Optional[str]]:
     """
-    Update the lead data with a new field value.
+    Update the lead data with a field's value, parsed and checked by the lead form.
     """
-    if field in lead_data:
-        lead_data[field] = value
+    capture_lead_fields(lead_data, value, asked=field)
     return lead_data
 
-def handle_lead_capture(lead_data: Dict[str, Optional[str]], field: str = None, value: str = None) -> Dict:
+def handle_lead_capture(lead_data: Dict[str, Optional[str]], field: str = None, value: str = None, language: Optional[str] = None) -> Dict:
     """
-    Handle lead capture process.
+    Handle lead capture process, prompting in the customer's language.
+    
+    The value is read by the field's parser, along with any other lead details
+    in it; a value that cannot be read is asked for again.
     """
     # If a field and value are provided, update the lead data
     if field and value:
-        lead_data = update_lead_data(lead_data, field, value)
+        captured = capture_lead_fields(lead_data, value, asked=field)
+        if field in LEAD_FORM and field not in captured:
+            prompt = localize(LEAD_FORM.spec(field)["prompt"], language)
+            return {
+                "message": localize(INVALID_ANSWER, language).format(prompt=prompt),
+                "next_field": field,
+                "next_module": "lead_capture",
+                "is_complete": False
+            }
     
     # Get the next field to capture
     next_field = get_next_field_to_capture(lead_data)
@@ -53,7 +176,7 @@ def handle_lead_capture(lead_data: Dict[str, Optional[str]], field: str = None,
     # If we have more fields to capture, continue the lead capture process
     if next_field:
         return {
-            "message": next_field["prompt"],
+            "message": localize(next_field["prompt"], language),
             "next_field": next_field["name"],
             "next_module": "lead_capture",
             "is_complete": False
@@ -61,19 +184,8 @@ def handle_lead_capture(lead_data: Dict[str, Optional[str]], field: str = None,
     
     # If we have captured all fields, mark lead capture as complete
     return {
-        "message": "Thank you for sharing your details. This will help us offer the best recommendations and support for your project.",
+        "message": localize(LEAD_COMPLETE, language),
         "next_field": None,
         "next_module": "support",
         "is_complete": True
     }
-
-def send_lead_to_crm(lead_data: Dict[str, Optional[str]]) -> bool:
-    """
-    Send lead data to CRM system.
-    This is a placeholder for actual CRM integration.
-    """
-    # In a real implementation, this would send the data to a CRM API
-    print("Sending lead data to CRM:", lead_data)
-    
-    # For demo purposes, always return success
-    return True 
\ No newline at end of file
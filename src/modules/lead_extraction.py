@@ -0,0 +1,458 @@
+"""
+Lead Extraction Module
+Finds lead details in a conversation's text with local rules, without a model call.
+
+Location comes from a lexicon of Indian cities (with old, short and Hindi
+names), requirement type and kind of space from keywords, quantity from
+areas with a unit ("1,200 sq ft", "1.5k sqft", "100 sq m", "do hazaar square
+feet"), and contact details from phone, email and "my name is" patterns.
+A customer's reply to one of the lead capture prompts is read more loosely,
+since the question says what the answer is: a bare number answers the
+quantity prompt, and a short unknown place name answers the location prompt.
+The lead form (lead_form.py) uses these rules as its field parsers.
+"""
+
+import functools
+import re
+from typing import Dict, Iterable, List, Optional
+
+from src.modules.pricing import SQFT_PER_SQM, parse_quantity
+
+# Canonical city name -> other spellings and names customers use
+CITY_ALIASES = {
+    "Mumbai": ["bombay", "navi mumbai", "मुंबई", "बंबई"],
+    "Delhi": ["new delhi", "dilli", "ncr", "दिल्ली"],
+    "Bengaluru": ["bangalore", "blr", "बेंगलुरु", "बैंगलोर"],
+    "Hyderabad": ["hyd", "secunderabad", "हैदराबाद"],
+    "Chennai": ["madras", "चेन्नई"],
+    "Kolkata": ["calcutta", "कोलकाता"],
+    "Pune": ["poona", "pimpri", "chinchwad", "पुणे"],
+    "Ahmedabad": ["amdavad", "अहमदाबाद"],
+    "Gurugram": ["gurgaon", "गुरुग्राम", "गुड़गांव"],
+    "Noida": ["greater noida", "नोएडा"],
+    "Ghaziabad": ["गाजियाबाद"],
+    "Faridabad": ["फरीदाबाद"],
+    "Jaipur": ["जयपुर"],
+    "Lucknow": ["लखनऊ"],
+    "Kanpur": ["कानपुर"],
+    "Chandigarh": ["mohali", "panchkula", "चंडीगढ़"],
+    "Ludhiana": ["लुधियाना"],
+    "Amritsar": ["अमृतसर"],
+    "Jalandhar": ["जालंधर"],
+    "Dehradun": ["देहरादून"],
+    "Indore": ["इंदौर"],
+    "Bhopal": ["भोपाल"],
+    "Nagpur": ["नागपुर"],
+    "Nashik": ["nasik", "नासिक"],
+    "Aurangabad": ["sambhajinagar", "औरंगाबाद"],
+    "Surat": ["सूरत"],
+    "Vadodara": ["baroda", "वडोदरा"],
+    "Rajkot": ["राजकोट"],
+    "Goa": ["panaji", "margao", "गोवा"],
+    "Patna": ["पटना"],
+    "Ranchi": ["रांची"],
+    "Raipur": ["रायपुर"],
+    "Bhubaneswar": ["भुवनेश्वर"],
+    "Guwahati": ["गुवाहाटी"],
+    "Varanasi": ["banaras", "benares", "वाराणसी", "बनारस"],
+    "Agra": ["आगरा"],
+    "Meerut": ["मेरठ"],
+    "Udaipur": ["उदयपुर"],
+    "Jodhpur": ["जोधपुर"],
+    "Kochi": ["cochin", "ernakulam", "कोच्चि"],
+    "Thiruvananthapuram": ["trivandrum", "तिरुवनंतपुरम"],
+    "Coimbatore": ["कोयंबटूर"],
+    "Madurai": ["मदुरै"],
+    "Mysuru": ["mysore", "मैसूर"],
+    "Mangaluru": ["mangalore", "मंगलौर"],
+    "Visakhapatnam": ["vizag", "विशाखापत्तनम"],
+    "Vijayawada": ["विजयवाड़ा"],
+    "Thane": ["ठाणे"],
+    "Jammu": ["जम्मू"],
+    "Srinagar": ["श्रीनगर"],
+}
+
+# Requirement type -> words that imply it (English, Hinglish, Hindi)
+REQUIREMENT_KEYWORDS = {
+    "Residential": [
+        r"residential|residence|home|house|flat|apartment|villa|bungalow|duplex|penthouse",
+        r"bedroom|living room|drawing room|kitchen|balcony|\d\s*bhk|bhk",
+        r"ghar|makaan|makan|kothi",
+        "घर|मकान|फ्लैट|कोठी|आवासीय",
+    ],
+    "Commercial": [
+        r"commercial|office|shop|showroom|store|retail|restaurant|cafe|hotel|hospital|clinic",
+        r"mall|school|college|bank|factory|warehouse|workspace|co-?working|lobby|reception",
+        r"dukaan|dukan|daftar",
+        "ऑफिस|दफ्तर|दुकान|शोरूम|होटल|अस्पताल|व्यावसायिक|कमर्शियल",
+    ],
+}
+
+# Kind of commercial space -> words that name it (English and Hinglish, Hindi)
+SPACE_KEYWORDS = {
+    "Office": [r"office|workspace|co-?working|corporate|daftar", "ऑफिस|दफ्तर"],
+    "Retail": [r"shop|showroom|store|retail|mall|boutique|dukaan|dukan", "दुकान|शोरूम"],
+    "Hospitality": [r"restaurant|cafe|hotel|resort|banquet|lounge", "होटल|रेस्टोरेंट"],
+    "Healthcare": [r"hospital|clinic|nursing home", "अस्पताल|क्लिनिक"],
+    "Education": [r"school|college|institute|university|coaching", "स्कूल|कॉलेज"],
+    "Industrial": [r"factory|warehouse|godown", "फैक्ट्री|गोदाम"],
+}
+
+# Spoken numbers, e.g. "two thousand", "do hazaar", "डेढ़ हज़ार", read as digits before areas are matched
+NUMBER_WORDS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8,
+    "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15,
+    "sixteen": 16, "seventeen": 17, "eighteen": 18, "nineteen": 19, "twenty": 20, "thirty": 30,
+    "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+    "ek": 1, "do": 2, "teen": 3, "char": 4, "chaar": 4, "paanch": 5, "panch": 5, "chhe": 6, "chhah": 6,
+    "saat": 7, "aath": 8, "nau": 9, "das": 10, "bees": 20, "tees": 30, "chalis": 40, "pachas": 50, "pachaas": 50,
+    "एक": 1, "दो": 2, "तीन": 3, "चार": 4, "पांच": 5, "पाँच": 5, "छह": 6, "सात": 7, "आठ": 8, "नौ": 9,
+    "दस": 10, "बीस": 20, "तीस": 30, "चालीस": 40, "पचास": 50,
+    # "dedh hazaar" is 1,500 and "saadhe teen sau" 350
+    "dedh": 1.5, "derh": 1.5, "डेढ़": 1.5, "dhai": 2.5, "dhaai": 2.5, "ढाई": 2.5,
+    "saadhe": 0.5, "sadhe": 0.5, "साढ़े": 0.5, "half": 0.5,
+}
+NUMBER_SCALES = {
+    "hundred": 100, "sau": 100, "सौ": 100,
+    "thousand": 1_000, "hazaar": 1_000, "hazar": 1_000, "hajar": 1_000, "हज़ार": 1_000, "हजार": 1_000,
+    "lakh": 100_000, "lac": 100_000, "लाख": 100_000,
+}
+
+# Plausible project sizes, in sq.ft.; anything outside is more likely a phone number or a typo
+MIN_QUANTITY = 20
+MAX_QUANTITY = 10_000_000
+
+# Longest replies still read as a bare place name after the location prompt
+MAX_PLACE_WORDS = 3
+
+# An area with an explicit unit, e.g. "1,200 sq ft", "1.5k sqft", "2 हज़ार वर्ग फुट", "100 sq m"
+_AREA = re.compile(
+    r"\d[\d,]*(?:\.\d+)?\s*(?:k\b|thousand\b|lakh\b|lac\b|हज़ार|हजार)?\s*"
+    r"(?:sq\.?\s*f(?:ee|oo)?t\.?|sqft|sft|square\s*f(?:ee|oo)t|feet\b|(?:वर्ग|स्क्वायर)?\s*फ़?(?:ुट|ीट)"
+    r"|sq\.?\s*m(?:eters?|etres?|trs?)?\b|sqm\b|m2\b|m²|square\s*met(?:er|re)s?|(?:वर्ग|स्क्वायर)\s*मीटर)",
+    re.IGNORECASE,
+)
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?\s*(?:k\b|thousand\b|lakh\b|lac\b)?", re.IGNORECASE)
+_HINDI_THOUSAND = re.compile("हज़ार|हजार")
+_HINDI_METRE = re.compile("मीटर")
+_PHONE_LIKE = re.compile(r"(?:\+?91[\s-]?)?[6-9]\d{4}[\s-]?\d{5}")
+_PHONE = re.compile(r"(?<!\d)(?:(?:\+|00)?91[\s-]?|0)?([6-9]\d{4})[\s-]?(\d{5})(?!\d)")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)*\.[a-z]{2,}", re.IGNORECASE)
+_NUMBER_TOKEN = re.compile(r"\d[\d,]*(?:\.\d+)?|[a-zA-Z]+|[\u0900-\u097F]+")
+_NAME_INTRO = re.compile(
+    r"(?:\bmy name is|\bmy name's|\bmera naam|\bmeraa naam|मेरा नाम)\s+"
+    r"((?:[^\W\d_]|[\u0900-\u097F])+(?:\s+(?:[^\W\d_]|[\u0900-\u097F])+){0,2})",
+    re.IGNORECASE,
+)
+_NAME_FILLER = re.compile(
+    r"\b(?:my name is|my name's|name is|i am|i'm|im|this is|it's|its|mera naam|naam|main|mai|hai|hoon|hun|here|ji)\b"
+    "|मेरा नाम|नाम|मैं|है|हूँ|हूं|जी|[.,!।]",
+    re.IGNORECASE,
+)
+_NAME_STOP = re.compile(r"\s+(?:and|from|in|at|se|hai|hoon|है|हूँ|से)\b.*$", re.IGNORECASE)
+_PLACE = re.compile(r"^(?:[^\W\d_]|[\u0900-\u097F])+(?:[\s.-](?:[^\W\d_]|[\u0900-\u097F])+)*$", re.UNICODE)
+
+# Short replies that are not place names
+NOT_PLACES = {"yes", "no", "ok", "okay", "sure", "thanks", "thank you", "hi", "hello", "haan", "ha", "nahi", "ji"}
+
+# Hedges and non-answers to a lead prompt ("not sure yet", "idk", "same as before"); a reply with
+# one of these is never read as a value it does not name
+_NON_ANSWER = re.compile(
+    r"\b(?:not sure|unsure|idk|dunno|i don'?t know|do not know|don'?t know|no idea|not yet|not decided|undecided"
+    r"|later|maybe|same|as before|already|skip|none|nothing|n/?a|tbd|whatever|anything|any|not|no"
+    r"|pata nahi|pata nahin|malum nahi|maloom nahi|baad mein|baad me|abhi nahi|nahi|nahin)\b"
+    "|पता नहीं|मालूम नहीं|बाद में|अभी नहीं|नहीं",
+    re.IGNORECASE,
+)
+
+# Words that do not occur in names, so "my name is in the form" gives no name
+_NOT_NAME_WORDS = frozenset("""
+    a an the in on at of to for with by is was are be it this that there here my your our form above below
+    mentioned given before same already not great good fine ok okay sure thanks yes no
+""".split())
+
+# Longest reply still read as a bare name after the name prompt
+MAX_NAME_WORDS = 4
+
+# Words around a bare place name, e.g. "from Nashik", "Nashik se hoon"
+_PLACE_FILLER = re.compile(
+    r"\b(?:i am|i'm|im|we are|we're|from|in|at|based|located|city|it's|its|is|the|se|hoon|hun|hai|hain|mein|me)\b"
+    "|से|हूँ|हूं|है|हैं|में|[.,!।]",
+    re.IGNORECASE,
+)
+
+
+def _whole_words(pattern: str) -> str:
+    # \b only works for Latin script, since Devanagari vowel signs are not word characters
+    if pattern.isascii():
+        return rf"\b(?:{pattern})\b"
+    return rf"(?<![\u0900-\u097F])(?:{pattern})(?![\u0900-\u097F])"
+
+
+def _alternation(words: Iterable[str]) -> "re.Pattern":
+    words = sorted(words, key=len, reverse=True)
+    latin = [re.escape(word) for word in words if word.isascii()]
+    other = [re.escape(word) for word in words if not word.isascii()]
+    parts = [_whole_words("|".join(group)) for group in (latin, other) if group]
+    return re.compile("|".join(parts), re.IGNORECASE)
+
+
+_CITY_NAMES = {alias.lower(): city for city, aliases in CITY_ALIASES.items() for alias in [city, *aliases]}
+_CITY_PATTERN = _alternation(_CITY_NAMES)
+
+_REQUIREMENT_PATTERNS = {
+    requirement: re.compile(
+        "|".join(_whole_words(pattern) for pattern in patterns),
+        re.IGNORECASE,
+    )
+    for requirement, patterns in REQUIREMENT_KEYWORDS.items()
+}
+
+_SPACE_PATTERNS = {
+    space: re.compile("|".join(_whole_words(pattern) for pattern in patterns), re.IGNORECASE)
+    for space, patterns in SPACE_KEYWORDS.items()
+}
+
+
+def extract_location(text: str, asked: bool = False) -> Optional[str]:
+    """
+    City mentioned in a message, or None.
+
+    With `asked` (the message answers the location prompt), a short reply that
+    is only a place name is taken as the location even if it is not in the lexicon;
+    a hedge such as "not sure yet" or "idk" is not.
+    """
+    matches = _CITY_PATTERN.findall(text)
+    if matches:
+        return _CITY_NAMES[matches[-1].lower()]
+    if asked and not _NON_ANSWER.search(text):
+        place = " ".join(_PLACE_FILLER.sub(" ", text).split())
+        if (
+            place
+            and len(place.split()) <= MAX_PLACE_WORDS
+            and _PLACE.match(place)
+            and place.lower() not in NOT_PLACES
+            and extract_requirement_type(place) is None
+        ):
+            return place.title() if place.isascii() else place
+    return None
+
+
+def extract_requirement_type(text: str) -> Optional[str]:
+    """Residential or Commercial from the words in a message, or None if neither (or both) is clear."""
+    found = [requirement for requirement, pattern in _REQUIREMENT_PATTERNS.items() if pattern.search(text)]
+    return found[0] if len(found) == 1 else None
+
+
+def extract_space_type(text: str, asked: bool = False) -> Optional[str]:
+    """
+    Kind of commercial space (Office, Retail, Hospitality, ...) named in a message, or None if unclear.
+
+    With `asked` (the message answers the space prompt), a short reply naming
+    a space that is not in the keywords, such as "gym", is taken as it is.
+    """
+    found = [space for space, pattern in _SPACE_PATTERNS.items() if pattern.search(text)]
+    if len(found) == 1:
+        return found[0]
+    if asked and not found and not _NON_ANSWER.search(text):
+        space = " ".join(_PLACE_FILLER.sub(" ", text).split())
+        if space and len(space.split()) <= MAX_PLACE_WORDS and _PLACE.match(space) and space.lower() not in NOT_PLACES:
+            return space.title() if space.isascii() else space
+    return None
+
+
+def spoken_numbers(text: str) -> str:
+    """
+    Text with spoken numbers written in digits, e.g. "two thousand sq ft" -> "2000 sq ft", "dedh hazaar" -> "1500".
+
+    Only runs made entirely of number and scale words are rewritten, and digits
+    are never added to them: a word next to digits is left alone ("can you do
+    1200 sqft", "das 1200 sq ft"), except scale words after digits, which
+    multiply them ("2 hazaar" -> "2000").
+    """
+    tokens = list(_NUMBER_TOKEN.finditer(text))
+    runs: List[List[int]] = []
+    for i, token in enumerate(tokens):
+        word = token.group().lower()
+        if not (word in NUMBER_WORDS or word in NUMBER_SCALES or word in ("and", "a")):
+            continue
+        if runs and runs[-1][-1] == i - 1 and _adjacent(text, tokens[i - 1], token):
+            runs[-1].append(i)
+        else:
+            runs.append([i])
+
+    parts = []
+    last = 0
+    for run in runs:
+        while run and tokens[run[0]].group().lower() == "and":
+            run = run[1:]
+        while run and tokens[run[-1]].group().lower() in ("and", "a"):
+            run = run[:-1]
+        words = [tokens[i].group().lower() for i in run]
+        if not any(word in NUMBER_WORDS or word in NUMBER_SCALES for word in words):
+            continue
+        before = tokens[run[0] - 1] if run[0] > 0 else None
+        after = tokens[run[-1] + 1] if run[-1] + 1 < len(tokens) else None
+        after_digits = before is not None and before.group()[0].isdigit() and _adjacent(text, before, tokens[run[0]])
+        before_digits = after is not None and after.group()[0].isdigit() and _adjacent(text, tokens[run[-1]], after)
+        first = tokens[run[0]]
+        if after_digits and all(word in NUMBER_SCALES for word in words):
+            value = float(before.group().replace(",", ""))
+            for word in words:
+                value *= NUMBER_SCALES[word]
+            first = before
+        elif after_digits or before_digits:
+            continue
+        else:
+            value = _spoken_value(words)
+        if not value:
+            continue
+        parts.append(text[last:first.start()])
+        parts.append(f"{value:g}" if value < 1e15 else str(int(value)))
+        last = tokens[run[-1]].end()
+    if not parts:
+        return text
+    parts.append(text[last:])
+    return "".join(parts)
+
+
+def _adjacent(text: str, left: "re.Match", right: "re.Match") -> bool:
+    return not text[left.end():right.start()].strip(" -")
+
+
+def _spoken_value(words: List[str]) -> float:
+    # Scales multiply what came before them: "twelve hundred", "do sau pachas", "one thousand two hundred"
+    total = current = 0.0
+    for word in words:
+        if word in NUMBER_SCALES:
+            scale = NUMBER_SCALES[word]
+            if scale < 1_000:
+                current = (current or 1) * scale
+            else:
+                total += (current or 1) * scale
+                current = 0.0
+        else:
+            current += NUMBER_WORDS.get(word, 0)
+    return total + current
+
+
+def extract_quantity(text: str, asked: bool = False) -> Optional[float]:
+    """
+    Area in sq.ft. mentioned in a message, or None.
+
+    Only numbers with an area unit count, unless `asked` (the message answers
+    the quantity prompt), where a bare number such as "around 1200" is enough.
+    Spoken numbers ("two thousand", "dedh hazaar") count like digits. Phone
+    numbers are never read as areas.
+    """
+    text = spoken_numbers(_PHONE_LIKE.sub(" ", text))
+    matches = _AREA.findall(text)
+    if not matches and asked:
+        matches = _NUMBER.findall(text)
+    for match in reversed(matches):
+        quantity = parse_quantity(match)
+        if quantity is not None and _HINDI_THOUSAND.search(match):
+            quantity *= 1_000
+        if quantity is not None and _HINDI_METRE.search(match):
+            quantity *= SQFT_PER_SQM
+        if quantity is not None and MIN_QUANTITY <= quantity <= MAX_QUANTITY:
+            return quantity
+    return None
+
+
+def extract_phone(text: str) -> Optional[str]:
+    """Indian mobile number in a message, as +91XXXXXXXXXX, or None."""
+    matches = _PHONE.findall(text)
+    if not matches:
+        return None
+    first, last = matches[-1]
+    return f"+91{first}{last}"
+
+
+def extract_email(text: str) -> Optional[str]:
+    """Email address in a message, lowercased, or None."""
+    matches = _EMAIL.findall(text)
+    return matches[-1].lower() if matches else None
+
+
+def extract_name(text: str, asked: bool = False) -> Optional[str]:
+    """
+    Customer's name from a message, or None.
+
+    Only an introduction ("my name is Priya", "mera naam Rahul hai") counts,
+    unless `asked` (the message answers the name prompt), where a short reply
+    that is only a name is enough. Hedges such as "same as before" are not names.
+    """
+    text = _EMAIL.sub(" ", _PHONE.sub(" ", text))
+    match = _NAME_INTRO.search(text)
+    if match:
+        name = _NAME_STOP.sub("", match.group(1)).strip()
+    elif asked and not _NON_ANSWER.search(text):
+        name = " ".join(_NAME_FILLER.sub(" ", text).split())
+        if len(name.split()) > MAX_NAME_WORDS or not _PLACE.match(name) or name.lower() in NOT_PLACES:
+            return None
+    else:
+        return None
+    if not name or extract_location(name) or extract_requirement_type(name):
+        return None
+    if any(word in _NOT_NAME_WORDS for word in name.lower().split()):
+        return None
+    return name.title() if name.isascii() else name
+
+
+def asked_field(message: str) -> Optional[str]:
+    """Lead field that an assistant message asks for, if it contains a lead capture prompt (in any language)."""
+    # Case-insensitive, so that a prompt inside a longer sentence ("..., could you please share your name?") counts
+    message = message.lower()
+    for prompt, field in _prompt_fields().items():
+        if prompt in message:
+            return field
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _prompt_fields() -> Dict[str, str]:
+    # Lead capture prompt text -> field it asks for; imported here since the lead form is built from these rules
+    from src.modules.lead_capture import LEAD_FIELDS
+    return {prompt.lower(): field["name"] for field in LEAD_FIELDS for prompt in field["prompt"].values()}
+
+
+def extract_lead_fields(messages: Iterable[Dict[str, str]]) -> Dict[str, Optional[str]]:
+    """
+    Lead fields found in the customer's messages of a conversation.
+
+    Messages are {"role", "content"} dicts, oldest first. Later mentions win,
+    so a customer who corrects a detail is taken at their last word. Values
+    are parsed by the lead form, so they are formatted like live capture: a
+    city name, "Residential" or "Commercial", an area such as "1,200 sq.ft.".
+    """
+    from src.modules.lead_capture import LEAD_FORM
+
+    found: Dict[str, Optional[str]] = {field: None for field in LEAD_FORM.field_names}
+    asked = None
+    for message in messages:
+        content = message.get("content") or ""
+        if message.get("role") != "user":
+            asked = asked_field(content)
+            continue
+        found.update(LEAD_FORM.parse_all(content, asked=asked))
+        asked = None
+    return found
+
+
+def merge_lead_data(captured: Dict[str, Optional[str]], extracted: Dict[str, Optional[str]]) -> Dict[str, Optional[str]]:
+    """Lead data captured live, with the gaps filled from extracted fields."""
+    merged = dict(extracted)
+    merged.update({key: value for key, value in captured.items() if value})
+    return merged
+
+
+def summary_messages(summary_lines: List[str]) -> List[Dict[str, str]]:
+    """Messages folded into a conversation memory summary, as {"role", "content"} dicts."""
+    messages = []
+    for line in summary_lines:
+        if line.startswith("- Customer: "):
+            messages.append({"role": "user", "content": line[len("- Customer: "):]})
+        elif line.startswith("- Assistant: "):
+            messages.append({"role": "assistant", "content": line[len("- Assistant: "):]})
+    return messages
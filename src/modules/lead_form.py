@@ -0,0 +1,125 @@
+"""
+Lead Form Module
+Declarative lead form: typed fields with local parsers, validators and conditions.
+
+A form is built from field specs such as LEAD_FIELDS in lead_capture.py. Each
+spec has a name, a type and its prompts, and optionally:
+    required: False to keep the field when the customer gives it, without asking for it
+    when: {field: value} to ask for the field only when other fields have those values
+    pattern / choices / min / max: checks on the parsed value
+
+The type picks a parser from FIELD_TYPES that reads the value out of free
+text ("around 2k sqft", "do hazaar square feet", "120 sq m", "our office",
+"98765 43210") and returns it in canonical form, or None. A parser is strict
+unless the text answers that field's prompt: "1200" alone is a quantity only
+when the customer was asked for one. One message can fill several fields, so
+"2,000 sq ft office in Pune" completes most of the form at once. Parsers and
+validators are compiled once, when the form is built.
+"""
+
+import re
+from typing import Callable, Dict, List, Optional
+
+from src.modules.lead_extraction import (
+    extract_email,
+    extract_location,
+    extract_name,
+    extract_phone,
+    extract_quantity,
+    extract_requirement_type,
+    extract_space_type,
+)
+from src.modules.pricing import format_quantity, parse_quantity
+
+# Field type -> parser(text, asked) returning the value in canonical form, or None
+FIELD_TYPES: Dict[str, Callable[[str, bool], Optional[str]]] = {
+    "city": extract_location,
+    "requirement": lambda text, asked: extract_requirement_type(text),
+    "space": extract_space_type,
+    "area": lambda text, asked: _format_area(extract_quantity(text, asked=asked)),
+    "name": extract_name,
+    "phone": lambda text, asked: extract_phone(text),
+    "email": lambda text, asked: extract_email(text),
+}
+
+
+def _format_area(quantity: Optional[float]) -> Optional[str]:
+    return format_quantity(quantity) if quantity is not None else None
+
+
+def compile_validator(spec: Dict) -> Callable[[str], bool]:
+    """Check for a field's parsed values, built from the spec's pattern, choices, min and max."""
+    pattern = re.compile(spec["pattern"]) if "pattern" in spec else None
+    choices = frozenset(spec["choices"]) if "choices" in spec else None
+    low, high = spec.get("min"), spec.get("max")
+
+    def validate(value: str) -> bool:
+        if pattern is not None and not pattern.fullmatch(value):
+            return False
+        if choices is not None and value not in choices:
+            return False
+        if low is not None or high is not None:
+            number = parse_quantity(value)
+            if number is None or (low is not None and number < low) or (high is not None and number > high):
+                return False
+        return True
+
+    return validate
+
+
+class LeadForm:
+    """Ordered lead fields, with a parser and validator per field."""
+
+    def __init__(self, fields: List[Dict]):
+        unknown = [spec["type"] for spec in fields if spec["type"] not in FIELD_TYPES]
+        if unknown:
+            raise ValueError(f"Unknown lead field types: {unknown}")
+        self.fields = fields
+        self.field_names = [spec["name"] for spec in fields]
+        self._specs = {spec["name"]: spec for spec in fields}
+        self._parsers = {spec["name"]: FIELD_TYPES[spec["type"]] for spec in fields}
+        self._validators = {spec["name"]: compile_validator(spec) for spec in fields}
+
+    def __contains__(self, field: str) -> bool:
+        return field in self._specs
+
+    def spec(self, field: str) -> Optional[Dict]:
+        """The spec of a field, or None if the form has no such field."""
+        return self._specs.get(field)
+
+    def parse(self, field: str, text: str, asked: bool = False) -> Optional[str]:
+        """A field's value read from text, in canonical form, or None if absent or invalid."""
+        if field not in self._specs or not text:
+            return None
+        value = self._parsers[field](text, asked)
+        if value is None or not self._validators[field](value):
+            return None
+        return value
+
+    def parse_all(self, text: str, asked: Optional[str] = None) -> Dict[str, str]:
+        """Every field found in one message; `asked` is the field whose prompt the message answers."""
+        found = {}
+        for field in self.field_names:
+            value = self.parse(field, text, asked=field == asked)
+            if value is not None:
+                found[field] = value
+        return found
+
+    def applies(self, field: str, lead_data: Dict[str, Optional[str]]) -> bool:
+        """Whether a field's conditions hold for the lead so far."""
+        return all(lead_data.get(other) == value for other, value in self._specs[field].get("when", {}).items())
+
+    def missing(self, lead_data: Dict[str, Optional[str]]) -> List[str]:
+        """Required fields that apply to this lead and are still empty, in form order."""
+        return [
+            field for field in self.field_names
+            if self._specs[field].get("required", True) and not lead_data.get(field) and self.applies(field, lead_data)
+        ]
+
+    def next_field(self, lead_data: Dict[str, Optional[str]]) -> Optional[Dict]:
+        """Spec of the next field to ask for, or None when the lead is complete."""
+        missing = self.missing(lead_data)
+        return self._specs[missing[0]] if missing else None
+
+    def is_complete(self, lead_data: Dict[str, Optional[str]]) -> bool:
+        return not self.missing(lead_data)
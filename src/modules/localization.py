@@ -0,0 +1,75 @@
+"""
+Localization Module
+Detects the customer's language locally, so replies can use pre-written templates in that language.
+
+Every customer-facing message in src/modules is written in English, Hindi
+and Hinglish (Hindi in Latin script). A message in Devanagari is Hindi; a
+Latin-script message is Hinglish when enough of its words are common
+romanized Hindi words, and English otherwise. Detection is a regex and a set
+lookup, so a localized reply costs no extra model call. Messages with no
+clear signal (a number, a city, "ok") give no language, so the session keeps
+the language it already has.
+"""
+
+import functools
+import re
+from typing import Mapping, Optional, TypeVar
+
+ENGLISH = "en"
+HINDI = "hi"
+HINGLISH = "hinglish"
+LANGUAGES = (ENGLISH, HINDI, HINGLISH)
+DEFAULT_LANGUAGE = ENGLISH
+
+# Fraction of a message's letters in Devanagari that makes it Hindi
+HINDI_SCRIPT_SHARE = 0.3
+
+# Fraction of a message's words that must be romanized Hindi for Hinglish, and the minimum count
+HINGLISH_WORD_SHARE = 0.2
+MIN_HINGLISH_WORDS = 1
+
+# Common romanized Hindi words that are not also English words
+HINGLISH_WORDS = frozenset("""
+    hai hain hoon hun ho tha thi kya kyu kyun kaise kaisa kaisi kitna kitne kitni kab kahan kaha kaun
+    mujhe muje mera meri humko hume hamara hamari hamare aap aapka aapki aapke apka apki apke tum tumhara
+    chahiye chaiye chahte chahta chahti karna karo karein kijiye kariye krna kro batao bataiye btao bataye
+    dikhao dikhaiye bhejo bhejiye bhej dena milega milegi milta milti sakta sakte sakti lagega lagta lagti
+    nahi nahin nhi haan ji accha acha achha theek thik bahut bohot bhi aur lekin mein mai ke ki ka ko
+    se tak wala wali wale liye kuch sab abhi phir zyada jyada kam sasta mehenga daam keemat kimat
+    ghar makaan dukaan dukan daftar deewar diwar chhat kamra jagah sheher shahar
+""".split())
+
+T = TypeVar("T")
+
+_DEVANAGARI = re.compile(r"[ऀ-ॿ]")
+_LETTER = re.compile(r"[^\W\d_]|[ऀ-ॿ]", re.UNICODE)
+_LATIN_WORD = re.compile(r"[a-z]+")
+
+
+@functools.lru_cache(maxsize=4096)
+def detect_language(text: str) -> Optional[str]:
+    """
+    Language of a customer message (ENGLISH, HINDI or HINGLISH), or None if it gives no clear signal.
+
+    Short replies such as "ok", "Pune" or "1200" return None, so that a
+    conversation keeps its language when the customer answers in a word.
+    """
+    letters = len(_LETTER.findall(text))
+    if not letters:
+        return None
+    if len(_DEVANAGARI.findall(text)) / letters >= HINDI_SCRIPT_SHARE:
+        return HINDI
+
+    words = _LATIN_WORD.findall(text.lower())
+    hindi_words = sum(1 for word in words if word in HINGLISH_WORDS)
+    if hindi_words >= MIN_HINGLISH_WORDS and hindi_words / len(words) >= HINGLISH_WORD_SHARE:
+        return HINGLISH
+    # A word or two is not enough to tell English from a name or a place
+    if len(words) < 3:
+        return None
+    return ENGLISH
+
+
+def localize(templates: Mapping[str, T], language: Optional[str] = None) -> T:
+    """The template for `language`, falling back to English."""
+    return templates.get(language or DEFAULT_LANGUAGE) or templates[DEFAULT_LANGUAGE]
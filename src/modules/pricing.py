@@ -0,0 +1,423 @@
+"""
+Pricing Module
+Computes price estimates locally from the price table in src/data/prices.json.
+
+Rates are per sq.ft., by product and finish; a product sold without a choice
+of finish has a single rate. Only products and finishes in the catalog are
+priced, so the table is checked against it on load. A quantity's volume tier sets
+its discount, and GST is added on the discounted amount. A single estimate
+is itemized for the customer; quote_batch prices whole arrays of leads at
+once with NumPy, so historical leads can be re-quoted in one call when the
+price table changes. The table file is reloaded when it changes.
+"""
+
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from src.modules.catalog import CatalogIndex, get_catalog, normalize_name
+from src.modules.localization import localize
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRICES_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "prices.json")
+
+SQFT_PER_SQM = 10.7639
+
+# Spoken and written names of each finish
+FINISH_ALIASES = {
+    "wooden": "wooden",
+    "wood": "wooden",
+    "timber": "wooden",
+    "lakdi": "wooden",
+    "लकड़ी": "wooden",
+    "marble": "marble",
+    "stone": "marble",
+    "संगमरमर": "marble",
+    "pastel": "pastel",
+    "plain": "pastel",
+}
+
+# A number, an optional multiplier and an optional unit, e.g. "1,200 sq ft", "1.5k sqft", "100 sq m"
+_QUANTITY = re.compile(
+    r"(\d[\d,]*(?:\.\d+)?)\s*(?:(k|thousand|lakh|lac)\b)?\s*"
+    r"(sq\.?\s*m(?:eters?|etres?|trs?)?\b|sqm\b|m2\b|m²|square\s*met(?:er|re)s?)?",
+    re.IGNORECASE,
+)
+
+_MULTIPLIERS = {"k": 1_000, "thousand": 1_000, "lakh": 100_000, "lac": 100_000}
+
+# Wording of an itemized estimate, by language
+ESTIMATE_LABELS = {
+    "en": {
+        "title": "Estimate for {product} ({finish} finish), {quantity}:",
+        "product_title": "Estimate for {product}, {quantity}:",
+        "panels": "Panels",
+        "discount": "Volume discount",
+        "total": "Estimated total",
+    },
+    "hi": {
+        "title": "{product} ({finish} फिनिश), {quantity} का अनुमान:",
+        "product_title": "{product}, {quantity} का अनुमान:",
+        "panels": "पैनल",
+        "discount": "वॉल्यूम डिस्काउंट",
+        "total": "अनुमानित कुल",
+    },
+    "hinglish": {
+        "title": "{product} ({finish} finish), {quantity} ka estimate:",
+        "product_title": "{product}, {quantity} ka estimate:",
+        "panels": "Panels",
+        "discount": "Volume discount",
+        "total": "Estimated total",
+    },
+}
+
+
+class Quote(NamedTuple):
+    """An itemized estimate for one product and finish (None for a product sold without a choice of finish)."""
+
+    product: str
+    product_name: str
+    finish: Optional[str]
+    quantity: float
+    rate: float
+    material: float
+    discount_rate: float
+    discount: float
+    gst_rate: float
+    gst: float
+    total: float
+
+
+def parse_quantity(value: Any) -> Optional[float]:
+    """Area in sq.ft. from a number or a text like "1,200 sq ft", "1.5k sqft" or "100 sq m"."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value) if value > 0 else None
+    if not isinstance(value, str):
+        return None
+    match = _QUANTITY.search(value)
+    if match is None:
+        return None
+    number, multiplier, metric = match.groups()
+    quantity = float(number.replace(",", "")) * _MULTIPLIERS.get((multiplier or "").lower(), 1)
+    if metric:
+        quantity *= SQFT_PER_SQM
+    return quantity if quantity > 0 else None
+
+
+def normalize_finish(finish: Optional[str]) -> Optional[str]:
+    """Finish name (wooden, marble, pastel) for a spoken or written finish, or None."""
+    if not finish:
+        return None
+    return FINISH_ALIASES.get(normalize_name(finish))
+
+
+def format_inr(amount: float) -> str:
+    """Rupees with Indian digit grouping, e.g. ₹2,88,000."""
+    digits = str(int(round(amount)))
+    sign = "-" if digits.startswith("-") else ""
+    digits = digits.lstrip("-")
+    if len(digits) > 3:
+        head, tail = digits[:-3], digits[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        digits = ",".join([head] + groups + [tail]) if head else ",".join(groups + [tail])
+    return f"{sign}₹{digits}"
+
+
+def format_quantity(quantity: float) -> str:
+    """Area with Indian digit grouping, e.g. 1,200 sq.ft."""
+    return f"{format_inr(quantity)[1:]} sq.ft."
+
+
+def itemize(quote: Quote, language: Optional[str] = None) -> str:
+    """Customer-facing, itemized text of an estimate, in the customer's language."""
+    quantity = format_quantity(quote.quantity)
+    labels = localize(ESTIMATE_LABELS, language)
+    title = labels["title"] if quote.finish else labels["product_title"]
+    lines = [
+        title.format(product=quote.product_name, finish=quote.finish, quantity=quantity),
+        f"- {labels['panels']}: {quantity} × {format_inr(quote.rate)} = {format_inr(quote.material)}",
+    ]
+    if quote.discount:
+        lines.append(f"- {labels['discount']} ({quote.discount_rate:.0%}): -{format_inr(quote.discount)}")
+    lines.append(f"- GST ({quote.gst_rate:.0%}): {format_inr(quote.gst)}")
+    lines.append(f"- {labels['total']}: {format_inr(quote.total)}")
+    return "\n".join(lines)
+
+
+class PriceTable:
+    """
+    Immutable price table: rates by product and finish, volume tier discounts and GST.
+
+    A product sold without a choice of finish has its rate under the finish None.
+    """
+
+    def __init__(
+        self,
+        rates: Dict[str, Dict[Optional[str], float]],
+        volume_tiers: Sequence[Tuple[float, float]],
+        gst_rate: float,
+        currency: str = "INR",
+    ):
+        self.rates = {product: dict(finishes) for product, finishes in rates.items()}
+        tiers = sorted(volume_tiers)
+        self.tier_minimums = [minimum for minimum, _ in tiers]
+        self.tier_discounts = [discount for _, discount in tiers]
+        self.gst_rate = gst_rate
+        self.currency = currency
+
+        self.products = sorted(self.rates)
+        self.finishes = sorted({finish for finishes in self.rates.values() for finish in finishes if finish is not None})
+        self._matrix = None
+        self._matrix_lock = threading.Lock()
+
+    @classmethod
+    def from_dict(cls, data: Dict, catalog: Optional[CatalogIndex] = None) -> "PriceTable":
+        """
+        Build a table from the parsed price file, where a product's rates are a
+        number (no choice of finish) or rates by finish.
+
+        With a catalog, rates of products it does not have, and of finishes it
+        does not offer for the product, are left out with a warning.
+        """
+        rates = {}
+        for product, value in data["rates"].items():
+            finishes = dict(value) if isinstance(value, dict) else {None: value}
+            if catalog is not None:
+                finishes = _offered(product, finishes, catalog)
+            if finishes:
+                rates[product] = finishes
+        return cls(
+            rates=rates,
+            volume_tiers=[(tier["min_sqft"], tier["discount"]) for tier in data.get("volume_tiers", [])] or [(0, 0.0)],
+            gst_rate=data.get("gst_rate", 0.0),
+            currency=data.get("currency", "INR"),
+        )
+
+    def product_id(self, product: Optional[str]) -> Optional[str]:
+        """The priced product for a product id or name (matched like catalog lookups), or None."""
+        if not product:
+            return None
+        key = product.strip().lower()
+        if key in self.rates:
+            return key
+        match = get_catalog().find(product)
+        return match.id if match is not None and match.id in self.rates else None
+
+    def rate(self, product: str, finish: Optional[str] = None) -> Optional[Tuple[Optional[str], float]]:
+        """
+        The finish and rate per sq.ft. of a product; without a finish, its cheapest
+        one (of those the catalog offers, which the table is checked against), or
+        None for a product sold without a choice of finish.
+        """
+        finishes = self.rates.get(product)
+        if not finishes:
+            return None
+        if finish is None:
+            finish = min(finishes, key=finishes.get)
+        return (finish, finishes[finish]) if finish in finishes else None
+
+    def discount_rate(self, quantity: float) -> float:
+        """Volume discount for a quantity in sq.ft."""
+        index = bisect.bisect_right(self.tier_minimums, quantity) - 1
+        return self.tier_discounts[index] if index >= 0 else 0.0
+
+    def rate_range(self, products: Optional[Iterable[str]] = None) -> Optional[Tuple[float, float]]:
+        """Lowest and highest rates per sq.ft. over some products (all by default)."""
+        rates = [
+            rate
+            for product in (self.products if products is None else products)
+            for rate in self.rates.get(product, {}).values()
+        ]
+        return (min(rates), max(rates)) if rates else None
+
+    def quote(self, product: str, quantity: float, finish: Optional[str] = None) -> Optional[Quote]:
+        """
+        Itemized estimate for a quantity (sq.ft.) of a product, or None if it is not priced in that finish.
+
+        Without a finish, the product's cheapest one is quoted; a finish that is
+        not one of the table's (such as "glossy"), or one the product is not
+        offered in, gives None, as in quote_batch.
+        """
+        product = self.product_id(product)
+        known_finish = normalize_finish(finish) if finish else None
+        if finish and known_finish is None:
+            return None
+        priced = self.rate(product, known_finish) if product else None
+        if priced is None or quantity <= 0:
+            return None
+        finish, rate = priced
+        material = rate * quantity
+        discount_rate = self.discount_rate(quantity)
+        discount = material * discount_rate
+        gst = (material - discount) * self.gst_rate
+        catalog_product = get_catalog().products.get(product)
+        return Quote(
+            product=product,
+            product_name=catalog_product.name if catalog_product else product,
+            finish=finish,
+            quantity=quantity,
+            rate=rate,
+            material=round(material, 2),
+            discount_rate=discount_rate,
+            discount=round(discount, 2),
+            gst_rate=self.gst_rate,
+            gst=round(gst, 2),
+            total=round(material - discount + gst, 2),
+        )
+
+    def total_range(self, products: Iterable[str], quantity: float) -> Optional[Tuple[float, float]]:
+        """Lowest and highest estimated totals for a quantity over some products and all their finishes."""
+        rates = self.rate_range(products)
+        if rates is None:
+            return None
+        factor = quantity * (1 - self.discount_rate(quantity)) * (1 + self.gst_rate)
+        return rates[0] * factor, rates[1] * factor
+
+    def _rate_matrix(self):
+        # Rates by product row and finish column; the extra column is each product's cheapest
+        # finish (for leads without one) and the extra row and column are NaN for unknown values
+        with self._matrix_lock:
+            if self._matrix is None:
+                np = _numpy()
+                matrix = np.full((len(self.products) + 1, len(self.finishes) + 2), np.nan)
+                for row, product in enumerate(self.products):
+                    for column, finish in enumerate(self.finishes):
+                        matrix[row, column] = self.rates[product].get(finish, np.nan)
+                    matrix[row, len(self.finishes)] = min(self.rates[product].values())
+                self._matrix = matrix
+            return self._matrix
+
+    def quote_batch(
+        self,
+        products: Sequence[Optional[str]],
+        quantities: Sequence[Any],
+        finishes: Optional[Sequence[Optional[str]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Estimates for many leads at once.
+
+        Takes parallel sequences of product ids or names, quantities (numbers
+        in sq.ft. or texts like "1,200 sqft") and optionally finishes (None for
+        a product's cheapest). Returns NumPy arrays of the rate, discount_rate,
+        material, discount, gst and total per lead; values are NaN where the
+        product, finish or quantity is unknown.
+        """
+        np = _numpy()
+        matrix = self._rate_matrix()
+        count = len(products)
+        if len(quantities) != count or (finishes is not None and len(finishes) != count):
+            raise ValueError("products, quantities and finishes must have the same length")
+
+        # Resolve each distinct product and finish once, then index the rate matrix for all leads
+        unknown_row, cheapest_column, unknown_column = len(self.products), len(self.finishes), len(self.finishes) + 1
+        rows = {product: row for row, product in enumerate(self.products)}
+        columns = {finish: column for column, finish in enumerate(self.finishes)}
+
+        names, product_index = np.unique(np.array([p or "" for p in products], dtype=object), return_inverse=True)
+        product_rows = np.array([rows.get(self.product_id(name), unknown_row) for name in names], dtype=np.intp)
+        if finishes is None:
+            finish_columns = np.full(count, cheapest_column, dtype=np.intp)
+        else:
+            values, finish_index = np.unique(np.array([f or "" for f in finishes], dtype=object), return_inverse=True)
+            lookup = np.array(
+                [columns.get(normalize_finish(value), unknown_column) if value else cheapest_column for value in values],
+                dtype=np.intp,
+            )
+            finish_columns = lookup[finish_index.reshape(-1)]
+        rate = matrix[product_rows[product_index.reshape(-1)], finish_columns] if count else np.empty(0)
+
+        if isinstance(quantities, np.ndarray) and quantities.dtype.kind in "iuf":
+            quantity = quantities.astype(float)
+        else:
+            quantity = np.array([parse_quantity(q) for q in quantities], dtype=float).reshape(count)
+        quantity[~(quantity > 0)] = np.nan
+
+        tier = np.searchsorted(np.array(self.tier_minimums, dtype=float), np.nan_to_num(quantity), side="right") - 1
+        discount_rate = np.where(tier >= 0, np.array(self.tier_discounts, dtype=float)[np.clip(tier, 0, None)], 0.0)
+        discount_rate[np.isnan(quantity)] = np.nan
+
+        material = rate * quantity
+        discount = material * discount_rate
+        gst = (material - discount) * self.gst_rate
+        return {
+            "rate": rate,
+            "discount_rate": discount_rate,
+            "material": np.round(material, 2),
+            "discount": np.round(discount, 2),
+            "gst": np.round(gst, 2),
+            "total": np.round(material - discount + gst, 2),
+        }
+
+
+def _offered(product: str, finishes: Dict[Optional[str], float], catalog: CatalogIndex) -> Dict[Optional[str], float]:
+    # The rates of a product in the finishes the catalog offers it in; None when it lists none
+    catalog_product = catalog.products.get(product)
+    if catalog_product is None:
+        logger.warning("Price table product %s is not in the catalog", product)
+        return {}
+    offered = set(catalog_product.finishes) or {None}
+    for finish in set(finishes) - offered:
+        logger.warning("Price table finish %s of %s is not offered in the catalog", finish, product)
+    return {finish: rate for finish, rate in finishes.items() if finish in offered}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Batch quotes require numpy: pip install numpy")
+    return numpy
+
+
+def requote_leads(leads: Sequence[Dict[str, Any]], table: Optional["PriceTable"] = None) -> List[Dict[str, Any]]:
+    """
+    Re-price historical leads with the current price table.
+
+    Each lead is a dict with "product", "quantity" and optionally "finish";
+    returns copies with the estimate's "rate", "discount", "gst" and "total"
+    added (None where a lead cannot be priced).
+    """
+    table = table or get_price_table()
+    quotes = table.quote_batch(
+        [lead.get("product") for lead in leads],
+        [lead.get("quantity") for lead in leads],
+        [lead.get("finish") for lead in leads],
+    )
+    columns = {key: quotes[key].tolist() for key in ("rate", "discount", "gst", "total")}
+    return [
+        {**lead, **{key: None if math.isnan(values[i]) else values[i] for key, values in columns.items()}}
+        for i, lead in enumerate(leads)
+    ]
+
+
+_tables: Dict[str, Tuple[int, CatalogIndex, PriceTable]] = {}
+_tables_lock = threading.Lock()
+
+
+def get_price_table(path: Optional[str] = None) -> PriceTable:
+    """
+    Return the price table at PRICE_TABLE_PATH (default src/data/prices.json), checked
+    against the catalog; reloaded when the file or the catalog changes.
+    """
+    path = path or os.getenv("PRICE_TABLE_PATH", DEFAULT_PRICES_PATH)
+    mtime = os.stat(path).st_mtime_ns
+    catalog = get_catalog()
+    with _tables_lock:
+        cached = _tables.get(path)
+        if cached is not None and cached[0] == mtime and cached[1] is catalog:
+            return cached[2]
+        with open(path, encoding="utf-8") as f:
+            table = PriceTable.from_dict(json.load(f), catalog=catalog)
+        if cached is not None:
+            logger.info("Reloaded price table %s", path)
+        _tables[path] = (mtime, catalog, table)
+        return table
@@ -1,36 +1,49 @@
 """
 Product Information Module
 Handles queries about PARE products.
+
+Product details come from the catalog index (see catalog.py), so products
+are added or changed in src/data/products.json rather than here.
 """
 
-# Product information templates
-PRODUCT_OVERVIEW = """
+from typing import Optional
+
+from src.modules.catalog import get_catalog, localized_category
+from src.modules.localization import localize
+
+# Product information templates, by language
+PRODUCT_OVERVIEW = {
+    "en": """
 PARE offers a wide range of decorative panels to enhance walls, ceilings, and facades. 
 Our products are designed for easy installation, durability, and aesthetic appeal.
-"""
-
-# Product categories information
-WALL_PRODUCTS = """
-PARE has an excellent selection of wall options, you may select from:
-Linea, Pyramid, Arch which have wooden, marble and pastel shades
-"""
+""",
+    "hi": """
+PARE दीवारों, छतों और फसाड को सुंदर बनाने के लिए सजावटी पैनलों की एक बड़ी रेंज देता है। 
+हमारे प्रोडक्ट आसान इंस्टॉलेशन, टिकाऊपन और खूबसूरती के लिए बनाए गए हैं।
+""",
+    "hinglish": """
+PARE walls, ceilings aur facades ko enhance karne ke liye decorative panels ki wide range offer karta hai. 
+Hamare products easy installation, durability aur aesthetic appeal ke liye design kiye gaye hain.
+""",
+}
 
-CEILING_PRODUCTS = """
-PARE has an excellent selection of ceiling options, you may select from:
-Soffit, duo and louver panels which have wooden, marble and pastel shades
-"""
+AREA_QUESTION = {
+    "en": "Kindly mention the area you're interested in - Wall, ceilings or Facades or all/none?",
+    "hi": "कृपया बताएं कि आपकी रुचि किसमें है - दीवार, छत या फसाड, या सभी/कोई नहीं?",
+    "hinglish": "Kindly batayein aapko kis area mein interest hai - Wall, ceilings ya Facades, ya all/none?",
+}
 
-FACADE_PRODUCTS = """
-PARE has an excellent selection of facade options, you may select from:
-Norma and Stretta panels
-"""
+ALL_PRODUCTS = {
+    # Kept as the original reply was worded, line break included
+    "en": "PARE has an excellent selection for all, please check the company brochure\n        for any products if it sparks up any ideas for you",
+    "hi": "PARE के पास हर ज़रूरत के लिए बेहतरीन विकल्प हैं, कृपया कंपनी ब्रोशर देखें, शायद कोई प्रोडक्ट आपको पसंद आ जाए",
+    "hinglish": "PARE ke paas sabke liye excellent selection hai, please company brochure dekhiye, shayad koi product aapko idea de de",
+}
 
-# Specific product information
-SPECIFIC_PRODUCTS = {
-    "soffit": "Ideal for ceilings, offering a real wood appearance with a maintenance-free finish. Perfect for outdoor and indoor applications.",
-    "easy+": "Wall panels that can be directly screwed onto walls, eliminating the need for plywood. Available in multiple shades and textures.",
-    "dura+": "A robust façade solution that ensures long-lasting durability, UV resistance, and a wooden aesthetic.",
-    "baffle": "A unique ceiling system that is lightweight, fire-retardant, and water-resistant, offering a sophisticated look to interiors."
+BROCHURE_MESSAGE = {
+    "en": "Here's our {brochure} brochure for your reference.",
+    "hi": "आपके संदर्भ के लिए हमारा {brochure} ब्रोशर यह रहा।",
+    "hinglish": "Aapke reference ke liye yeh raha hamara {brochure} brochure.",
 }
 
 # Brochure mapping
@@ -41,29 +54,26 @@ BROCHURE_MAPPING = {
     "unsure": "company"
 }
 
-def get_product_overview() -> str:
+def get_product_overview(language: Optional[str] = None) -> str:
     """Return general product overview."""
-    return PRODUCT_OVERVIEW.strip()
+    return localize(PRODUCT_OVERVIEW, language).strip()
+
+def get_brochure_message(brochure: str, language: Optional[str] = None) -> str:
+    """Return the message sent with a brochure."""
+    return localize(BROCHURE_MESSAGE, language).format(brochure=brochure)
 
-def get_category_info(category: str) -> dict:
+def get_category_info(category: str, language: Optional[str] = None) -> dict:
     """Get information about a specific product category."""
     message = ""
     brochure = None
+    catalog = get_catalog()
     
-    if category == "wall":
-        message = WALL_PRODUCTS.strip()
-        brochure = "easy+"
-    elif category == "ceiling":
-        message = CEILING_PRODUCTS.strip()
-        brochure = "innov+"
-    elif category == "facade":
-        message = FACADE_PRODUCTS.strip()
-        brochure = "dura+"
+    if category in catalog.categories:
+        info = catalog.categories[category]
+        message = f"{localized_category(info, 'intro', language)}\n{localized_category(info, 'listing', language)}"
+        brochure = info["brochure"]
     elif category == "unsure" or category == "all" or category == "none":
-        message = """
-        PARE has an excellent selection for all, please check the company brochure
-        for any products if it sparks up any ideas for you
-        """.strip()
+        message = localize(ALL_PRODUCTS, language)
         brochure = "company"
     
     return {
@@ -71,29 +81,32 @@ def get_category_info(category: str) -> dict:
         "brochure": brochure
     }
 
-def get_specific_product_info(product: str) -> str:
-    """Get information about a specific product."""
-    if product.lower() in SPECIFIC_PRODUCTS:
-        return SPECIFIC_PRODUCTS[product.lower()]
+def get_specific_product_info(product: str, language: Optional[str] = None) -> str:
+    """Get information about a specific product, matching misspelled or transliterated names; None if it has no description."""
+    match = get_catalog().find(product)
+    if match:
+        return match.localized("description", language) or None
     return None
 
-def handle_product_query(category: str = None, specific_product: str = None) -> dict:
-    """Handle a query about products."""
+def handle_product_query(category: str = None, specific_product: str = None, language: Optional[str] = None) -> dict:
+    """Handle a query about products, in the customer's language."""
     response = ""
     brochure = None
     next_module = "lead_capture"
     
-    if specific_product and specific_product.lower() in SPECIFIC_PRODUCTS:
+    product_description = get_specific_product_info(specific_product, language) if specific_product else None
+    
+    if product_description:
         # Handle specific product query
-        response = get_specific_product_info(specific_product.lower())
+        response = product_description
     elif category:
         # Handle category query
-        category_info = get_category_info(category.lower())
+        category_info = get_category_info(category.lower(), language)
         response = category_info["message"]
         brochure = category_info["brochure"]
     else:
         # General product overview
-        response = f"{get_product_overview()}\n\nKindly mention the area you're interested in - Wall, ceilings or Facades or all/none?"
+        response = f"{get_product_overview(language)}\n\n{localize(AREA_QUESTION, language)}"
         next_module = "product_info"
     
     return {
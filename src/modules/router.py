@@ -0,0 +1,223 @@
+"""
+Intent Router Module
+Answers obvious queries locally, without a model call.
+
+Messages are scored against keyword patterns for each intent (English, Hindi
+and Hinglish). When one intent clearly wins on a short message, the matching
+module handler can be called directly; anything else goes to the LLM.
+Negated keywords ("don't call me", "brochure nahi chahiye") do not count, and
+a question about something specific ("what is the cost of installation?",
+"is it waterproof?") is left to the LLM, since a canned reply would not
+answer it.
+"""
+
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from src.modules.lead_capture import is_question
+
+logger = logging.getLogger(__name__)
+
+# Minimum confidence for answering without the LLM
+DEFAULT_CONFIDENCE_THRESHOLD = 0.75
+
+# Messages longer than this (in words) are likely to carry more than one request
+SHORT_MESSAGE_WORDS = 6
+
+# Keyword patterns per intent: (pattern, weight, args set when matched)
+INTENT_PATTERNS = {
+    "company": [
+        (r"company|about pare|about you|who are you|pare india", 1.0, {}),
+        (r"kaun ho|aapke baare|apke bare|aapki company|kampani", 1.0, {}),
+        ("कंपनी|आपके बारे|कौन", 1.0, {}),
+    ],
+    "pricing": [
+        (r"price|prices|pricing|cost|costs|rate|rates|how much|budget", 1.0, {}),
+        (r"kitna|kitne|kitni|daam|dam|keemat|kimat|bhav", 1.0, {}),
+        ("कीमत|दाम|रेट|कितना|कितने|भाव", 1.0, {}),
+    ],
+    "product": [
+        (r"products?|range|options|panels?|what do you (sell|offer|make)", 0.6, {}),
+        (r"kya milta|kya bechte|samaan", 0.6, {}),
+        ("उत्पाद|पैनल", 0.6, {}),
+        (r"walls?|wall panels?|deewar|diwar|deewaar", 1.0, {"product_category": "wall"}),
+        ("दीवार", 1.0, {"product_category": "wall"}),
+        (r"ceilings?|false ceiling|chhat|chhath", 1.0, {"product_category": "ceiling"}),
+        ("छत|सीलिंग", 1.0, {"product_category": "ceiling"}),
+        (r"facades?|façades?|elevation|exterior|cladding", 1.0, {"product_category": "facade"}),
+        ("फसाड|एलिवेशन", 1.0, {"product_category": "facade"}),
+        (r"soffit", 1.2, {"specific_product": "soffit"}),
+        (r"easy\s*(\+|plus)", 1.2, {"specific_product": "easy+"}),
+        (r"dura\s*(\+|plus)", 1.2, {"specific_product": "dura+"}),
+        (r"baffles?", 1.2, {"specific_product": "baffle"}),
+    ],
+    "brochure": [
+        (r"brochures?|broucher|brouchure|catalog|catalogue|pdf", 1.2, {}),
+        ("ब्रोशर|कैटलॉग", 1.2, {}),
+    ],
+    "support": [
+        (r"call ?back|call me|phone karo|call karo|call kijiye", 1.2, {"request_type": "callback"}),
+        (r"whats ?app", 1.2, {"request_type": "whatsapp"}),
+        (r"site visit|visit my site|site pe aao|site par", 1.2, {"request_type": "site_visit"}),
+        ("कॉल|फोन", 1.2, {"request_type": "callback"}),
+    ],
+}
+
+# Words before a keyword, and after it (Hindi negates after the verb), in which a negation cancels it
+NEGATION_WORDS_BEFORE = 3
+NEGATION_WORDS_AFTER = 2
+
+# Words a question may contain besides the keywords and still be a plain "price?" or "what is the price?"
+QUESTION_FILLER = frozenset("""
+    what whats what's which how is are was the a an your yours you do does of for me tell about please pls
+    there it its it's this these them they i we us our my any all give show send share list current latest
+    kya hai hain ka ki ke ko aapka aapki aapke apka apki apke batao bataiye btao mujhe hume
+    क्या है हैं का की के को आपका आपकी आपके बताइए बताओ
+""".split())
+
+# Brochure sent for each product category
+CATEGORY_BROCHURES = {
+    "wall": "easy+",
+    "ceiling": "innov+",
+    "facade": "dura+",
+}
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+_NEGATION = re.compile(
+    r"\b(?:no|not|never|don'?t|do not|doesn'?t|does not|didn'?t|won'?t|can'?t|cannot|nahi|nahin|nhi|mat)\b"
+    r"|नहीं|नही|मत",
+    re.IGNORECASE,
+)
+# Clause boundaries, past which a negation does not reach
+_CLAUSE = re.compile(r"[,.;:!?]|\b(?:but|lekin|par)\b|लेकिन", re.IGNORECASE)
+_EDGE_PUNCTUATION = re.compile(r"^\W+|\W+$")
+
+
+def _compile(pattern: str) -> "re.Pattern":
+    # Word boundaries only work for Latin script; Devanagari vowel signs are not word characters
+    if pattern.isascii():
+        return re.compile(rf"\b(?:{pattern})\b", re.IGNORECASE)
+    return re.compile(pattern)
+
+
+_COMPILED_PATTERNS: Dict[str, List[Tuple["re.Pattern", float, Dict[str, str]]]] = {
+    intent: [(_compile(pattern), weight, args) for pattern, weight, args in patterns]
+    for intent, patterns in INTENT_PATTERNS.items()
+}
+
+
+def _negated(text: str, start: int, end: int) -> bool:
+    # A negation shortly before the keyword, or just after it, in the same clause
+    before = _CLAUSE.split(text[:start])[-1].split()[-NEGATION_WORDS_BEFORE:]
+    after = _CLAUSE.split(text[end:])[0].split()[:NEGATION_WORDS_AFTER]
+    return bool(_NEGATION.search(" ".join(before + after)))
+
+
+def _leftover_words(text: str, spans: List[Tuple[int, int]]) -> List[str]:
+    # Words of the message outside the matched keywords, other than question filler
+    for start, end in sorted(spans, reverse=True):
+        text = text[:start] + " " + text[end:]
+    words = (_EDGE_PUNCTUATION.sub("", word).lower() for word in text.split())
+    return [word for word in words if word and word not in QUESTION_FILLER]
+
+
+def classify_intent(text: str) -> Dict:
+    """
+    Classify a message into one of the routable intents.
+
+    Returns a dict with the best "intent" (or None), its "confidence" between
+    0 and 1, and the "args" for the matching handler. Negated keywords are
+    ignored; a question with more to it than its keywords has confidence 0.
+    """
+    scores: Dict[str, float] = {}
+    args: Dict[str, Dict[str, str]] = {}
+    spans: List[Tuple[int, int]] = []
+
+    for intent, patterns in _COMPILED_PATTERNS.items():
+        score = 0.0
+        intent_args: Dict[str, str] = {}
+        for pattern, weight, pattern_args in patterns:
+            match = next((m for m in pattern.finditer(text) if not _negated(text, m.start(), m.end())), None)
+            if match:
+                score += weight
+                intent_args.update(pattern_args)
+                spans.append(match.span())
+        if score:
+            scores[intent] = score
+            args[intent] = intent_args
+
+    if not scores:
+        return {"intent": None, "confidence": 0.0, "args": {}}
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    intent, best = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0.0
+
+    # A brochure request for a category is still a brochure request
+    if "brochure" in scores and intent in ("brochure", "product"):
+        category = args.get("product", {}).get("product_category")
+        best = scores["brochure"] + scores.get("product", 0.0)
+        runner_up = max((score for name, score in scores.items() if name not in ("brochure", "product")), default=0.0)
+        intent = "brochure"
+        args["brochure"] = {"brochure_type": CATEGORY_BROCHURES.get(category, "company")}
+
+    # Confidence: strength of the best match, how clearly it beats the runner-up,
+    # and how much of the message is explained by a short keyword query
+    strength = min(best, 1.0)
+    margin = (best - runner_up) / best
+    words = len(_WORD_PATTERN.findall(text))
+    brevity = min(1.0, SHORT_MESSAGE_WORDS / words) if words else 1.0
+    confidence = round(strength * margin * brevity, 3)
+
+    # "what is the cost of installation?" asks about more than the price list
+    if is_question(text) and _leftover_words(text, spans):
+        confidence = 0.0
+
+    return {"intent": intent, "confidence": confidence, "args": args[intent]}
+
+
+class IntentRouter:
+    """Local router in front of the agent, with hit-rate statistics."""
+
+    def __init__(self, threshold: float = DEFAULT_CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.routed_count = 0
+        self.fallback_count = 0
+        self.confidence_total = 0.0
+
+    def route(self, text: str) -> Optional[Dict]:
+        """Return the classified intent if it is confident enough to skip the LLM, else None."""
+        result = classify_intent(text)
+        routed = result["intent"] is not None and result["confidence"] >= self.threshold
+
+        with self._lock:
+            if routed:
+                self.routed_count += 1
+            else:
+                self.fallback_count += 1
+            self.confidence_total += result["confidence"]
+
+        logger.info(
+            "intent=%s confidence=%.3f routed=%s hit_rate=%.3f",
+            result["intent"], result["confidence"], routed, self.hit_rate(),
+        )
+        return result if routed else None
+
+    def hit_rate(self) -> float:
+        """Fraction of messages answered without the LLM."""
+        total = self.routed_count + self.fallback_count
+        return self.routed_count / total if total else 0.0
+
+    def stats(self) -> Dict:
+        """Return routing counts, hit rate and mean confidence."""
+        with self._lock:
+            total = self.routed_count + self.fallback_count
+            return {
+                "routed": self.routed_count,
+                "fallback": self.fallback_count,
+                "hit_rate": self.routed_count / total if total else 0.0,
+                "mean_confidence": self.confidence_total / total if total else 0.0,
+            }
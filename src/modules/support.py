@@ -1,54 +1,250 @@
 """
 Customer Support Module
-Handles customer support requests and callbacks.
+Handles customer support requests, callbacks and price estimates.
 """
 
-# Support message templates
-CALLBACK_REQUEST = """
+from typing import Dict, Optional
+
+from src.modules.catalog import get_catalog, localized_category
+from src.modules.localization import localize
+from src.modules.pricing import format_inr, format_quantity, get_price_table, itemize, normalize_finish, parse_quantity
+
+# Catalog applications that match a lead's requirement type
+REQUIREMENT_APPLICATIONS = frozenset({"residential", "commercial"})
+
+# Support message templates, by language
+CALLBACK_REQUEST = {
+    "en": """
 I can have one of our customer support specialists reach out to you for a detailed discussion. 
 Would you prefer a call or a WhatsApp message?
-"""
+""",
+    "hi": """
+मैं हमारे कस्टमर सपोर्ट विशेषज्ञ से आपसे विस्तार से बात करवा सकता हूँ। 
+आप कॉल पसंद करेंगे या WhatsApp मैसेज?
+""",
+    "hinglish": """
+Main hamare customer support specialist se aapse detail mein baat karwa sakta hoon. 
+Aap call prefer karenge ya WhatsApp message?
+""",
+}
+
+WHATSAPP_REQUEST = {
+    "en": "We'll arrange for a WhatsApp message from our customer support team soon.",
+    "hi": "हमारी कस्टमर सपोर्ट टीम जल्द ही आपको WhatsApp पर मैसेज करेगी।",
+    "hinglish": "Hamari customer support team jald hi aapko WhatsApp par message karegi.",
+}
 
-SITE_VISIT_REQUEST = """
+SITE_VISIT_REQUEST = {
+    "en": """
 We'd be happy to arrange a site visit after price confirmation. 
 Would you like to proceed with a quotation first, so we can tailor the best solution for your needs?
-"""
+""",
+    "hi": """
+कीमत तय होने के बाद हम ख़ुशी से साइट विज़िट की व्यवस्था करेंगे। 
+क्या आप पहले कोटेशन लेना चाहेंगे, ताकि हम आपकी ज़रूरत के हिसाब से सबसे अच्छा समाधान दे सकें?
+""",
+    "hinglish": """
+Price confirm hone ke baad hum khushi se site visit arrange karenge. 
+Kya aap pehle quotation lena chahenge, taaki hum aapki zaroorat ke hisaab se best solution de sakein?
+""",
+}
 
-PRICING_INFO = """
-Our pricing starts from ₹195 - ₹350 per sq.ft., depending on the product and finish. 
+PRICING_INFO = {
+    "en": """
+Our pricing starts from {low} - {high} per sq.ft., depending on the product and finish. 
 Would you like a detailed quotation based on your specific requirements?
-"""
+""",
+    "hi": """
+हमारी कीमतें प्रोडक्ट और फिनिश के अनुसार {low} - {high} प्रति वर्ग फुट से शुरू होती हैं। 
+क्या आप अपनी ज़रूरत के हिसाब से विस्तृत कोटेशन चाहेंगे?
+""",
+    "hinglish": """
+Hamari pricing product aur finish ke hisaab se {low} - {high} per sq.ft. se shuru hoti hai. 
+Kya aap apni requirement ke hisaab se detailed quotation chahenge?
+""",
+}
+
+PRODUCT_PRICING_INFO = {
+    "en": """
+{product} is priced from {low} - {high} per sq.ft., depending on the finish. 
+What quantity (in sq.ft.) are you looking for? I can work out an estimate right away.
+""",
+    "hi": """
+{product} की कीमत फिनिश के अनुसार {low} - {high} प्रति वर्ग फुट है। 
+आपको कितनी मात्रा (वर्ग फुट में) चाहिए? मैं तुरंत अनुमान बता सकता हूँ।
+""",
+    "hinglish": """
+{product} ki price finish ke hisaab se {low} - {high} per sq.ft. hai. 
+Aapko kitni quantity (sq.ft. mein) chahiye? Main turant estimate bata sakta hoon.
+""",
+}
+
+PRODUCT_RATE_INFO = {
+    "en": """
+{product} is priced at {rate} per sq.ft. 
+What quantity (in sq.ft.) are you looking for? I can work out an estimate right away.
+""",
+    "hi": """
+{product} की कीमत {rate} प्रति वर्ग फुट है। 
+आपको कितनी मात्रा (वर्ग फुट में) चाहिए? मैं तुरंत अनुमान बता सकता हूँ।
+""",
+    "hinglish": """
+{product} ki price {rate} per sq.ft. hai. 
+Aapko kitni quantity (sq.ft. mein) chahiye? Main turant estimate bata sakta hoon.
+""",
+}
+
+RANGE_ESTIMATE_HEADER = {
+    "en": "Estimate for {quantity} ({terms}incl. {gst} GST):",
+    "hi": "{quantity} का अनुमान ({terms}{gst} GST सहित):",
+    "hinglish": "{quantity} ka estimate ({terms}{gst} GST included):",
+}
+
+VOLUME_DISCOUNT_TERMS = {
+    "en": "{rate} volume discount, ",
+    "hi": "{rate} वॉल्यूम डिस्काउंट, ",
+    "hinglish": "{rate} volume discount, ",
+}
+
+CATEGORY_RANGE = {
+    "en": "- {category} panels: {low} - {high}",
+    "hi": "- {category} पैनल: {low} - {high}",
+    "hinglish": "- {category} panels: {low} - {high}",
+}
 
-CLOSING_MESSAGE = """
+ESTIMATE_FOOTER = {
+    "en": "This is an estimate; our team will confirm the final quotation.",
+    "hi": "यह एक अनुमान है; अंतिम कोटेशन हमारी टीम कन्फ़र्म करेगी।",
+    "hinglish": "Yeh ek estimate hai; final quotation hamari team confirm karegi.",
+}
+
+RANGE_ESTIMATE_FOOTER = {
+    "en": "Tell me the product and finish you like, and I'll itemize the estimate.",
+    "hi": "आपको पसंद आया प्रोडक्ट और फिनिश बताइए, मैं अनुमान का पूरा ब्योरा दे दूँगा।",
+    "hinglish": "Aapko pasand aaya product aur finish bataiye, main estimate ka poora breakup de dunga.",
+}
+
+QUOTE_CONTACT_REQUEST = {
+    "en": "To provide a more personalized quote, could you please share your {field}?",
+    "hi": "आपको बेहतर कोटेशन देने के लिए, क्या आप अपना {field} बता सकते हैं?",
+    "hinglish": "Aapko better quote dene ke liye, kya aap apna {field} share kar sakte hain?",
+}
+
+# Contact details asked for with a quote, by language
+CONTACT_FIELDS = {
+    "en": {"name": "name", "phone": "phone number"},
+    "hi": {"name": "नाम", "phone": "फ़ोन नंबर"},
+    "hinglish": {"name": "naam", "phone": "phone number"},
+}
+
+CLOSING_MESSAGE = {
+    "en": """
 Thank you for reaching out to PARE India! I'll ensure that our team follows up with the required details. 
 Let us know if you need any additional support. Have a great day!
-"""
+""",
+    "hi": """
+PARE India से संपर्क करने के लिए धन्यवाद! हमारी टीम ज़रूरी जानकारी के साथ आपसे संपर्क करेगी। 
+कोई और मदद चाहिए तो हमें बताइए। आपका दिन शुभ हो!
+""",
+    "hinglish": """
+PARE India se contact karne ke liye thank you! Hamari team zaroori details ke saath aapse follow up karegi. 
+Aur koi help chahiye toh humein bataiye. Have a great day!
+""",
+}
 
-def get_pricing_info() -> dict:
-    """Return pricing information."""
+def get_pricing_info(
+    lead_data: Optional[Dict[str, Optional[str]]] = None,
+    product: Optional[str] = None,
+    finish: Optional[str] = None,
+    language: Optional[str] = None,
+) -> dict:
+    """
+    Return pricing information, in the customer's language, with an estimate computed from the price table when the quantity is known.
+    
+    With a product, the estimate is itemized; otherwise it gives the range of
+    totals per category, over the products suited to the requirement type.
+    """
+    lead_data = lead_data or {}
+    table = get_price_table()
+    catalog = get_catalog()
+    quantity = parse_quantity(lead_data.get("quantity"))
+    product_id = table.product_id(product)
+    category = product.strip().lower() if product and product.strip().lower() in catalog.categories else None
+    
+    estimate = None
+    if product_id and quantity:
+        quote = table.quote(product_id, quantity, finish)
+        if quote is not None:
+            estimate = quote._asdict()
+            message = f"{itemize(quote, language)}\n\n{localize(ESTIMATE_FOOTER, language)}"
+    
+    if estimate is None and quantity:
+        # Range of totals per category, over the products suited to the requirement type;
+        # products that do not say whether they suit homes or businesses count for both
+        application = (lead_data.get("requirement_type") or "").strip().lower()
+        lines = []
+        ranges = {}
+        for name, info in catalog.categories.items():
+            if category and name != category:
+                continue
+            products = [
+                p.id for p in catalog.by_category(name)
+                if application not in REQUIREMENT_APPLICATIONS or application in p.applications
+                or not REQUIREMENT_APPLICATIONS.intersection(p.applications)
+            ]
+            totals = table.total_range(products, quantity)
+            if totals is None:
+                continue
+            ranges[name] = {"low": round(totals[0], 2), "high": round(totals[1], 2)}
+            lines.append(localize(CATEGORY_RANGE, language).format(
+                category=localized_category(info, "name", language),
+                low=format_inr(totals[0]),
+                high=format_inr(totals[1]),
+            ))
+        if lines:
+            discount_rate = table.discount_rate(quantity)
+            terms = localize(VOLUME_DISCOUNT_TERMS, language).format(rate=f"{discount_rate:.0%}") if discount_rate else ""
+            header = localize(RANGE_ESTIMATE_HEADER, language).format(
+                quantity=format_quantity(quantity), terms=terms, gst=f"{table.gst_rate:.0%}"
+            )
+            estimate = {"quantity": quantity, "discount_rate": discount_rate, "gst_rate": table.gst_rate, "ranges": ranges}
+            message = "\n".join([header] + lines) + f"\n\n{localize(RANGE_ESTIMATE_FOOTER, language)}"
+    
+    if estimate is None:
+        rates = table.rate_range([product_id] if product_id else None)
+        template = PRODUCT_PRICING_INFO if product_id else PRICING_INFO
+        # A product with a single rate (one finish, or none to choose) has no range
+        if product_id and rates[0] == rates[1]:
+            template = PRODUCT_RATE_INFO
+        name = catalog.products[product_id].name if product_id in catalog.products else product_id
+        message = localize(template, language).format(
+            product=name, low=format_inr(rates[0]), high=format_inr(rates[1]), rate=format_inr(rates[0])
+        )
+    
     return {
-        "message": PRICING_INFO,
+        "message": message,
+        "estimate": estimate,
         "next_module": "lead_capture"
     }
 
-def handle_support_request(request_type: str) -> dict:
-    """Handle customer support requests."""
+def handle_support_request(request_type: str, language: Optional[str] = None) -> dict:
+    """Handle customer support requests, in the customer's language."""
     message = ""
     next_module = "support"
     
     if request_type == "callback":
-        message = CALLBACK_REQUEST
+        message = localize(CALLBACK_REQUEST, language)
     elif request_type == "whatsapp":
-        message = "We'll arrange for a WhatsApp message from our customer support team soon."
+        message = localize(WHATSAPP_REQUEST, language)
         next_module = "closing"
     elif request_type == "site_visit":
-        message = SITE_VISIT_REQUEST
+        message = localize(SITE_VISIT_REQUEST, language)
     
     return {
         "message": message,
         "next_module": next_module
     }
 
-def close_conversation() -> str:
-    """Return closing message for the conversation."""
-    return CLOSING_MESSAGE 
\ No newline at end of file
+def close_conversation(language: Optional[str] = None) -> str:
+    """Return closing message for the conversation, in the customer's language."""
+    return localize(CLOSING_MESSAGE, language) 
\ No newline at end of file
@@ -0,0 +1,479 @@
+"""
+Admission Control Utility
+Shared gate in front of the OpenAI model: rate limits, adaptive concurrency, retries and priorities.
+
+Under a traffic spike every turn would otherwise call the API at once, and
+the provider answers the excess with 429s. Here each model call is admitted
+first: it waits until the requests-per-minute and tokens-per-minute buckets
+have room and one of the in-flight slots is free. The number of slots adapts
+(AIMD): it grows by about one per round of successful calls, and is cut on a
+429 or when latency rises well above its running average. Rate limits,
+timeouts, connection and server errors are retried after exponentially
+growing, fully jittered delays, or the server's Retry-After, unless the
+turn's deadline would pass first. Waiting calls are served by priority:
+conversations that are capturing a lead go ahead of new ones.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+import openai
+from agents.items import ModelResponse, TResponseInputItem, TResponseStreamEvent
+from agents.models.interface import Model, ModelTracing
+from openai.types.responses import ResponseCompletedEvent
+
+from src.utils.deadline import within_deadline
+from src.utils.memory import estimate_tokens
+from src.utils.prompt_cache import get_responses_model
+from src.utils.sessions import SessionState, current_session
+from src.utils.telemetry import Telemetry, get_telemetry
+
+# Most model calls in flight at once, and the floor the limit backs off to
+DEFAULT_MAX_CONCURRENCY = 32
+DEFAULT_MIN_CONCURRENCY = 1
+
+# Retries of a failed call, and the range of the jittered delay before each, in seconds
+DEFAULT_MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 20.0
+
+# Concurrency limit multipliers on a 429, and on a call much slower than the running average
+RATE_LIMIT_BACKOFF = 0.5
+LATENCY_BACKOFF = 0.9
+
+# A call is "much slower" above this multiple of the running average latency,
+# which follows calls with this smoothing once this many have completed
+LATENCY_TOLERANCE = 2.0
+LATENCY_SMOOTHING = 0.05
+LATENCY_WARMUP = 20
+
+# Output tokens reserved per call until its actual usage is known
+DEFAULT_OUTPUT_TOKENS = 300
+
+# Priority classes, served in this order
+LEAD_CAPTURE = "lead_capture"
+NEW_CONVERSATION = "new_conversation"
+PRIORITIES = (LEAD_CAPTURE, NEW_CONVERSATION)
+
+# Retry reasons
+RATE_LIMITED = "rate_limited"
+TIMEOUT = "timeout"
+CONNECTION_ERROR = "connection_error"
+SERVER_ERROR = "server_error"
+
+
+def call_priority(session: Optional[SessionState]) -> str:
+    """Priority class of a model call: conversations with any lead data go first."""
+    if session is not None and any(session.lead_data.values()):
+        return LEAD_CAPTURE
+    return NEW_CONVERSATION
+
+
+def retry_reason(error: BaseException) -> Optional[str]:
+    """Why a failed call may be retried, or None if it may not."""
+    if isinstance(error, openai.RateLimitError):
+        return RATE_LIMITED
+    if isinstance(error, openai.APITimeoutError):
+        return TIMEOUT
+    if isinstance(error, openai.APIConnectionError):
+        return CONNECTION_ERROR
+    if isinstance(error, openai.InternalServerError):
+        return SERVER_ERROR
+    return None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class TokenBucket:
+    """Rate limit of `per_minute` units, with bursts of up to a minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (capped at the capacity, so any amount can pass)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float, now: float):
+        """Use `amount` units; a negative amount returns them. The level may go below zero."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - amount)
+
+
+class Ticket:
+    """An admitted model call, returned to the controller with `release`."""
+
+    __slots__ = ("priority", "tokens", "loop", "future", "enqueued", "started", "granted", "cancelled")
+
+    def __init__(self, priority: str, tokens: int, loop: asyncio.AbstractEventLoop):
+        self.priority = priority
+        self.tokens = tokens
+        self.loop = loop
+        self.future = loop.create_future()
+        self.enqueued = time.perf_counter()
+        self.started = 0.0
+        self.granted = False
+        self.cancelled = False
+
+
+class _PriorityStats:
+    def __init__(self):
+        self.admitted = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+
+class AdmissionController:
+    """
+    Process-wide admission control for model calls.
+
+    Thread-safe, and usable from several event loops: each waiting call is
+    woken on its own loop.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        min_concurrency: int = DEFAULT_MIN_CONCURRENCY,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        telemetry: Optional[Telemetry] = None,
+    ):
+        # Unset limits are not enforced locally
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.max_retries = max_retries
+        self._telemetry = telemetry
+
+        self._lock = threading.Lock()
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiting: List[Tuple[int, int, Ticket]] = []
+        self._order = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._timer_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._latency = 0.0
+        self._completed = 0
+        self._stats = {priority: _PriorityStats() for priority in PRIORITIES}
+        self._throttled = 0
+        self._retries: Dict[str, int] = {}
+
+    @property
+    def telemetry(self) -> Telemetry:
+        return self._telemetry or get_telemetry()
+
+    @property
+    def limit(self) -> int:
+        """Current number of in-flight slots."""
+        return int(self._limit)
+
+    @property
+    def waiting(self) -> int:
+        """Number of calls waiting for admission."""
+        with self._lock:
+            return sum(1 for _, _, ticket in self._waiting if not ticket.cancelled)
+
+    async def acquire(self, priority: str, tokens: int) -> Ticket:
+        """Wait until a call of about `tokens` tokens is admitted, ahead of lower-priority calls."""
+        ticket = Ticket(priority, tokens, asyncio.get_running_loop())
+        with self._lock:
+            heapq.heappush(self._waiting, (PRIORITIES.index(priority), next(self._order), ticket))
+            self._dispatch()
+        try:
+            await ticket.future
+        except BaseException:
+            with self._lock:
+                ticket.cancelled = True
+                if ticket.granted:
+                    self._in_flight -= 1
+                    self._dispatch()
+            raise
+
+        wait = ticket.started - ticket.enqueued
+        with self._lock:
+            stats = self._stats[priority]
+            stats.admitted += 1
+            stats.wait_seconds += wait
+            stats.max_wait_seconds = max(stats.max_wait_seconds, wait)
+        self.telemetry.observe("admission_wait_seconds", wait, priority=priority)
+        return ticket
+
+    def release(self, ticket: Ticket, used_tokens: Optional[int] = None, error: Optional[BaseException] = None):
+        """
+        Return an admitted call's slot.
+
+        `used_tokens` is the call's actual usage, given when it succeeded;
+        `error` is what it failed with.
+        """
+        latency = time.perf_counter() - ticket.started
+        rate_limited = isinstance(error, openai.RateLimitError)
+        with self._lock:
+            self._in_flight -= 1
+            now = time.monotonic()
+            if self.tokens is not None and used_tokens is not None:
+                # Settle the reservation against what the call actually used
+                self.tokens.take(used_tokens - ticket.tokens, now)
+
+            if rate_limited:
+                self._throttled += 1
+                self._limit = max(float(self.min_concurrency), self._limit * RATE_LIMIT_BACKOFF)
+            elif error is None and used_tokens is not None:
+                slow = self._completed >= LATENCY_WARMUP and latency > LATENCY_TOLERANCE * self._latency
+                self._latency = latency if not self._completed else (
+                    self._latency + LATENCY_SMOOTHING * (latency - self._latency)
+                )
+                self._completed += 1
+                if slow:
+                    self._limit = max(float(self.min_concurrency), self._limit * LATENCY_BACKOFF)
+                else:
+                    self._limit = min(float(self.max_concurrency), self._limit + 1.0 / self._limit)
+            self._dispatch()
+        if rate_limited:
+            self.telemetry.increment("model_rate_limited_total")
+
+    def retry_delay(self, error: BaseException, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying a call that failed with `error`, or None to give up."""
+        reason = retry_reason(error)
+        if reason is None or attempt >= self.max_retries:
+            return None
+        with self._lock:
+            self._retries[reason] = self._retries.get(reason, 0) + 1
+        self.telemetry.increment("model_retries_total", reason=reason)
+
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, RETRY_MAX_DELAY)
+        return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+
+    def _dispatch(self):
+        # Admit waiting calls in priority order while slots and rate limits allow; called with the lock held
+        while self._waiting:
+            ticket = self._waiting[0][2]
+            if ticket.cancelled or ticket.future.done():
+                heapq.heappop(self._waiting)
+                continue
+            if self._in_flight >= int(self._limit):
+                return
+            now = time.monotonic()
+            delay = max(
+                self.requests.delay(1, now) if self.requests is not None else 0.0,
+                self.tokens.delay(ticket.tokens, now) if self.tokens is not None else 0.0,
+            )
+            if delay > 0:
+                self._schedule(delay)
+                return
+
+            heapq.heappop(self._waiting)
+            if self.requests is not None:
+                self.requests.take(1, now)
+            if self.tokens is not None:
+                self.tokens.take(ticket.tokens, now)
+            self._in_flight += 1
+            ticket.granted = True
+            ticket.started = time.perf_counter()
+            ticket.loop.call_soon_threadsafe(_wake, ticket.future)
+
+    def _schedule(self, delay: float):
+        # Dispatch again once the rate limits have refilled. Always called from a running loop;
+        # a timer left on another loop may fire as well, which is harmless
+        loop = asyncio.get_running_loop()
+        when = loop.time() + delay
+        if self._timer is not None and self._timer_loop is loop and self._timer.when() <= when:
+            return
+
+        def fire():
+            with self._lock:
+                if self._timer is timer:
+                    self._timer = None
+                self._dispatch()
+
+        timer = loop.call_at(when, fire)
+        self._timer = timer
+        self._timer_loop = loop
+
+    def stats(self) -> Dict[str, Any]:
+        """Concurrency limit, calls in flight and waiting, queue wait per priority class, throttles and retries."""
+        with self._lock:
+            return {
+                "concurrency_limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "waiting": sum(1 for _, _, ticket in self._waiting if not ticket.cancelled),
+                "mean_latency_ms": round(self._latency * 1000, 3),
+                "priorities": {
+                    priority: {
+                        "admitted": stats.admitted,
+                        "mean_wait_ms": round(stats.wait_seconds / stats.admitted * 1000, 3) if stats.admitted else 0.0,
+                        "max_wait_ms": round(stats.max_wait_seconds * 1000, 3),
+                    }
+                    for priority, stats in self._stats.items()
+                },
+                "rate_limited": self._throttled,
+                "retries": dict(self._retries),
+            }
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _get(item: Any, key: str) -> Any:
+    if isinstance(item, dict):
+        return item.get(key)
+    return getattr(item, key, None)
+
+
+def estimate_call_tokens(system_instructions: Optional[str], input: Union[str, List[TResponseInputItem]], model_settings: Any) -> int:
+    """Tokens a model call is expected to use: its prompt, plus the output it may produce."""
+    tokens = estimate_tokens(system_instructions or "")
+    if isinstance(input, str):
+        tokens += estimate_tokens(input)
+    else:
+        for item in input:
+            content = _get(item, "content") or _get(item, "output") or _get(item, "arguments") or ""
+            tokens += estimate_tokens(content if isinstance(content, str) else str(content))
+    return tokens + (getattr(model_settings, "max_tokens", None) or DEFAULT_OUTPUT_TOKENS)
+
+
+class AdmissionModel(Model):
+    """Model wrapper that admits each call through an AdmissionController and retries failed calls."""
+
+    def __init__(self, model: Union[str, Model], controller: Optional[AdmissionController] = None):
+        self._model = model
+        self._controller = controller
+
+    @property
+    def controller(self) -> AdmissionController:
+        return self._controller or get_admission_controller()
+
+    @property
+    def model(self) -> Model:
+        # Resolve model names lazily; retries are left to the controller, not the API client
+        if isinstance(self._model, str):
+            self._model = get_responses_model(self._model, max_retries=0)
+        return self._model
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> ModelResponse:
+        controller = self.controller
+        priority = call_priority(current_session.get())
+        tokens = estimate_call_tokens(system_instructions, input, model_settings)
+        for attempt in itertools.count():
+            ticket = await controller.acquire(priority, tokens)
+            try:
+                response = await self.model.get_response(
+                    system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+                )
+            except Exception as e:
+                error = e
+            except BaseException as e:
+                controller.release(ticket, error=e)
+                raise
+            else:
+                controller.release(ticket, used_tokens=response.usage.total_tokens)
+                return response
+
+            controller.release(ticket, error=error)
+            delay = controller.retry_delay(error, attempt)
+            # A retry that would start after the turn's deadline cannot help the customer
+            if delay is None or not within_deadline(delay):
+                raise error
+            await asyncio.sleep(delay)
+
+    async def stream_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        controller = self.controller
+        priority = call_priority(current_session.get())
+        tokens = estimate_call_tokens(system_instructions, input, model_settings)
+        for attempt in itertools.count():
+            ticket = await controller.acquire(priority, tokens)
+            started = False
+            used_tokens = 0
+            try:
+                async for event in self.model.stream_response(
+                    system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+                ):
+                    if isinstance(event, ResponseCompletedEvent) and event.response.usage is not None:
+                        used_tokens = event.response.usage.total_tokens or 0
+                    started = True
+                    yield event
+            except Exception as e:
+                error = e
+            except BaseException as e:
+                controller.release(ticket, error=e)
+                raise
+            else:
+                controller.release(ticket, used_tokens=used_tokens)
+                return
+
+            controller.release(ticket, error=error)
+            # Once events have reached the customer the call cannot be replayed
+            delay = None if started else controller.retry_delay(error, attempt)
+            if delay is None or not within_deadline(delay):
+                raise error
+            await asyncio.sleep(delay)
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """
+    Return the process-wide admission controller, creating it on first use.
+
+    OPENAI_RPM_LIMIT and OPENAI_TPM_LIMIT set the requests and tokens per
+    minute admitted (unset: not limited locally), MODEL_MAX_CONCURRENCY the
+    most calls in flight and MODEL_MAX_RETRIES the retries of a failed call.
+    """
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController(
+                requests_per_minute=float(os.getenv("OPENAI_RPM_LIMIT") or 0) or None,
+                tokens_per_minute=float(os.getenv("OPENAI_TPM_LIMIT") or 0) or None,
+                max_concurrency=int(os.getenv("MODEL_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                max_retries=int(os.getenv("MODEL_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+            )
+    return _controller
@@ -0,0 +1,344 @@
+"""
+Brochure Search Utility
+BM25 retrieval over the product brochures in public/brochures.
+
+build_index() extracts the text of each brochure, splits it into overlapping
+chunks and writes a BM25 inverted index to disk. Indexing is incremental:
+extracted chunks are cached by the brochure's content hash, so only new or
+changed brochures are read again. BrochureIndex memory-maps the index files,
+so loading is instant and the postings are shared between processes.
+
+Index files (native byte order; <n> is the build generation named in the manifest):
+    manifest.json          brochure hashes, chunk locations, vocabulary and BM25 stats
+    postings.<n>.bin       uint32 (chunk id, term frequency) pairs, grouped by term
+    lengths.<n>.bin        uint32 token count per chunk
+    chunks.<n>.bin         UTF-8 chunk texts, back to back
+    chunk_offsets.<n>.bin  uint64 byte offset of each chunk in chunks.bin, plus the end
+"""
+
+import hashlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import threading
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BROCHURE_DIR = os.path.join("public", "brochures")
+DEFAULT_INDEX_DIR = os.path.join("data", "brochure_index")
+
+# Brochure files that are indexed; README files describe the directory and are skipped
+BROCHURE_EXTENSIONS = (".pdf", ".txt", ".md")
+
+# Chunking, in words
+CHUNK_WORDS = 120
+CHUNK_OVERLAP = 30
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+DEFAULT_TOP_K = 3
+SNIPPET_CHARS = 400
+
+INDEX_VERSION = 1
+
+_TOKEN_PATTERN = re.compile(r"[\w\u0900-\u097F]+", re.UNICODE)
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were with "
+    "you your we our can will do does what which how".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords; "+" is spelled out, so "Easy+" matches "easy plus"."""
+    text = text.lower().replace("+", " plus ")
+    return [token for token in _TOKEN_PATTERN.findall(text) if token not in STOPWORDS]
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_pages(path: str) -> List[str]:
+    """Return the text of each page of a brochure (a text file is a single page)."""
+    if path.lower().endswith(".pdf"):
+        try:
+            from pypdf import PdfReader
+        except ImportError:
+            raise ImportError("Indexing PDF brochures requires pypdf: pip install pypdf")
+        return [page.extract_text() or "" for page in PdfReader(path).pages]
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return [f.read()]
+
+
+def chunk_pages(pages: List[str], chunk_words: int = CHUNK_WORDS, overlap: int = CHUNK_OVERLAP) -> List[Dict]:
+    """Split page texts into overlapping word windows. Returns dicts with "page" (1-based) and "text"."""
+    chunks = []
+    step = max(1, chunk_words - overlap)
+    for page_number, text in enumerate(pages, start=1):
+        words = text.split()
+        for start in range(0, max(len(words) - overlap, 1), step):
+            chunk = " ".join(words[start:start + chunk_words])
+            if chunk:
+                chunks.append({"page": page_number, "text": chunk})
+    return chunks
+
+
+def _brochure_files(brochure_dir: str) -> List[str]:
+    if not os.path.isdir(brochure_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(brochure_dir)
+        if name.lower().endswith(BROCHURE_EXTENSIONS) and not name.lower().startswith("readme")
+    )
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_index(brochure_dir: str = DEFAULT_BROCHURE_DIR, index_dir: str = DEFAULT_INDEX_DIR) -> Dict:
+    """
+    Build or update the brochure index.
+
+    Brochures whose content hash is unchanged reuse their cached chunks; only
+    new or changed ones are extracted. The postings are then rebuilt from all
+    chunks, since adding a brochure changes chunk ids and corpus statistics.
+    Returns counts of indexed, extracted, reused and removed brochures.
+    """
+    cache_dir = os.path.join(index_dir, "chunks")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    manifest_path = os.path.join(index_dir, "manifest.json")
+    previous = {}
+    generation = 1
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            previous_manifest = json.load(f)
+        previous = previous_manifest.get("brochures", {})
+        generation = previous_manifest.get("generation", 0) + 1
+
+    brochures = {}
+    all_chunks: List[Tuple[str, Dict]] = []
+    stats = {"brochures": 0, "extracted": 0, "reused": 0, "removed": 0, "chunks": 0}
+
+    for name in _brochure_files(brochure_dir):
+        content_hash = file_hash(os.path.join(brochure_dir, name))
+        cache_path = os.path.join(cache_dir, f"{content_hash}.json")
+        if previous.get(name, {}).get("hash") == content_hash and os.path.exists(cache_path):
+            with open(cache_path, encoding="utf-8") as f:
+                chunks = json.load(f)
+            stats["reused"] += 1
+        else:
+            try:
+                chunks = chunk_pages(extract_pages(os.path.join(brochure_dir, name)))
+            except Exception as e:
+                logger.warning("Skipping brochure %s: %s", name, e)
+                continue
+            with open(cache_path, "w", encoding="utf-8") as f:
+                json.dump(chunks, f, ensure_ascii=False)
+            stats["extracted"] += 1
+
+        brochures[name] = {"hash": content_hash, "first_chunk": len(all_chunks), "chunks": len(chunks)}
+        all_chunks.extend((name, chunk) for chunk in chunks)
+
+    # Drop cached chunks of brochures that were removed or changed
+    live_hashes = {info["hash"] for info in brochures.values()}
+    for cache_name in os.listdir(cache_dir):
+        if cache_name[:-len(".json")] not in live_hashes:
+            os.remove(os.path.join(cache_dir, cache_name))
+    stats["removed"] = len(set(previous) - set(brochures))
+
+    # Inverted index: term -> [(chunk id, term frequency)]
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    lengths = array("I")
+    texts = bytearray()
+    offsets = array("Q", [0])
+    for chunk_id, (_, chunk) in enumerate(all_chunks):
+        tokens = tokenize(chunk["text"])
+        lengths.append(len(tokens))
+        counts: Dict[str, int] = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings.setdefault(token, []).append((chunk_id, count))
+        texts += chunk["text"].encode("utf-8")
+        offsets.append(len(texts))
+
+    flat = array("I")
+    vocabulary = {}
+    for term in sorted(postings):
+        vocabulary[term] = [len(flat) // 2, len(postings[term])]
+        for chunk_id, count in postings[term]:
+            flat.append(chunk_id)
+            flat.append(count)
+
+    # Data files of a new generation never overwrite the ones a reader may have open
+    data = {"postings": flat.tobytes(), "lengths": lengths.tobytes(), "chunks": bytes(texts), "chunk_offsets": offsets.tobytes()}
+    for name, content in data.items():
+        _write_atomic(os.path.join(index_dir, f"{name}.{generation}.bin"), content)
+
+    # The manifest switches readers to the new generation
+    manifest = {
+        "version": INDEX_VERSION,
+        "generation": generation,
+        "brochures": brochures,
+        "chunks": [[name, chunk["page"]] for name, chunk in all_chunks],
+        "vocabulary": vocabulary,
+        "average_length": sum(lengths) / len(lengths) if lengths else 0.0,
+    }
+    _write_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False).encode("utf-8"))
+
+    # Generations before the previous one can go. The previous one stays for
+    # readers that read the old manifest but have not mapped its files yet.
+    for file_name in os.listdir(index_dir):
+        parts = file_name.split(".")
+        if len(parts) == 3 and parts[2] == "bin" and parts[1].isdigit() and int(parts[1]) < generation - 1:
+            os.remove(os.path.join(index_dir, file_name))
+
+    stats["brochures"] = len(brochures)
+    stats["chunks"] = len(all_chunks)
+    return stats
+
+
+def _map(path: str):
+    # mmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class BrochureIndex:
+    """Read-only BM25 index over brochure chunks, backed by memory-mapped files."""
+
+    def __init__(self, index_dir: str = DEFAULT_INDEX_DIR):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported brochure index version: {manifest.get('version')}")
+
+        self.chunks = manifest["chunks"]
+        self.vocabulary: Dict[str, List[int]] = manifest["vocabulary"]
+        self.average_length = manifest["average_length"] or 1.0
+
+        generation = manifest["generation"]
+        self._maps = [
+            _map(os.path.join(index_dir, f"{name}.{generation}.bin"))
+            for name in ("postings", "lengths", "chunks", "chunk_offsets")
+        ]
+        self._postings = memoryview(self._maps[0]).cast("I")
+        self._lengths = memoryview(self._maps[1]).cast("I")
+        self._texts = self._maps[2]
+        self._offsets = memoryview(self._maps[3]).cast("Q")
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, top_k: int = DEFAULT_TOP_K) -> List[Dict]:
+        """Return the top_k chunks for a query, best first, with brochure, page, score and snippet."""
+        total = len(self.chunks)
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            entry = self.vocabulary.get(term)
+            if entry is None:
+                continue
+            start, count = entry
+            idf = math.log(1 + (total - count + 0.5) / (count + 0.5))
+            pairs = self._postings[start * 2:(start + count) * 2]
+            for i in range(0, len(pairs), 2):
+                chunk_id, tf = pairs[i], pairs[i + 1]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[chunk_id] / self.average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        results = []
+        for chunk_id, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+            brochure, page = self.chunks[chunk_id]
+            results.append({
+                "brochure": os.path.splitext(brochure)[0],
+                "page": page,
+                "score": round(score, 3),
+                "snippet": self.chunk_text(chunk_id)[:SNIPPET_CHARS],
+            })
+        return results
+
+    def chunk_text(self, chunk_id: int) -> str:
+        """Full text of a chunk."""
+        return bytes(self._texts[self._offsets[chunk_id]:self._offsets[chunk_id + 1]]).decode("utf-8")
+
+    def close(self):
+        self._postings.release()
+        self._lengths.release()
+        self._offsets.release()
+        for mapped in self._maps:
+            if isinstance(mapped, mmap.mmap):
+                mapped.close()
+
+
+# Attempts at loading a rebuilt index before the loaded one is kept
+LOAD_ATTEMPTS = 3
+
+_index: Optional[BrochureIndex] = None
+_index_mtime = None
+_index_lock = threading.Lock()
+
+
+def _load_index(index_dir: str) -> Optional[BrochureIndex]:
+    # Called with _index_lock held
+    global _index, _index_mtime
+    for _ in range(LOAD_ATTEMPTS):
+        try:
+            mtime = os.stat(os.path.join(index_dir, "manifest.json")).st_mtime_ns
+        except OSError:
+            return _index
+        if _index is not None and mtime == _index_mtime:
+            return _index
+        try:
+            index = BrochureIndex(index_dir)
+        except (OSError, ValueError) as e:
+            # A rebuild replaced the manifest, or removed its files, while it was loading
+            logger.warning("Reloading brochure index after a failed load: %s", e)
+            continue
+        if _index is not None:
+            _index.close()
+        _index, _index_mtime = index, mtime
+        return _index
+    return _index
+
+
+def get_brochure_index() -> Optional[BrochureIndex]:
+    """
+    Return the brochure index at BROCHURE_INDEX_PATH (default data/brochure_index),
+    reopening it after a rebuild. Returns None if no index has been built.
+
+    The replaced index is closed on reopening, so searches should go through
+    search_brochures(), which cannot overlap a reopen.
+    """
+    with _index_lock:
+        return _load_index(os.getenv("BROCHURE_INDEX_PATH", DEFAULT_INDEX_DIR))
+
+
+def search_brochures(query: str, top_k: int = DEFAULT_TOP_K) -> Optional[List[Dict]]:
+    """Search the current brochure index (see BrochureIndex.search). Returns None if no index has been built."""
+    with _index_lock:
+        index = _load_index(os.getenv("BROCHURE_INDEX_PATH", DEFAULT_INDEX_DIR))
+        if index is None:
+            return None
+        return index.search(query, top_k=top_k)
@@ -1,56 +1,463 @@
 """
-CRM Integration Utility - Simplified
+CRM Integration Utility
 Handles sending lead data to the CRM system.
+
+Leads are delivered in the background by LeadDeliveryPipeline, so a slow or
+unavailable CRM never blocks a chat turn. Every lead is first appended to a
+local JSONL spool; it is marked done only once the CRM has accepted it.
+Pending leads are queued again periodically while the pipeline runs, so a
+lead that failed delivery is retried without waiting for a restart, and they
+are replayed when the pipeline starts again. A lead the CRM rejects outright
+(a status that is not worth retrying) is marked rejected instead, and moved
+to a dead-letter file next to the spool when the spool is compacted.
 """
 
 import os
 import json
-from typing import Dict, Optional
-import requests
-from dotenv import load_dotenv
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from src.utils.environment import load_environment
+from src.utils.telemetry import get_telemetry
+
+if TYPE_CHECKING:
+    import requests
+
+# Delivery defaults
+DEFAULT_SPOOL_PATH = os.path.join("data", "crm_spool.jsonl")
+DEFAULT_QUEUE_SIZE = 1000
+DEFAULT_WORKERS = 2
+DEFAULT_BATCH_SIZE = 1  # leads per request; >1 posts {"leads": [...]}
+DEFAULT_BATCH_WAIT = 0.5  # seconds to wait for a batch to fill
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BACKOFF = 0.5  # seconds, doubled on every retry
+DEFAULT_MAX_BACKOFF = 30.0
+DEFAULT_TIMEOUT = (3.05, 10)  # connect, read seconds
+DEFAULT_REDELIVERY_INTERVAL = 60.0  # seconds between passes that queue failed leads again
+
+# Status codes worth retrying; other errors will not succeed on a retry
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Shared HTTP session so that requests reuse pooled keep-alive connections
+_http_session: Optional["requests.Session"] = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session(pool_size: int = 10) -> "requests.Session":
+    """Return the shared HTTP session used for CRM requests (requests is imported on first use)."""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+    return _http_session
+
+
+def clean_lead_data(lead_data: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """Remove empty values from lead data."""
+    return {k: v for k, v in lead_data.items() if v is not None}
 
-# Load environment variables
-load_dotenv()
 
 def send_lead_to_crm(lead_data: Dict[str, Optional[str]]) -> bool:
-    """Send lead data to the CRM system."""
-    # Get API credentials
-    crm_api_url = os.getenv("CRM_API_URL")
-    crm_api_key = os.getenv("CRM_API_KEY")
-    
-    if not crm_api_url or not crm_api_key:
-        print("CRM credentials not configured - storing lead data locally")
-        # For demo purposes, just print the data
-        print(f"LEAD DATA: {json.dumps(lead_data, indent=2)}")
+    """Queue a lead for delivery by the process-wide pipeline (see LeadDeliveryPipeline.submit)."""
+    return get_lead_pipeline().submit(lead_data)
+
+
+class LeadSpool:
+    """
+    Append-only JSONL journal of leads waiting for delivery.
+
+    Each lead is written as {"id", "op": "pending", "lead"} before it is queued
+    and {"id", "op": "done"} once delivered, so a crash never loses a lead. A
+    lead the CRM will not accept is written as {"id", "op": "rejected", "lead"};
+    compaction moves it to the dead-letter file <name>.rejected.jsonl.
+    """
+
+    def __init__(self, path: str = DEFAULT_SPOOL_PATH, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        root, ext = os.path.splitext(path)
+        self.rejected_path = f"{root}.rejected{ext}"
+        # Reentrant, so compact can hold it across reading and rewriting the journal
+        self._lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def append(self, record: Dict):
+        """Append one record to the journal."""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+
+    def pending(self) -> List[Dict]:
+        """Return the records that were spooled but never marked done or rejected."""
+        return self._read()[0]
+
+    def _read(self) -> Tuple[List[Dict], List[Dict]]:
+        # Pending and rejected records
+        pending: Dict[str, Dict] = {}
+        rejected: List[Dict] = []
+        if not os.path.exists(self.path):
+            return [], []
+        with self._lock:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A torn last line from a crash mid-write
+                        continue
+                    if record.get("op") == "pending":
+                        pending[record["id"]] = record
+                    elif record.get("op") == "done":
+                        pending.pop(record["id"], None)
+                    elif record.get("op") == "rejected":
+                        pending.pop(record["id"], None)
+                        rejected.append(record)
+        return list(pending.values()), rejected
+
+    def compact(self) -> List[Dict]:
+        """Rewrite the journal with only the pending records, and return them; rejected ones go to the dead-letter file."""
+        with self._lock:
+            pending, rejected = self._read()
+            if rejected:
+                with open(self.rejected_path, "a", encoding="utf-8") as f:
+                    for record in rejected:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for record in pending:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        return pending
+
+
+class LeadDeliveryPipeline:
+    """
+    Background delivery of leads to the CRM.
+
+    Leads go through a bounded in-process queue to worker threads, which post
+    them over a pooled keep-alive HTTP session with timeouts, retrying with
+    exponential backoff. With batch_size > 1, up to that many leads are posted
+    in one request. Every `redelivery_interval` seconds, leads still pending in
+    the spool and not already queued (failed, or dropped by a full queue) are
+    queued again.
+    """
+
+    def __init__(
+        self,
+        api_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+        spool_path: str = DEFAULT_SPOOL_PATH,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        workers: int = DEFAULT_WORKERS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        batch_wait: float = DEFAULT_BATCH_WAIT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF,
+        timeout=DEFAULT_TIMEOUT,
+        redelivery_interval: float = DEFAULT_REDELIVERY_INTERVAL,
+    ):
+        load_environment()
+        self.api_url = api_url if api_url is not None else os.getenv("CRM_API_URL")
+        self.api_key = api_key if api_key is not None else os.getenv("CRM_API_KEY")
+        self.spool = LeadSpool(spool_path)
+        self.queue: "queue.Queue[Dict]" = queue.Queue(maxsize=queue_size)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.redelivery_interval = redelivery_interval
+        self.http = get_http_session(pool_size=max(workers, 1))
+
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        # Ids of the leads queued or being delivered
+        self._queued: set = set()
+        self._queued_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "submitted": 0,
+            "delivered": 0,
+            "failed": 0,
+            "rejected": 0,
+            "retries": 0,
+            "replayed": 0,
+            "redelivered": 0,
+            "overflowed": 0,
+            "requests": 0,
+            "request_latency_total": 0.0,
+            "delivery_latency_total": 0.0,
+            "delivery_latency_max": 0.0,
+        }
+
+    def start(self) -> "LeadDeliveryPipeline":
+        """Replay leads left in the spool and start the worker and redelivery threads."""
+        self._count("replayed", self._requeue_pending())
+
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"crm-delivery-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._redeliver, name="crm-redelivery", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the workers once queued and in-flight leads are done, or after `timeout` seconds."""
+        deadline = time.time() + timeout
+        while self.queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.time()))
+        self._threads = []
+
+    def submit(self, lead_data: Dict[str, Optional[str]]) -> bool:
+        """
+        Spool a lead and queue it for delivery. Never blocks on the CRM.
+
+        Returns False if the queue is full; the lead stays in the spool and is
+        queued again by the next redelivery pass.
+        """
+        record = {
+            "id": uuid.uuid4().hex,
+            "op": "pending",
+            "lead": clean_lead_data(lead_data),
+            "submitted_at": time.time(),
+        }
+        # Marked as queued before it is spooled, so a redelivery pass cannot queue it as well
+        with self._queued_lock:
+            self._queued.add(record["id"])
+        self.spool.append(record)
+        self._count("submitted")
+        if not self._enqueue(record):
+            self._count("overflowed")
+            return False
         return True
-    
-    try:
-        # Clean up lead data (remove None values)
-        clean_lead_data = {k: v for k, v in lead_data.items() if v is not None}
-        
-        # Make API request to CRM
+
+    def metrics(self) -> Dict:
+        """Return queue depth, delivery counts and latencies."""
+        with self._metrics_lock:
+            m = dict(self._metrics)
+        m["queue_depth"] = self.queue.qsize()
+        m["request_latency_avg"] = m["request_latency_total"] / m["requests"] if m["requests"] else 0.0
+        m["delivery_latency_avg"] = m["delivery_latency_total"] / m["delivered"] if m["delivered"] else 0.0
+        return m
+
+    def _enqueue(self, record: Dict) -> bool:
+        with self._queued_lock:
+            self._queued.add(record["id"])
+        try:
+            self.queue.put_nowait(record)
+            return True
+        except queue.Full:
+            with self._queued_lock:
+                self._queued.discard(record["id"])
+            return False
+
+    def _requeue_pending(self) -> int:
+        # Queue the spooled leads that are not queued or in delivery already; returns how many
+        requeued = 0
+        for record in self.spool.compact():
+            with self._queued_lock:
+                queued = record["id"] in self._queued
+            if not queued and self._enqueue(record):
+                requeued += 1
+        return requeued
+
+    def _redeliver(self):
+        while not self._stopping.wait(self.redelivery_interval):
+            try:
+                self._count("redelivered", self._requeue_pending())
+            except OSError as e:
+                print(f"Error reading the CRM spool: {str(e)}")
+
+    def _count(self, name: str, amount=1):
+        with self._metrics_lock:
+            self._metrics[name] += amount
+
+    def _next_batch(self) -> List[Dict]:
+        try:
+            batch = [self.queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while not self._stopping.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+            with get_telemetry().span("crm_delivery"):
+                delivered = self._deliver_with_retry(batch)
+            now = time.time()
+            for record in batch:
+                if delivered is False:
+                    # Not worth retrying: dead-lettered rather than left pending
+                    self.spool.append({**record, "op": "rejected", "rejected_at": now})
+                    self._count("rejected")
+                    get_telemetry().increment("crm_leads_rejected_total")
+                elif delivered:
+                    self.spool.append({"id": record["id"], "op": "done"})
+                    latency = now - record.get("submitted_at", now)
+                    get_telemetry().observe("crm_lead_latency_seconds", latency)
+                    with self._metrics_lock:
+                        self._metrics["delivered"] += 1
+                        self._metrics["delivery_latency_total"] += latency
+                        self._metrics["delivery_latency_max"] = max(self._metrics["delivery_latency_max"], latency)
+                else:
+                    # Left pending in the spool, to be queued again by the next redelivery pass
+                    self._count("failed")
+                with self._queued_lock:
+                    self._queued.discard(record["id"])
+                self.queue.task_done()
+
+    def _deliver_with_retry(self, batch: List[Dict]) -> Optional[bool]:
+        """Deliver a batch. Returns True when delivered, False when rejected, or None after the last retry."""
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self._count("retries")
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+                # Full jitter, so that workers do not retry in lockstep
+                if self._stopping.wait(random.uniform(0, delay)):
+                    return None
+            result = self._post(batch)
+            if result is not None:
+                return result
+        return None
+
+    def _post(self, batch: List[Dict]) -> Optional[bool]:
+        """Post a batch. Returns True/False when done, or None if the request should be retried."""
+        leads = [record["lead"] for record in batch]
+
+        if not self.api_url or not self.api_key:
+            print("CRM credentials not configured - storing lead data locally")
+            for lead in leads:
+                print(f"LEAD DATA: {json.dumps(lead, indent=2)}")
+            return True
+
         headers = {
-            "Authorization": f"Bearer {crm_api_key}",
+            "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
-        
-        response = requests.post(
-            crm_api_url, 
-            headers=headers,
-            data=json.dumps(clean_lead_data)
-        )
-        
-        if response.status_code == 200:
-            print("Successfully sent lead to CRM")
+        body = leads[0] if self.batch_size == 1 else {"leads": leads}
+
+        import requests
+        start = time.perf_counter()
+        try:
+            response = self.http.post(self.api_url, headers=headers, data=json.dumps(body), timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"Error sending lead to CRM: {str(e)}")
+            return None
+        finally:
+            with self._metrics_lock:
+                self._metrics["requests"] += 1
+                self._metrics["request_latency_total"] += time.perf_counter() - start
+
+        if 200 <= response.status_code < 300:
             return True
-        else:
-            print(f"Error sending lead to CRM: {response.status_code}")
-            return False
-            
-    except Exception as e:
-        print(f"Exception: {str(e)}")
+        print(f"Error sending lead to CRM: {response.status_code}")
+        if response.status_code in RETRY_STATUS_CODES:
+            return None
         return False
 
+
+# Lock files held for the life of the process, one per claimed spool slot
+_slot_locks = []
+
+
+def worker_spool_path(spool_path: str) -> str:
+    """
+    Return a spool path of its own for this process: <name>.<n>.jsonl for the
+    lowest slot n not held by another process.
+
+    Worker processes of the API server must not share a spool, since starting
+    a pipeline rewrites it. Slots are claimed with an exclusive file lock, so a
+    restarted worker takes over (and replays) the spool of the one it replaces.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        # No advisory locks on this platform; fall back to a spool per process id
+        root, ext = os.path.splitext(spool_path)
+        return f"{root}.{os.getpid()}{ext}"
+
+    root, ext = os.path.splitext(spool_path)
+    directory = os.path.dirname(spool_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    slot = 0
+    while True:
+        lock_file = open(f"{root}.{slot}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            slot += 1
+            continue
+        _slot_locks.append(lock_file)
+        return f"{root}.{slot}{ext}"
+
+
+# Process-wide pipeline, started on first use
+_pipeline: Optional[LeadDeliveryPipeline] = None
+_pipeline_lock = threading.Lock()
+
+
+def get_lead_pipeline() -> LeadDeliveryPipeline:
+    """
+    Return the process-wide lead delivery pipeline, starting it on first use.
+
+    With CRM_SPOOL_PER_WORKER set, each process gets its own spool (see worker_spool_path).
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            load_environment()
+            spool_path = os.getenv("CRM_SPOOL_PATH", DEFAULT_SPOOL_PATH)
+            if os.getenv("CRM_SPOOL_PER_WORKER"):
+                spool_path = worker_spool_path(spool_path)
+            _pipeline = LeadDeliveryPipeline(
+                spool_path=spool_path,
+                batch_size=int(os.getenv("CRM_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+            ).start()
+    return _pipeline
+
+
 def notify_sales_team(lead_data: Dict[str, Optional[str]], salesperson_id: str = None) -> bool:
     """
     Notify the sales team about a new lead.
@@ -0,0 +1,167 @@
+"""
+Deadline Utility
+Per-turn latency deadline, and a circuit breaker that stops sending turns to a failing model.
+
+A turn runs under a deadline (TURN_DEADLINE_SECONDS from its start). The
+deadline is a ContextVar, so it reaches every model call the run makes:
+retries and hedged requests that could not finish before it are not started.
+When the deadline passes, or the model fails, the turn is answered in
+degraded mode from the local handlers instead. The circuit breaker counts
+consecutive failed turns; once it opens, turns skip the model entirely until
+a probe turn, let through after a cool-down, succeeds again.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+from src.utils.telemetry import Telemetry, get_telemetry
+
+# Seconds a turn may take before it is answered in degraded mode
+DEFAULT_TURN_DEADLINE = 20.0
+
+# Consecutive failed turns that open the circuit, and seconds it stays open before a probe turn
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT = 30.0
+
+# Circuit states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# time.monotonic() at which the current turn's deadline passes, or None without a deadline
+current_deadline: ContextVar[Optional[float]] = ContextVar("current_deadline", default=None)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline (never negative), or None without a deadline."""
+    expires = current_deadline.get()
+    if expires is None:
+        return None
+    return max(0.0, expires - time.monotonic())
+
+
+def within_deadline(seconds: float) -> bool:
+    """Whether something that takes `seconds` can finish before the current deadline."""
+    left = remaining()
+    return left is None or seconds < left
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Run the block under a deadline `seconds` from now, and yield when it passes.
+
+    A block already under an earlier deadline keeps that one; None sets no deadline.
+    """
+    expires = current_deadline.get()
+    if seconds is not None:
+        expires = min(expires, time.monotonic() + seconds) if expires is not None else time.monotonic() + seconds
+    token = current_deadline.set(expires)
+    try:
+        yield expires
+    finally:
+        current_deadline.reset(token)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for model turns. Thread-safe.
+
+    Closed: every turn may call the model. Open, after `failure_threshold`
+    consecutive failures: no turn may, for `reset_timeout` seconds. Half-open:
+    one probe turn may; it closes the circuit if it succeeds and reopens it if
+    it fails. A probe that never reports back is replaced after another
+    `reset_timeout`.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+        reset_timeout: float = DEFAULT_RESET_TIMEOUT,
+        telemetry: Optional[Telemetry] = None,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._telemetry = telemetry
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._changed = time.monotonic()
+        self._opened = 0
+        self._rejected = 0
+
+    @property
+    def telemetry(self) -> Telemetry:
+        return self._telemetry or get_telemetry()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a turn may call the model now. A turn that may must report back with record_success or record_failure."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if time.monotonic() - self._changed >= self.reset_timeout:
+                # Let one probe turn through
+                self._state = HALF_OPEN
+                self._changed = time.monotonic()
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            if self._state != CLOSED:
+                self._state = CLOSED
+                self._changed = time.monotonic()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            opened = self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold)
+            if opened:
+                self._state = OPEN
+                self._changed = time.monotonic()
+                self._opened += 1
+        if opened:
+            self.telemetry.increment("circuit_opened_total")
+
+    def stats(self) -> Dict[str, Any]:
+        """State, consecutive failures, times opened and turns kept off the model."""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "opened": self._opened,
+                "rejected": self._rejected,
+            }
+
+
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """
+    Return the process-wide circuit breaker, creating it on first use.
+
+    CIRCUIT_FAILURE_THRESHOLD sets the consecutive failed turns that open it,
+    and CIRCUIT_RESET_SECONDS how long it stays open before a probe turn.
+    """
+    global _breaker
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", DEFAULT_FAILURE_THRESHOLD)),
+                reset_timeout=float(os.getenv("CIRCUIT_RESET_SECONDS", DEFAULT_RESET_TIMEOUT)),
+            )
+    return _breaker
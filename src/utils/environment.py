@@ -0,0 +1,13 @@
+"""
+Environment Utility
+Loads the .env file on first use instead of on import.
+"""
+
+import functools
+
+
+@functools.lru_cache(maxsize=None)
+def load_environment():
+    """Load .env into the environment, once per process; variables already set are kept."""
+    from dotenv import load_dotenv
+    load_dotenv()
@@ -0,0 +1,162 @@
+"""
+Hedged Requests Utility
+Sends a second, hedged request when a model call runs longer than usual, and uses whichever answers first.
+
+A few model calls take many times longer than the rest. Once a model has a
+baseline of recent call latencies, a call still unanswered at their 95th
+percentile is sent again, and the first successful response is used; the
+slower request is cancelled. So only about one call in twenty costs a second
+request, and a stalled request no longer sets the turn's latency. No hedge
+is sent when the turn's deadline would pass before it could answer. Streamed
+calls are not hedged, since their events are already on their way to the
+customer.
+
+Behind admission control, hedging runs inside the admitted call: the delay
+counts from admission, not from joining the queue, and no hedge is sent while
+other calls are waiting for admission, since the model is then saturated and
+a hedge would only add to its load.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, List, Optional, Union
+
+from agents.items import ModelResponse, TResponseStreamEvent
+from agents.models.interface import Model, ModelTracing
+
+from src.utils.admission import AdmissionController
+from src.utils.deadline import within_deadline
+from src.utils.prompt_cache import get_responses_model
+from src.utils.telemetry import Telemetry, get_telemetry
+
+# Quantile of recent latencies after which a call is hedged
+DEFAULT_HEDGE_QUANTILE = 0.95
+
+# Recent successful calls the latency baseline is drawn from, and the fewest that make one
+DEFAULT_LATENCY_WINDOW = 500
+MIN_LATENCY_SAMPLES = 20
+
+
+class LatencyTracker:
+    """Latencies of a model's recent successful calls. Thread-safe."""
+
+    def __init__(self, window: int = DEFAULT_LATENCY_WINDOW, min_samples: int = MIN_LATENCY_SAMPLES):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """The q-quantile of recent latencies, in seconds, or None until there are enough of them."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class HedgedModel(Model):
+    """
+    Model wrapper that hedges calls slower than the model's recent latency quantile.
+
+    Wrap it in an AdmissionModel for the same `admission` controller; it then
+    holds back hedges while calls are queued for admission.
+    """
+
+    def __init__(
+        self,
+        model: Union[str, Model],
+        quantile: float = DEFAULT_HEDGE_QUANTILE,
+        telemetry: Optional[Telemetry] = None,
+        admission: Optional[AdmissionController] = None,
+    ):
+        self._model = model
+        self.quantile = quantile
+        self.latency = LatencyTracker()
+        self._telemetry = telemetry
+        self.admission = admission
+
+    @property
+    def model(self) -> Model:
+        # Resolve model names lazily so that no API client is needed until the first call;
+        # behind admission control, retries are left to the controller
+        if isinstance(self._model, str):
+            self._model = get_responses_model(self._model, max_retries=0 if self.admission is not None else None)
+        return self._model
+
+    @property
+    def telemetry(self) -> Telemetry:
+        return self._telemetry or get_telemetry()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds after which a call is hedged, or None while there is no latency baseline."""
+        return self.latency.quantile(self.quantile)
+
+    def _saturated(self) -> bool:
+        return self.admission is not None and self.admission.waiting > 0
+
+    async def _call(self, *args) -> ModelResponse:
+        start = time.perf_counter()
+        response = await self.model.get_response(*args)
+        self.latency.record(time.perf_counter() - start)
+        return response
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> ModelResponse:
+        args = (system_instructions, input, model_settings, tools, output_schema, handoffs, tracing)
+        calls: List[asyncio.Task] = [asyncio.ensure_future(self._call(*args))]
+        try:
+            delay = self.hedge_delay()
+            if delay is not None and within_deadline(delay):
+                done, _ = await asyncio.wait(calls, timeout=delay)
+                if not done and not self._saturated():
+                    self.telemetry.increment("model_hedges_total")
+                    calls.append(asyncio.ensure_future(self._call(*args)))
+
+            # The first successful response; a call fails only when every request has
+            error = None
+            pending = set(calls)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for call in sorted(done, key=calls.index):
+                    if call.exception() is None:
+                        if call is not calls[0]:
+                            self.telemetry.increment("model_hedge_wins_total")
+                        return call.result()
+                    error = error or call.exception()
+            raise error
+        finally:
+            for call in calls:
+                if not call.done():
+                    call.cancel()
+                elif not call.cancelled():
+                    # Mark a losing request's error as seen
+                    call.exception()
+
+    async def stream_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        async for event in self.model.stream_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+        ):
+            yield event
@@ -0,0 +1,390 @@
+"""
+Lead Index Utility
+Recognizes returning customers so that each one becomes a single CRM lead.
+
+A lead is identified by its normalized phone number, its email and the
+session that produced it. Identity keys are hashed (no raw contact details
+in the index) and kept in SQLite, where each key points to one lead. An in-memory Bloom filter in front of the table answers "never
+seen" without touching the database, which is the common case for new
+customers. A lead that matches an existing one is merged into it: it is
+posted again (under the same lead_id, for the CRM to upsert) only if the
+merge changed something.
+
+The index lives in a file, so it survives restarts. The Bloom filter is
+saved next to it on close, and rebuilt from the table when that copy is
+missing or out of date. Several processes can share the index file: a
+Bloom filter that missed another process's keys only costs a failed insert
+followed by the usual lookup.
+"""
+
+import atexit
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.modules.lead_extraction import extract_location
+from src.utils.environment import load_environment
+from src.utils.telemetry import get_telemetry
+
+# Index defaults
+DEFAULT_INDEX_PATH = os.path.join("data", "lead_index.db")
+DEFAULT_BLOOM_CAPACITY = 1_000_000  # keys before the Bloom filter is resized
+DEFAULT_BLOOM_ERROR_RATE = 0.01
+
+# Resolution outcomes
+NEW = "new"
+UPDATED = "updated"
+DUPLICATE = "duplicate"
+
+# Bloom filter file: magic, capacity, hash count, bit count, keys added
+_BLOOM_HEADER = struct.Struct("<4sQIQQ")
+_BLOOM_MAGIC = b"PLBF"
+
+_UINT64 = (1 << 64) - 1
+
+# Keys read from the table per batch when the Bloom filter is rebuilt
+REBUILD_BATCH = 100_000
+
+_EMAIL = re.compile(r"^[^@\s]+@[^@\s]+\.[a-z]{2,}$")
+
+# Mail providers that ignore dots and "+tags" in the local part
+_DOTLESS_DOMAINS = {"gmail.com", "googlemail.com"}
+
+
+def normalize_phone(value: Optional[str]) -> Optional[str]:
+    """
+    Indian mobile number in +91XXXXXXXXXX form, or None if it is not one.
+
+    Accepts spaces, dashes and brackets, and the "+91", "91", "0091" and "0"
+    prefixes, e.g. "098765 43210" and "+91-98765-43210" are the same number.
+    """
+    if not value:
+        return None
+    digits = re.sub(r"\D", "", str(value))
+    if digits.startswith("0091"):
+        digits = digits[4:]
+    elif len(digits) == 12 and digits.startswith("91"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("0"):
+        digits = digits[1:]
+    if len(digits) != 10 or digits[0] not in "6789":
+        return None
+    return "+91" + digits
+
+
+def normalize_email(value: Optional[str]) -> Optional[str]:
+    """Lowercased email, with Gmail dots and "+tags" removed, or None if it is not an email."""
+    if not value:
+        return None
+    email = str(value).strip().lower()
+    if not _EMAIL.match(email):
+        return None
+    local, domain = email.rsplit("@", 1)
+    if domain in _DOTLESS_DOMAINS:
+        local = local.split("+", 1)[0].replace(".", "")
+        domain = "gmail.com"
+    return f"{local}@{domain}"
+
+
+def normalize_city(value: Optional[str]) -> Optional[str]:
+    """Canonical city name ("Bombay" -> "Mumbai"), or the value tidied up if the city is not known."""
+    if not value:
+        return None
+    value = " ".join(str(value).split())
+    return extract_location(value, asked=True) or value
+
+
+def normalize_lead(lead_data: Dict[str, Optional[str]]) -> Dict[str, str]:
+    """Lead data without empty values, with contact details and city in canonical form."""
+    lead = {key: value for key, value in lead_data.items() if value}
+    for field, normalize in (("phone", normalize_phone), ("email", normalize_email), ("location", normalize_city)):
+        if field in lead:
+            lead[field] = normalize(lead[field]) or lead[field]
+    return lead
+
+
+def identity_keys(lead: Dict[str, str], session_id: Optional[str] = None) -> List[bytes]:
+    """Hashed identity keys of a normalized lead, strongest first."""
+    names = []
+    phone = normalize_phone(lead.get("phone"))
+    if phone:
+        names.append("phone:" + phone)
+    email = normalize_email(lead.get("email"))
+    if email:
+        names.append("email:" + email)
+    # The session is the weakest key: it ties a later, fuller lead from the same conversation to the first
+    if session_id:
+        names.append("session:" + session_id)
+    return [hashlib.blake2b(name.encode("utf-8"), digest_size=16, person=b"pare-lead").digest() for name in names]
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte hashed keys, with double hashing."""
+
+    def __init__(self, capacity: int = DEFAULT_BLOOM_CAPACITY, error_rate: float = DEFAULT_BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: bytes) -> Iterable[int]:
+        # Keys are already uniform hashes, so two halves give all the hash functions
+        h1, h2 = struct.unpack_from("<QQ", key)
+        h2 |= 1
+        return (((h1 + i * h2) & _UINT64) % self.size for i in range(self.hashes))
+
+    def add(self, key: bytes):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def add_many(self, keys: List[bytes]):
+        """Add many keys at once with NumPy; sets the same bits as add() for each key."""
+        np = _numpy()
+        halves = np.frombuffer(b"".join(keys), dtype="<u8").reshape(-1, 2)
+        h1, h2 = halves[:, 0], halves[:, 1] | np.uint64(1)
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        for i in range(self.hashes):
+            # uint64 arithmetic wraps like the mask in _positions
+            positions = (h1 + np.uint64(i) * h2) % np.uint64(self.size)
+            np.bitwise_or.at(bits, positions >> np.uint64(3), np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+        self.count += len(keys)
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def save(self, path: str):
+        """Write the filter to `path`, replacing it atomically."""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_BLOOM_HEADER.pack(_BLOOM_MAGIC, self.capacity, self.hashes, self.size, self.count))
+            f.write(self.bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BloomFilter"]:
+        """Read a filter written by save(), or None if the file is missing or damaged."""
+        try:
+            with open(path, "rb") as f:
+                magic, capacity, hashes, size, count = _BLOOM_HEADER.unpack(f.read(_BLOOM_HEADER.size))
+                bits = bytearray(f.read())
+        except (OSError, struct.error):
+            return None
+        if magic != _BLOOM_MAGIC or len(bits) != (size + 7) // 8:
+            return None
+        bloom = cls.__new__(cls)
+        bloom.capacity, bloom.hashes, bloom.size, bloom.count, bloom.bits = capacity, hashes, size, count, bits
+        bloom.error_rate = math.exp(-size / capacity * math.log(2) ** 2)
+        return bloom
+
+
+class LeadIndex:
+    """
+    Persistent identity index of the leads sent to the CRM.
+
+    resolve() is called with every completed lead, before delivery, and says
+    whether to post it (new lead, or an update to a known one) or drop it.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_INDEX_PATH,
+        bloom_capacity: int = DEFAULT_BLOOM_CAPACITY,
+        bloom_error_rate: float = DEFAULT_BLOOM_ERROR_RATE,
+    ):
+        self.path = path
+        self.bloom_path = path + ".bloom"
+        self.bloom_error_rate = bloom_error_rate
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leads (
+                lead_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                submissions INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lead_keys (key BLOB PRIMARY KEY, lead_id TEXT NOT NULL) WITHOUT ROWID"
+        )
+        self._lock = threading.Lock()
+
+        self.counts = {NEW: 0, UPDATED: 0, DUPLICATE: 0, "bloom_negatives": 0, "bloom_false_positives": 0}
+
+        keys = self._conn.execute("SELECT COUNT(*) FROM lead_keys").fetchone()[0]
+        bloom = BloomFilter.load(self.bloom_path)
+        if bloom is None or bloom.count != keys or keys > bloom.capacity:
+            bloom = self._build_bloom(max(bloom_capacity, keys * 2))
+        self.bloom = bloom
+
+    def resolve(self, lead_data: Dict[str, Optional[str]], session_id: Optional[str] = None) -> Tuple[str, Optional[Dict[str, str]]]:
+        """
+        Record a completed lead and decide what to send to the CRM.
+
+        Returns (outcome, lead): NEW with the lead to post, UPDATED with the
+        merged lead to post, or DUPLICATE with None when the lead adds nothing
+        to one already sent. Posted leads carry their "lead_id".
+        """
+        lead = normalize_lead(lead_data)
+        keys = identity_keys(lead, session_id)
+        now = time.time()
+
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                outcome, lead, inserted = self._resolve(lead, keys, now)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # The filter counts the keys it was given, so that a saved copy can be checked against the table
+            for key in inserted:
+                self._add_key(key)
+            self.counts[outcome] += 1
+        get_telemetry().increment("crm_lead_resolutions_total", outcome=outcome)
+        return outcome, (lead if outcome != DUPLICATE else None)
+
+    def _add_key(self, key: bytes):
+        # Doubling when full keeps the false positive rate at the configured level
+        if self.bloom.count >= self.bloom.capacity:
+            self.bloom = self._build_bloom(self.bloom.capacity * 2)
+        self.bloom.add(key)
+
+    def contains(self, lead_data: Dict[str, Optional[str]], session_id: Optional[str] = None) -> bool:
+        """Whether a lead matches one already in the index."""
+        keys = identity_keys(normalize_lead(lead_data), session_id)
+        with self._lock:
+            return self._lookup(keys) is not None
+
+    def stats(self) -> Dict:
+        """Return lead and key counts, resolution outcomes and Bloom filter hit counts."""
+        with self._lock:
+            leads = self._conn.execute("SELECT COUNT(*) FROM leads").fetchone()[0]
+            return {
+                "leads": leads,
+                "keys": self.bloom.count,
+                "bloom_capacity": self.bloom.capacity,
+                **self.counts,
+            }
+
+    def close(self):
+        """Save the Bloom filter and close the database."""
+        with self._lock:
+            self.bloom.save(self.bloom_path)
+            self._conn.close()
+
+    def _resolve(self, lead: Dict[str, str], keys: List[bytes], now: float) -> Tuple[str, Dict[str, str], List[bytes]]:
+        found = self._lookup(keys)
+        if found is None:
+            lead_id = uuid.uuid4().hex
+            self._conn.execute("SAVEPOINT new_lead")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO lead_keys (key, lead_id) VALUES (?, ?)", [(key, lead_id) for key in keys]
+                )
+            except sqlite3.IntegrityError:
+                # Another process indexed this customer after our Bloom filter was loaded
+                self._conn.execute("ROLLBACK TO new_lead")
+                found = self._lookup(keys, check_bloom=False)
+            self._conn.execute("RELEASE new_lead")
+
+        if found is None:
+            lead = {**lead, "lead_id": lead_id}
+            self._conn.execute(
+                "INSERT INTO leads (lead_id, data, submissions, created_at, updated_at) VALUES (?, ?, 1, ?, ?)",
+                (lead_id, json.dumps(lead, ensure_ascii=False), now, now),
+            )
+            return NEW, lead, keys
+
+        lead_id, data = found
+        existing = json.loads(data)
+        merged = {**existing, **lead, "lead_id": lead_id}
+        # A new phone or email of a known customer points to the same lead from now on
+        inserted = [
+            key for key in keys
+            if self._conn.execute(
+                "INSERT OR IGNORE INTO lead_keys (key, lead_id) VALUES (?, ?)", (key, lead_id)
+            ).rowcount
+        ]
+        if merged == existing:
+            return DUPLICATE, existing, inserted
+        self._conn.execute(
+            "UPDATE leads SET data = ?, submissions = submissions + 1, updated_at = ? WHERE lead_id = ?",
+            (json.dumps(merged, ensure_ascii=False), now, lead_id),
+        )
+        return UPDATED, merged, inserted
+
+    def _lookup(self, keys: List[bytes], check_bloom: bool = True) -> Optional[Tuple[str, str]]:
+        """(lead_id, data) of the lead matching the strongest key, or None."""
+        if check_bloom:
+            keys = [key for key in keys if key in self.bloom]
+            if not keys:
+                self.counts["bloom_negatives"] += 1
+                return None
+        for key in keys:
+            row = self._conn.execute(
+                "SELECT leads.lead_id, leads.data FROM lead_keys JOIN leads USING (lead_id) WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                return row
+        if check_bloom:
+            self.counts["bloom_false_positives"] += 1
+        return None
+
+    def _build_bloom(self, capacity: int) -> BloomFilter:
+        bloom = BloomFilter(capacity, self.bloom_error_rate)
+        cursor = self._conn.execute("SELECT key FROM lead_keys")
+        while True:
+            rows = cursor.fetchmany(REBUILD_BATCH)
+            if not rows:
+                return bloom
+            bloom.add_many([key for (key,) in rows])
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("Rebuilding the lead index requires numpy: pip install numpy")
+    return numpy
+
+
+# Process-wide index, opened on first use
+_index: Optional[LeadIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_lead_index() -> LeadIndex:
+    """
+    Return the process-wide lead index, stored at LEAD_INDEX_PATH (default data/lead_index.db).
+
+    It is closed at exit, which saves its Bloom filter for the next start.
+    """
+    global _index
+    with _index_lock:
+        if _index is None:
+            load_environment()
+            _index = LeadIndex(os.getenv("LEAD_INDEX_PATH", DEFAULT_INDEX_PATH))
+            atexit.register(_index.close)
+    return _index
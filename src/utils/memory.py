@@ -0,0 +1,161 @@
+"""
+Conversation Memory Utility
+Keeps the prompt size of long conversations bounded.
+
+Recent messages are kept verbatim; older messages are folded into a short
+running summary. Known lead details are rendered as structured facts, so they
+survive even after the messages that mentioned them have been summarized.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Default memory limits
+DEFAULT_KEEP_TURNS = 4  # user/assistant exchanges kept verbatim
+DEFAULT_TOKEN_BUDGET = 800  # tokens for the whole rendered memory block
+
+# Length limits for a folded (summarized) message
+SUMMARY_USER_CHARS = 150
+SUMMARY_ASSISTANT_CHARS = 100
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_END = re.compile(r"(?<=[.!?।])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of model tokens in a piece of text.
+
+    Uses a local approximation of BPE tokenization: every punctuation mark is a
+    token and words are split into pieces of about four characters.
+    """
+    if not text:
+        return 0
+    # ceil(len / 4) for every piece; pieces are never empty, so each counts at least once
+    return sum((len(piece) + 3) >> 2 for piece in _TOKEN_PATTERN.findall(text))
+
+
+def _shorten(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= limit:
+        return text
+    return text[:limit - 3].rstrip() + "..."
+
+
+def _first_sentence(text: str) -> str:
+    return _SENTENCE_END.split(" ".join(text.split()), maxsplit=1)[0]
+
+
+class ConversationMemory:
+    """Token-budgeted memory for a single conversation."""
+
+    def __init__(self, keep_turns: int = DEFAULT_KEEP_TURNS, token_budget: int = DEFAULT_TOKEN_BUDGET):
+        self.keep_turns = keep_turns
+        self.token_budget = token_budget
+
+        # Messages kept verbatim, oldest first
+        self.recent: List[Dict[str, str]] = []
+
+        # One summary line per folded message, oldest first
+        self.summary_lines: List[str] = []
+
+    def add_message(self, role: str, content: str):
+        """
+        Add a message and fold the oldest ones into the summary when over the turn limit.
+
+        Half of the verbatim messages are folded at once rather than one per
+        turn, so the start of the history stays the same for the next few turns
+        and remains a cacheable prompt prefix.
+        """
+        self.recent.append({"role": role, "content": content})
+        if len(self.recent) > self.keep_turns * 2:
+            while len(self.recent) > self.keep_turns:
+                self._fold_oldest()
+
+    def render(self, lead_data: Optional[Dict[str, Optional[str]]] = None) -> Tuple[str, int]:
+        """
+        Render the memory block for the prompt.
+
+        Returns the text and its estimated token count. If the block is over the
+        token budget, the oldest summary lines are dropped first, then the
+        oldest verbatim messages are folded into the summary.
+        """
+        while True:
+            text = self._render_text(lead_data)
+            tokens = estimate_tokens(text)
+            if tokens <= self.token_budget:
+                return text, tokens
+            if self.summary_lines:
+                self.summary_lines.pop(0)
+            elif self.recent:
+                self._fold_oldest()
+            else:
+                return text, tokens
+
+    def render_items(self, lead_data: Optional[Dict[str, Optional[str]]] = None) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Render the memory as model input items, for use before the new user message.
+
+        Recent messages become user/assistant items in order, so the input grows
+        by appending and earlier turns stay a stable prefix. The summary and known
+        lead details, which change from turn to turn, follow as one developer
+        note at the end. The same token budget as render() applies.
+        """
+        while True:
+            items = [{"role": m["role"], "content": m["content"]} for m in self.recent]
+            context = self._render_context(lead_data)
+            if context:
+                items.append({"role": "developer", "content": context})
+            tokens = sum(estimate_tokens(item["content"]) for item in items)
+            if tokens <= self.token_budget:
+                return items, tokens
+            if self.summary_lines:
+                self.summary_lines.pop(0)
+            elif self.recent:
+                self._fold_oldest()
+            else:
+                return items, tokens
+
+    @property
+    def summary(self) -> str:
+        return "\n".join(self.summary_lines)
+
+    def to_dict(self) -> Dict:
+        """Return the memory contents as a JSON-serializable dict."""
+        return {"recent": list(self.recent), "summary_lines": list(self.summary_lines)}
+
+    def load_dict(self, data: Dict):
+        """Restore memory contents saved with to_dict."""
+        self.recent = list(data.get("recent", []))
+        self.summary_lines = list(data.get("summary_lines", []))
+
+    def _fold_oldest(self):
+        message = self.recent.pop(0)
+        if message["role"] == "user":
+            line = f"- Customer: {_shorten(message['content'], SUMMARY_USER_CHARS)}"
+        else:
+            line = f"- Assistant: {_shorten(_first_sentence(message['content']), SUMMARY_ASSISTANT_CHARS)}"
+        self.summary_lines.append(line)
+
+    def _render_context(self, lead_data: Optional[Dict[str, Optional[str]]]) -> str:
+        sections = []
+
+        if self.summary_lines:
+            sections.append("Summary of earlier conversation:\n" + self.summary)
+
+        known = {k: v for k, v in (lead_data or {}).items() if v}
+        if known:
+            facts = "\n".join(f"- {k}: {v}" for k, v in known.items())
+            sections.append("Known lead details:\n" + facts)
+
+        return "\n\n".join(sections)
+
+    def _render_text(self, lead_data: Optional[Dict[str, Optional[str]]]) -> str:
+        context = self._render_context(lead_data)
+        sections = [context] if context else []
+
+        if self.recent:
+            messages = "\n".join(f"{m['role']}: {m['content']}" for m in self.recent)
+            sections.append("Recent messages:\n" + messages)
+
+        return "\n\n".join(sections) if sections else "(new conversation)"
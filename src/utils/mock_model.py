@@ -0,0 +1,302 @@
+"""
+Mock Model Utility
+Scriptable stand-in for the OpenAI model, so the agent can run without an API key.
+
+A MockModel answers each model call with a step: a text reply, a tool call,
+or a list of both. Steps come from a fixed script, consumed in order, or from
+a responder function that looks at the call's input; an exception step is
+raised instead, to simulate API errors. Each call waits for a configurable
+latency, so benchmarks and load tests see realistic timings.
+Prompt caching is simulated too: the longest prefix a call shares with a
+recent prompt counts as cached input, under the provider's caching rules.
+"""
+
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import threading
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Union
+
+from agents.items import ModelResponse, TResponseInputItem, TResponseStreamEvent
+from agents.models.interface import Model, ModelTracing
+from agents.usage import Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseFunctionToolCall,
+    ResponseOutputMessage,
+    ResponseOutputText,
+    ResponseTextDeltaEvent,
+    ResponseUsage,
+)
+
+from src.utils.memory import estimate_tokens
+from src.utils.prompt_cache import CACHE_BLOCK_TOKENS, CACHE_MIN_TOKENS, record_cached_tokens
+
+# A step is a text reply, a tool call (see tool_call), or a list of them; an exception
+# step is raised instead, to simulate API errors such as rate limits
+Step = Union[str, Dict[str, Any], List[Union[str, Dict[str, Any]]], Exception]
+
+DEFAULT_REPLY = "Thank you for your message. How else can I help you?"
+
+# Characters per streamed text delta
+DEFAULT_CHUNK_SIZE = 8
+
+# Recent prompts kept for simulated prompt cache hits, and the prefix granularity in characters
+PROMPT_CACHE_SIZE = 64
+PROMPT_CACHE_BLOCK_CHARS = 256
+
+
+def tool_call(name: str, **arguments: Any) -> Dict[str, Any]:
+    """Return a step that calls the tool `name` with `arguments`."""
+    return {"tool": name, "arguments": arguments}
+
+
+def _get(item: Any, key: str) -> Any:
+    if isinstance(item, dict):
+        return item.get(key)
+    return getattr(item, key, None)
+
+
+def ends_with_tool_output(input: Union[str, List[TResponseInputItem]]) -> bool:
+    """True if the call follows a tool call, i.e. the model is asked to answer from tool results."""
+    return not isinstance(input, str) and bool(input) and _get(input[-1], "type") == "function_call_output"
+
+
+def default_responder(input: Union[str, List[TResponseInputItem]]) -> Step:
+    """Reply with a fixed text to every call."""
+    return DEFAULT_REPLY
+
+
+def lognormal_latency(median: float, p95: float) -> Callable[[], float]:
+    """
+    Return a latency function drawing from a log-normal distribution with the
+    given median and 95th percentile, in seconds; model latencies have a long right tail.
+    """
+    sigma = math.log(p95 / median) / 1.645 if p95 > median > 0 else 0.0
+    mu = math.log(median) if median > 0 else 0.0
+    return lambda: random.lognormvariate(mu, sigma) if median > 0 else 0.0
+
+
+def _latest_user_text(input: Union[str, List[TResponseInputItem]]) -> str:
+    if isinstance(input, str):
+        return input
+    for item in reversed(input):
+        if _get(item, "role") == "user":
+            return str(_get(item, "content") or "")
+    return ""
+
+
+_CITIES = re.compile(r"\b(pune|mumbai|delhi|bangalore|bengaluru|chennai|hyderabad|kolkata|ahmedabad|jaipur)\b", re.IGNORECASE)
+_QUANTITY = re.compile(r"\b(\d[\d,]*)\s*(sq|square)", re.IGNORECASE)
+_CATEGORY = re.compile(r"\b(wall|ceiling|facade)s?\b", re.IGNORECASE)
+
+
+def funnel_responder(input: Union[str, List[TResponseInputItem]]) -> Step:
+    """
+    Answer like the real model does on the lead funnel, by calling the tool
+    that fits the latest customer message (company, product, pricing, lead
+    fields, callback), or with a short text reply.
+    """
+    if ends_with_tool_output(input):
+        return "Here is what I found. Would you like me to arrange a callback with our team?"
+    text = _latest_user_text(input).lower()
+    if "callback" in text or "call back" in text or "call me" in text:
+        return tool_call("tool_support_request", request_type="callback")
+    if "site visit" in text:
+        return tool_call("tool_support_request", request_type="site_visit")
+    city = _CITIES.search(text)
+    if city:
+        return tool_call("tool_lead_capture", field="location", value=city.group(1).title())
+    if "residential" in text or "commercial" in text:
+        value = "Residential" if "residential" in text else "Commercial"
+        return tool_call("tool_lead_capture", field="requirement_type", value=value)
+    quantity = _QUANTITY.search(text)
+    if quantity:
+        return tool_call("tool_lead_capture", field="quantity", value=quantity.group(1))
+    if any(word in text for word in ("price", "cost", "rate", "budget")):
+        return tool_call("tool_pricing_info")
+    category = _CATEGORY.search(text)
+    if category or "product" in text or "panel" in text:
+        return tool_call(
+            "tool_product_info",
+            product_category=category.group(1).lower() if category else "all",
+            specific_product=None,
+        )
+    if "company" in text or "pare" in text:
+        return tool_call("tool_company_info")
+    return DEFAULT_REPLY
+
+
+class MockModel(Model):
+    """Model that replays scripted steps after a simulated latency."""
+
+    def __init__(
+        self,
+        script: Optional[List[Step]] = None,
+        responder: Optional[Callable[[Union[str, List[TResponseInputItem]]], Step]] = None,
+        latency: Union[float, Callable[[], float]] = 0.0,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        self.script = list(script or [])
+        self.responder = responder or default_responder
+        self.latency = latency
+        self.chunk_size = chunk_size
+
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        # Hashes of each cached prompt's prefixes, at block boundaries
+        self._prompt_prefixes: Deque[List[int]] = deque()
+        self._prefix_counts: Counter = Counter()
+        self.calls = 0
+
+    def next_step(self, input: Union[str, List[TResponseInputItem]]) -> Step:
+        """Return the step for this call: the next scripted step, else the responder's."""
+        with self._lock:
+            self.calls += 1
+            if self.script:
+                return self.script.pop(0)
+        return self.responder(input)
+
+    async def _wait(self):
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _output(self, step: Step) -> List[Any]:
+        steps = step if isinstance(step, list) else [step]
+        output = []
+        for item in steps:
+            item_id = f"mock_{next(self._ids)}"
+            if isinstance(item, str):
+                output.append(
+                    ResponseOutputMessage(
+                        id=item_id,
+                        content=[ResponseOutputText(text=item, type="output_text", annotations=[])],
+                        role="assistant",
+                        status="completed",
+                        type="message",
+                    )
+                )
+            else:
+                output.append(
+                    ResponseFunctionToolCall(
+                        id=item_id,
+                        call_id=f"call_{item_id}",
+                        name=item["tool"],
+                        arguments=json.dumps(item.get("arguments", {})),
+                        type="function_call",
+                        status="completed",
+                    )
+                )
+        return output
+
+    @staticmethod
+    def _prompt_text(system_instructions: Optional[str], input: Union[str, List[TResponseInputItem]]) -> str:
+        if isinstance(input, str):
+            input_text = input
+        else:
+            input_text = " ".join(
+                str(_get(item, "content") or _get(item, "output") or _get(item, "arguments") or "") for item in input
+            )
+        return (system_instructions or "") + " " + input_text
+
+    def _cached_tokens(self, prompt: str) -> int:
+        # Longest block-aligned prefix shared with a recent prompt; cached only from CACHE_MIN_TOKENS, in whole blocks
+        prefixes = [hash(prompt[:end]) for end in range(PROMPT_CACHE_BLOCK_CHARS, len(prompt) + 1, PROMPT_CACHE_BLOCK_CHARS)]
+        with self._lock:
+            shared = 0
+            for prefix in prefixes:
+                if prefix not in self._prefix_counts:
+                    break
+                shared += PROMPT_CACHE_BLOCK_CHARS
+            self._prompt_prefixes.append(prefixes)
+            self._prefix_counts.update(prefixes)
+            if len(self._prompt_prefixes) > PROMPT_CACHE_SIZE:
+                for prefix in self._prompt_prefixes.popleft():
+                    self._prefix_counts[prefix] -= 1
+                    if not self._prefix_counts[prefix]:
+                        del self._prefix_counts[prefix]
+        tokens = estimate_tokens(prompt[:shared])
+        if tokens < CACHE_MIN_TOKENS:
+            return 0
+        return tokens // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+
+    def _usage(self, system_instructions: Optional[str], input: Union[str, List[TResponseInputItem]], output: List[Any]) -> Usage:
+        # Estimate token usage locally so that usage reporting can be exercised offline
+        prompt = self._prompt_text(system_instructions, input)
+        output_text = " ".join(
+            item.content[0].text if isinstance(item, ResponseOutputMessage) else item.arguments for item in output
+        )
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(output_text)
+        record_cached_tokens(min(self._cached_tokens(prompt), input_tokens))
+        return Usage(
+            requests=1,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            total_tokens=input_tokens + output_tokens,
+        )
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> ModelResponse:
+        step = self.next_step(input)
+        await self._wait()
+        if isinstance(step, Exception):
+            raise step
+        output = self._output(step)
+        return ModelResponse(output=output, usage=self._usage(system_instructions, input, output), referenceable_id=None)
+
+    async def stream_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        step = self.next_step(input)
+        await self._wait()
+        if isinstance(step, Exception):
+            raise step
+        output = self._output(step)
+
+        # Stream text replies in small deltas, like the Responses API does
+        for index, item in enumerate(output):
+            if not isinstance(item, ResponseOutputMessage):
+                continue
+            text = item.content[0].text
+            for start in range(0, len(text), self.chunk_size):
+                yield ResponseTextDeltaEvent.model_construct(
+                    content_index=0,
+                    delta=text[start:start + self.chunk_size],
+                    item_id=item.id,
+                    output_index=index,
+                    type="response.output_text.delta",
+                )
+
+        usage = self._usage(system_instructions, input, output)
+        response = Response.model_construct(
+            id=f"mock_response_{next(self._ids)}",
+            output=output,
+            usage=ResponseUsage.model_construct(
+                input_tokens=usage.input_tokens,
+                output_tokens=usage.output_tokens,
+                total_tokens=usage.total_tokens,
+            ),
+        )
+        yield ResponseCompletedEvent.model_construct(type="response.completed", response=response)
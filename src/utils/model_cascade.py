@@ -0,0 +1,341 @@
+"""
+Model Cascade Utility
+Answers each model call with a small, cheap model first and escalates to the large model only when needed.
+
+Most turns ("hi", "ok", "Mumbai") need just a tool call or a one-line reply,
+which a small model handles at a fraction of the cost and latency. The
+cascade sends long or complex messages straight to the large model, and
+retries a small-model answer on the large model when it calls a tool that
+does not exist or with arguments that do not match the tool's schema, or
+when its reply is empty or hedged. Once a turn has escalated, its remaining
+model calls go to the large model as well. When streaming, a small-model
+reply is held back only until its first STREAM_CHECK_CHARS characters show
+it is not hedged, then streamed as it arrives; tool calls, which the
+customer does not see, are checked once complete.
+"""
+
+import json
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from agents.items import ModelResponse, TResponseInputItem, TResponseStreamEvent
+from agents.models.interface import Model, ModelTracing
+from openai.types.responses import ResponseCompletedEvent, ResponseFunctionToolCall, ResponseOutputMessage
+
+from src.utils.memory import estimate_tokens
+from src.utils.prompt_cache import get_responses_model
+from src.utils.sessions import current_session
+from src.utils.telemetry import Telemetry, get_telemetry
+
+# Small model tried first when the cascade is enabled
+DEFAULT_SMALL_MODEL = "gpt-4o-mini"
+
+# USD per million input and output tokens, for per-tier cost estimates
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+# Customer messages longer than this, or with more questions, go straight to the large model
+COMPLEX_INPUT_TOKENS = 80
+COMPLEX_INPUT_QUESTIONS = 2
+
+# Characters of a streamed small-model reply held back to check it for hedges; once shown, it is not escalated
+STREAM_CHECK_CHARS = 80
+
+# Escalation reasons
+COMPLEX_INPUT = "complex_input"
+INVALID_TOOL_CALL = "invalid_tool_call"
+LOW_CONFIDENCE = "low_confidence"
+
+# Replies in which the model says it cannot answer
+_UNSURE = re.compile(
+    r"\b(i'?m not sure|i am not sure|not certain|i don'?t know|i do not know|"
+    r"can'?t help|cannot help|unable to (help|answer)|could you (please )?clarify)\b",
+    re.IGNORECASE,
+)
+
+_JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "null": type(None),
+    "array": list,
+    "object": dict,
+}
+
+
+class ModelTier(NamedTuple):
+    """A model in the cascade, with its prices in USD per million input and output tokens."""
+
+    name: str
+    model: Union[str, Model]
+    input_price: float = 0.0
+    output_price: float = 0.0
+
+
+def model_tier(name: str, model: Union[str, Model]) -> ModelTier:
+    """Return a tier for a model, priced from MODEL_PRICES when the model is given by name."""
+    input_price, output_price = MODEL_PRICES.get(model, (0.0, 0.0)) if isinstance(model, str) else (0.0, 0.0)
+    return ModelTier(name, model, input_price, output_price)
+
+
+def _get(item: Any, key: str) -> Any:
+    if isinstance(item, dict):
+        return item.get(key)
+    return getattr(item, key, None)
+
+
+def _matches_type(value: Any, schema: Dict) -> bool:
+    if "anyOf" in schema:
+        return any(_matches_type(value, option) for option in schema["anyOf"])
+    types = schema.get("type")
+    if types is None:
+        return True
+    for name in types if isinstance(types, list) else [types]:
+        expected = _JSON_TYPES.get(name)
+        # bool is a subclass of int, but not a JSON integer or number
+        if expected is not None and isinstance(value, expected) and not (isinstance(value, bool) and name != "boolean"):
+            return True
+    return False
+
+
+def validate_arguments(schema: Dict, arguments: str) -> Optional[str]:
+    """Check a tool call's JSON arguments against the tool's parameter schema. Returns the problem, or None."""
+    try:
+        values = json.loads(arguments or "{}")
+    except json.JSONDecodeError as e:
+        return f"arguments are not valid JSON: {e}"
+    if not isinstance(values, dict):
+        return "arguments are not an object"
+
+    properties = schema.get("properties", {})
+    for name in schema.get("required", []):
+        if name not in values:
+            return f"missing argument {name}"
+    for name, value in values.items():
+        if name not in properties:
+            if schema.get("additionalProperties") is False:
+                return f"unknown argument {name}"
+            continue
+        if not _matches_type(value, properties[name]):
+            return f"argument {name} has the wrong type"
+    return None
+
+
+def latest_user_message(input: Union[str, List[TResponseInputItem]]) -> str:
+    """Text of the last customer message in a model input."""
+    if isinstance(input, str):
+        return input
+    for item in reversed(input):
+        if _get(item, "role") == "user":
+            content = _get(item, "content")
+            return content if isinstance(content, str) else ""
+    return ""
+
+
+def is_complex(message: str) -> bool:
+    """True if a customer message is long or asks several questions at once."""
+    return estimate_tokens(message) > COMPLEX_INPUT_TOKENS or message.count("?") >= COMPLEX_INPUT_QUESTIONS
+
+
+def check_output(output: List[Any], tools: List[Any]) -> Optional[str]:
+    """Return the reason to escalate a model's output, or None if it can be used."""
+    schemas = {tool.name: getattr(tool, "params_json_schema", {}) for tool in tools}
+    text = ""
+    has_tool_call = False
+    for item in output:
+        if isinstance(item, ResponseFunctionToolCall):
+            has_tool_call = True
+            if item.name not in schemas or validate_arguments(schemas[item.name], item.arguments):
+                return INVALID_TOOL_CALL
+        elif isinstance(item, ResponseOutputMessage):
+            text += "".join(getattr(part, "text", "") for part in item.content)
+    if not has_tool_call and (not text.strip() or _UNSURE.search(text)):
+        return LOW_CONFIDENCE
+    return None
+
+
+class _TierStats:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+
+
+class CascadeModel(Model):
+    """Model that tries a small model first and escalates to a large one."""
+
+    def __init__(self, small: ModelTier, large: ModelTier, telemetry: Optional[Telemetry] = None):
+        self.tiers = {small.name: small, large.name: large}
+        self.small = small.name
+        self.large = large.name
+        self._models: Dict[str, Model] = {}
+        self._telemetry = telemetry
+
+        self._lock = threading.Lock()
+        self._stats = {name: _TierStats() for name in self.tiers}
+        self._escalations: Dict[str, int] = {}
+        self._routed = 0
+
+    @property
+    def telemetry(self) -> Telemetry:
+        return self._telemetry or get_telemetry()
+
+    def model(self, tier: str) -> Model:
+        # Resolve model names lazily so that no API client is needed until the first call
+        model = self._models.get(tier)
+        if model is None:
+            model = self.tiers[tier].model
+            if isinstance(model, str):
+                model = get_responses_model(model)
+            self._models[tier] = model
+        return model
+
+    def first_tier(self, input: Union[str, List[TResponseInputItem]]) -> str:
+        """The tier to try first for a call."""
+        session = current_session.get()
+        if session is not None and session.model_tier == self.large:
+            return self.large
+        if is_complex(latest_user_message(input)):
+            self._record_escalation(COMPLEX_INPUT)
+            return self.large
+        return self.small
+
+    def _record_escalation(self, reason: str):
+        with self._lock:
+            self._escalations[reason] = self._escalations.get(reason, 0) + 1
+        self.telemetry.increment("model_escalations_total", reason=reason)
+
+    def _record_call(self, tier: str, seconds: float, input_tokens: int, output_tokens: int):
+        prices = self.tiers[tier]
+        cost = (input_tokens * prices.input_price + output_tokens * prices.output_price) / 1_000_000
+        with self._lock:
+            stats = self._stats[tier]
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.input_tokens += input_tokens
+            stats.output_tokens += output_tokens
+            stats.cost += cost
+        self.telemetry.observe("model_tier_seconds", seconds, tier=tier)
+        self.telemetry.increment("model_tier_calls_total", tier=tier)
+        self.telemetry.increment("model_cost_usd_total", cost, tier=tier)
+
+        session = current_session.get()
+        if session is not None:
+            session.model_tier = tier
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> ModelResponse:
+        with self._lock:
+            self._routed += 1
+        tier = self.first_tier(input)
+        while True:
+            start = time.perf_counter()
+            response = await self.model(tier).get_response(
+                system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+            )
+            self._record_call(tier, time.perf_counter() - start, response.usage.input_tokens, response.usage.output_tokens)
+            reason = check_output(response.output, tools) if tier == self.small else None
+            if reason is None:
+                return response
+            self._record_escalation(reason)
+            tier = self.large
+
+    async def stream_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        with self._lock:
+            self._routed += 1
+        tier = self.first_tier(input)
+        if tier == self.small:
+            start = time.perf_counter()
+            held: List[Any] = []
+            text = ""
+            live = False
+            usage = (0, 0)
+            output: List[Any] = []
+            async for event in self.model(tier).stream_response(
+                system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+            ):
+                if isinstance(event, ResponseCompletedEvent):
+                    usage = self._stream_usage(event)
+                    output = list(event.response.output or [])
+                if live:
+                    yield event
+                    continue
+                held.append(event)
+                if event.type == "response.output_text.delta":
+                    text += event.delta
+                    if len(text) >= STREAM_CHECK_CHARS and not _UNSURE.search(text):
+                        # Not a hedge: show the reply so far, and the rest as it arrives
+                        live = True
+                        for held_event in held:
+                            yield held_event
+                        held = []
+            self._record_call(tier, time.perf_counter() - start, *usage)
+            reason = None if live else check_output(output, tools)
+            if reason is None:
+                for held_event in held:
+                    yield held_event
+                return
+            self._record_escalation(reason)
+            tier = self.large
+
+        start = time.perf_counter()
+        usage = (0, 0)
+        async for event in self.model(tier).stream_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+        ):
+            if isinstance(event, ResponseCompletedEvent):
+                usage = self._stream_usage(event)
+            yield event
+        self._record_call(tier, time.perf_counter() - start, *usage)
+
+    @staticmethod
+    def _stream_usage(event: ResponseCompletedEvent) -> Tuple[int, int]:
+        usage = event.response.usage
+        if usage is None:
+            return 0, 0
+        return usage.input_tokens or 0, usage.output_tokens or 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-tier calls, mean latency, tokens and cost, and escalations by reason."""
+        with self._lock:
+            tiers = {
+                name: {
+                    "calls": stats.calls,
+                    "mean_latency_ms": round(stats.seconds / stats.calls * 1000, 3) if stats.calls else 0.0,
+                    "input_tokens": stats.input_tokens,
+                    "output_tokens": stats.output_tokens,
+                    "cost_usd": round(stats.cost, 6),
+                }
+                for name, stats in self._stats.items()
+            }
+            escalations = dict(self._escalations)
+            routed = self._routed
+        return {
+            "tiers": tiers,
+            "escalations": escalations,
+            "escalation_rate": round(sum(escalations.values()) / routed, 3) if routed else 0.0,
+        }
@@ -0,0 +1,70 @@
+"""
+Prompt Cache Utility
+Measures how many input tokens of each model call were served from the provider's prompt cache.
+
+OpenAI caches the longest previously seen prompt prefix (instructions, tools,
+then input items) once it is at least 1024 tokens long, and reports the
+cached part in usage.input_tokens_details. The Agents SDK drops those details
+from its Usage, so CacheUsageResponsesModel reads them from the raw response
+and adds them to the current session's turn.
+"""
+
+from typing import Any, AsyncIterator, Optional
+
+from agents.models.interface import Model
+from agents.models.openai_chatcompletions import OpenAIChatCompletionsModel
+from agents.models.openai_provider import OpenAIProvider
+from agents.models.openai_responses import OpenAIResponsesModel
+from openai.types.responses import ResponseCompletedEvent
+
+from src.utils.sessions import current_session
+
+# Prefix length from which the provider caches prompts, and the granularity of cache hits
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+
+
+def cached_tokens(usage: Any) -> int:
+    """Cached input tokens reported in a Responses API usage object (0 if not reported)."""
+    details = getattr(usage, "input_tokens_details", None)
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+def record_cached_tokens(tokens: int):
+    """Add cached input tokens to the turn of the session currently running."""
+    session = current_session.get()
+    if session is not None:
+        session.cached_input_tokens += tokens
+
+
+class CacheUsageResponsesModel(OpenAIResponsesModel):
+    """Responses API model that records the cached input tokens of every call."""
+
+    async def _fetch_response(self, *args, stream=False, **kwargs):
+        response = await super()._fetch_response(*args, stream=stream, **kwargs)
+        if stream:
+            return self._observe_stream(response)
+        record_cached_tokens(cached_tokens(response.usage))
+        return response
+
+    @staticmethod
+    async def _observe_stream(stream) -> AsyncIterator[Any]:
+        async for event in stream:
+            if isinstance(event, ResponseCompletedEvent):
+                record_cached_tokens(cached_tokens(event.response.usage))
+            yield event
+
+
+def get_responses_model(model_name: str, max_retries: Optional[int] = None) -> Model:
+    """
+    Return the provider's model for `model_name`, measuring prompt cache hits when it uses the Responses API.
+
+    `max_retries` overrides the API client's own retries of failed requests.
+    """
+    model = OpenAIProvider().get_model(model_name)
+    if isinstance(model, OpenAIResponsesModel):
+        client = model._client if max_retries is None else model._client.with_options(max_retries=max_retries)
+        return CacheUsageResponsesModel(model=model.model, openai_client=client)
+    if isinstance(model, OpenAIChatCompletionsModel) and max_retries is not None:
+        return OpenAIChatCompletionsModel(model=model.model, openai_client=model._client.with_options(max_retries=max_retries))
+    return model
@@ -0,0 +1,311 @@
+"""
+Session Store Utility
+Persists conversation state so it survives restarts and redeploys.
+
+Sessions are saved as plain dicts (see SessionState.to_dict). The SQLite
+backend uses write-behind: save() only records the latest state in memory,
+and a background thread writes pending sessions in batched transactions, so
+persistence never sits on a chat turn's critical path. With a flush interval
+of 0 it writes through instead, for processes that share the database.
+
+A saved session may carry a "version": the version it was loaded at plus one.
+Write-through saves are then compare-and-set, and a save whose session was
+saved by another process in the meantime raises SessionConflict instead of
+overwriting it.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Write-behind defaults
+DEFAULT_FLUSH_INTERVAL = 1.0  # seconds between background flushes
+DEFAULT_FLUSH_BATCH = 500  # pending sessions that trigger an early flush
+
+
+class SessionConflict(Exception):
+    """A session was saved by someone else since it was loaded."""
+
+
+def _check_version(session_id: str, current: int, data: Dict):
+    # A save without a version is unconditional
+    if "version" in data and data["version"] != current + 1:
+        raise SessionConflict(f"Session {session_id} is at version {current}, not {data['version'] - 1}")
+
+
+def lead_completeness(data: Dict) -> int:
+    """Number of lead fields captured in a saved session."""
+    return sum(1 for value in (data.get("lead_data") or {}).values() if value)
+
+
+class SessionStore:
+    """Interface for session store backends."""
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        """Return the saved state for a session, or None."""
+        raise NotImplementedError
+
+    def save(self, session_id: str, data: Dict):
+        """Save the state of a session; raises SessionConflict if data["version"] is not the next version."""
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        """Remove a session."""
+        raise NotImplementedError
+
+    def find_by_completeness(self, min_fields: int, limit: int = 100) -> List[str]:
+        """Return ids of sessions with at least `min_fields` lead fields captured."""
+        raise NotImplementedError
+
+    def count(self) -> int:
+        """Return the number of stored sessions."""
+        raise NotImplementedError
+
+    def flush(self):
+        """Write any pending changes."""
+
+    def close(self):
+        """Flush and release resources."""
+        self.flush()
+
+
+class InMemorySessionStore(SessionStore):
+    """Session store kept in process memory; useful for tests and single-process demos."""
+
+    def __init__(self):
+        self._sessions: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def save(self, session_id: str, data: Dict):
+        with self._lock:
+            _check_version(session_id, self._sessions.get(session_id, {}).get("version", 0), data)
+            self._sessions[session_id] = data
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def find_by_completeness(self, min_fields: int, limit: int = 100) -> List[str]:
+        with self._lock:
+            matches = [sid for sid, data in self._sessions.items() if lead_completeness(data) >= min_fields]
+        return matches[:limit]
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite session store with write-behind batching.
+
+    Sessions are indexed by id (primary key) and by lead completeness. Pending
+    writes are coalesced per session, so a burst of turns results in one row
+    write, and loads see pending writes before they reach the database.
+
+    A flush_interval of 0 disables write-behind: every save and delete is
+    committed before it returns, so other processes see it on their next load,
+    and a versioned save commits only if the row is still at the version before
+    it. Write-behind saves are unconditional, since only one process writes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        flush_batch: int = DEFAULT_FLUSH_BATCH,
+    ):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                lead_completeness INTEGER NOT NULL,
+                updated_at REAL NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        # Databases created before sessions were versioned
+        columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+        if "version" not in columns:
+            self._conn.execute("ALTER TABLE sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sessions_completeness ON sessions (lead_completeness, updated_at)"
+        )
+        self._db_lock = threading.Lock()
+
+        # Latest unsaved state per session; None marks a pending delete. Entries stay until
+        # their write has committed, so loads see them throughout
+        self._pending: Dict[str, Optional[Dict]] = {}
+        self._pending_lock = threading.Lock()
+        # One flush at a time, so an older snapshot never commits after a newer one
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = threading.Event()
+
+        self.flush_count = 0
+        self.rows_written = 0
+
+        self._thread = None
+        if flush_interval > 0:
+            self._thread = threading.Thread(target=self._flush_loop, name="session-store-flush", daemon=True)
+            self._thread.start()
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        with self._pending_lock:
+            if session_id in self._pending:
+                return self._pending[session_id]
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, session_id: str, data: Dict):
+        if self._thread is None:
+            self._save_checked(session_id, data)
+            return
+        with self._pending_lock:
+            self._pending[session_id] = data
+            backlog = len(self._pending)
+        if backlog >= self.flush_batch:
+            self._wakeup.set()
+
+    def _save_checked(self, session_id: str, data: Dict):
+        # Write-through save: read the row's version and write the new state in one transaction
+        with self._flush_lock, self._db_lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+                _check_version(session_id, row[0] if row else 0, data)
+                self._conn.execute(
+                    """
+                    INSERT INTO sessions (session_id, data, lead_completeness, updated_at, version)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(session_id) DO UPDATE SET
+                        data = excluded.data,
+                        lead_completeness = excluded.lead_completeness,
+                        updated_at = excluded.updated_at,
+                        version = excluded.version
+                    """,
+                    (session_id, json.dumps(data, ensure_ascii=False), lead_completeness(data), time.time(), data.get("version", 0)),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            # An earlier delete still pending after a failed flush is superseded
+            with self._pending_lock:
+                self._pending.pop(session_id, None)
+
+    def delete(self, session_id: str):
+        with self._pending_lock:
+            self._pending[session_id] = None
+        if self._thread is None:
+            self.flush()
+
+    def find_by_completeness(self, min_fields: int, limit: int = 100) -> List[str]:
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT session_id FROM sessions WHERE lead_completeness >= ? ORDER BY updated_at DESC LIMIT ?",
+                (min_fields, limit),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def count(self) -> int:
+        self.flush()
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def flush(self):
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._pending_lock:
+            pending = dict(self._pending)
+        if not pending:
+            return
+
+        now = time.time()
+        upserts = [
+            (sid, json.dumps(data, ensure_ascii=False), lead_completeness(data), now, data.get("version", 0))
+            for sid, data in pending.items()
+            if data is not None
+        ]
+        deletes = [(sid,) for sid, data in pending.items() if data is None]
+
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                if upserts:
+                    self._conn.executemany(
+                        """
+                        INSERT INTO sessions (session_id, data, lead_completeness, updated_at, version)
+                        VALUES (?, ?, ?, ?, ?)
+                        ON CONFLICT(session_id) DO UPDATE SET
+                            data = excluded.data,
+                            lead_completeness = excluded.lead_completeness,
+                            updated_at = excluded.updated_at,
+                            version = excluded.version
+                        """,
+                        upserts,
+                    )
+                if deletes:
+                    self._conn.executemany("DELETE FROM sessions WHERE session_id = ?", deletes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                # The writes stay pending, to be retried by the next flush
+                self._conn.execute("ROLLBACK")
+                raise
+
+        # Drop the written entries, unless the session was saved again meanwhile
+        with self._pending_lock:
+            for sid, data in pending.items():
+                if sid in self._pending and self._pending[sid] is data:
+                    del self._pending[sid]
+
+        self.flush_count += 1
+        self.rows_written += len(pending)
+
+    def close(self):
+        self._closed.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Error saving sessions: {str(e)}")
+
+
+def default_session_store() -> Optional[SessionStore]:
+    """Return a SQLite store when SESSION_DB_PATH is set, otherwise None (memory only)."""
+    path = os.getenv("SESSION_DB_PATH")
+    return SQLiteSessionStore(path) if path else None
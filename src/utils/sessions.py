@@ -0,0 +1,300 @@
+"""
+Session Management Utility
+Keeps per-conversation state separate from the shared agent definition.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from src.modules.localization import DEFAULT_LANGUAGE, detect_language
+from src.utils.memory import ConversationMemory, DEFAULT_KEEP_TURNS, DEFAULT_TOKEN_BUDGET
+from src.utils.session_store import SessionConflict, SessionStore
+from src.utils.tool_results import TurnResults
+
+# Default limits for the in-process session pool
+DEFAULT_MAX_SESSIONS = 10000
+DEFAULT_SESSION_TTL = 60 * 60  # seconds of inactivity before a session is evicted
+
+# Session whose turn is currently running; lets model wrappers attribute calls to a conversation
+current_session: ContextVar[Optional["SessionState"]] = ContextVar("current_session", default=None)
+
+
+class SessionState:
+    """State for a single conversation."""
+
+    def __init__(
+        self,
+        session_id: str,
+        memory_turns: int = DEFAULT_KEEP_TURNS,
+        memory_token_budget: int = DEFAULT_TOKEN_BUDGET,
+    ):
+        self.session_id = session_id
+
+        # Lead data captured during the conversation
+        self.lead_data = {
+            "location": None,
+            "requirement_type": None,
+            "quantity": None,
+        }
+
+        # Language the customer writes in; replies use templates in this language
+        self.language = DEFAULT_LANGUAGE
+
+        # Token-budgeted conversation memory for this session only
+        self.memory = ConversationMemory(keep_turns=memory_turns, token_budget=memory_token_budget)
+
+        # Estimated prompt tokens of the latest model call
+        self.prompt_tokens = 0
+
+        # Input tokens of this turn's model calls served from the provider's prompt cache
+        self.cached_input_tokens = 0
+
+        # Model tier that answered this turn's latest model call, when a model cascade is used
+        self.model_tier: Optional[str] = None
+
+        # Model calls made, and calls (and estimated tokens) skipped by direct-return tools
+        self.model_calls = 0
+        self.saved_model_calls = 0
+        self.saved_tokens = 0
+
+        # Messages and brochures produced by this turn's tools, in call order
+        self.results = TurnResults()
+
+        # Serializes turns within this session so concurrent messages cannot race on lead_data
+        self.lock = asyncio.Lock()
+
+        # Serializes the tools of one model step that read or write lead_data; other tools run concurrently
+        self.lead_data_lock = asyncio.Lock()
+
+        self.created_at = time.time()
+        self.last_active = self.created_at
+
+        # Version of the saved state this session was loaded at, or last saved as
+        self.version = 0
+
+    def add_to_history(self, role: str, content: str):
+        """Add a message to the conversation memory."""
+        self.memory.add_message(role, content)
+
+    def update_language(self, message: str) -> str:
+        """Detect the language of a customer message, keeping the current one when the message is inconclusive."""
+        self.language = detect_language(message) or self.language
+        return self.language
+
+    def usage_stats(self) -> Dict[str, int]:
+        """Return model call counters for this conversation."""
+        return {
+            "model_calls": self.model_calls,
+            "saved_model_calls": self.saved_model_calls,
+            "saved_tokens": self.saved_tokens,
+        }
+
+    def reset_turn(self):
+        """Clear the tool outputs stored for the previous turn."""
+        self.results = TurnResults()
+        self.prompt_tokens = 0
+        self.cached_input_tokens = 0
+        self.model_tier = None
+
+    def to_dict(self) -> Dict:
+        """Return the durable part of the session as a JSON-serializable dict."""
+        return {
+            "session_id": self.session_id,
+            "lead_data": dict(self.lead_data),
+            "language": self.language,
+            "memory": self.memory.to_dict(),
+            "usage": self.usage_stats(),
+            "created_at": self.created_at,
+            "last_active": self.last_active,
+            "version": self.version,
+        }
+
+    def load_dict(self, data: Dict):
+        """Restore a session saved with to_dict, replacing its current state."""
+        for key in self.lead_data:
+            self.lead_data[key] = None
+        self.lead_data.update(data.get("lead_data", {}))
+        self.language = data.get("language", DEFAULT_LANGUAGE)
+        self.memory.load_dict(data.get("memory", {}))
+        usage = data.get("usage", {})
+        self.model_calls = usage.get("model_calls", 0)
+        self.saved_model_calls = usage.get("saved_model_calls", 0)
+        self.saved_tokens = usage.get("saved_tokens", 0)
+        self.created_at = data.get("created_at", self.created_at)
+        self.last_active = data.get("last_active", self.last_active)
+        self.version = data.get("version", 0)
+
+
+class SessionManager:
+    """
+    Bounded pool of conversation sessions keyed by session id.
+
+    Sessions are kept in least-recently-used order. A session is evicted when it
+    has been idle for longer than `session_ttl` seconds, or when the pool grows
+    past `max_sessions`; a session with a turn in flight is never evicted.
+
+    With a `store`, saved sessions outlive eviction and restarts: a session that
+    is not in the pool is rehydrated from the store on first access. With
+    `shared=True` the store is also shared with other processes serving the same
+    sessions, so a pooled session is reloaded from it at the start of every turn,
+    and a turn whose session another process saved first fails with
+    SessionConflict rather than overwriting that turn.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        session_ttl: float = DEFAULT_SESSION_TTL,
+        memory_turns: int = DEFAULT_KEEP_TURNS,
+        memory_token_budget: int = DEFAULT_TOKEN_BUDGET,
+        store: Optional[SessionStore] = None,
+        shared: bool = False,
+    ):
+        if shared and store is None:
+            raise ValueError("Shared sessions need a session store")
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.memory_turns = memory_turns
+        self.memory_token_budget = memory_token_budget
+        self.store = store
+        self.shared = shared
+
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters
+        self.created_count = 0
+        self.evicted_count = 0
+        self.restored_count = 0
+        self.conflict_count = 0
+
+    def get(self, session_id: str) -> SessionState:
+        """Return the session for `session_id`, restoring or creating it if needed."""
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                self._sessions.move_to_end(session_id)
+                session.last_active = now
+                return session
+
+        # Read the store outside the pool lock so a slow load does not block other sessions
+        saved = self.store.load(session_id) if self.store is not None else None
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = SessionState(
+                    session_id,
+                    memory_turns=self.memory_turns,
+                    memory_token_budget=self.memory_token_budget,
+                )
+                if saved is not None:
+                    session.load_dict(saved)
+                    self.restored_count += 1
+                else:
+                    self.created_count += 1
+                self._sessions[session_id] = session
+                self._evict_overflow()
+            else:
+                self._sessions.move_to_end(session_id)
+
+            session.last_active = now
+            return session
+
+    def save(self, session: SessionState):
+        """
+        Persist a session to the store, if there is one, as its next version.
+
+        Raises SessionConflict if the store has a newer version; the session is
+        then reloaded from the store, dropping the unsaved turn.
+        """
+        if self.store is None:
+            return
+        data = session.to_dict()
+        data["version"] = session.version + 1
+        try:
+            self.store.save(session.session_id, data)
+        except SessionConflict:
+            with self._lock:
+                self.conflict_count += 1
+            session.load_dict(self.store.load(session.session_id) or {})
+            raise
+        session.version = data["version"]
+
+    def refresh(self, session: SessionState):
+        """Reload a shared session from the store, since another process may have changed it."""
+        if not self.shared:
+            return
+        saved = self.store.load(session.session_id)
+        # A session missing from the store was reset elsewhere (or is new)
+        session.load_dict(saved or {})
+
+    def peek(self, session_id: str) -> Optional[SessionState]:
+        """Return the session for `session_id` without creating or touching it."""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def reset(self, session_id: str) -> bool:
+        """Drop a session so that the next message starts a new conversation."""
+        if self.store is not None:
+            self.store.delete(session_id)
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def evict_idle(self) -> int:
+        """Evict all sessions idle for longer than the TTL. Returns the number evicted."""
+        with self._lock:
+            return self._evict_expired(time.time())
+
+    def stats(self) -> Dict[str, int]:
+        """Return counts of live, created and evicted sessions."""
+        with self._lock:
+            return {
+                "live_sessions": len(self._sessions),
+                "created_sessions": self.created_count,
+                "restored_sessions": self.restored_count,
+                "evicted_sessions": self.evicted_count,
+                "session_conflicts": self.conflict_count,
+            }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def _evict_expired(self, now: float) -> int:
+        # Sessions are ordered by last access, so stop at the first live one. A session
+        # with a turn in flight is kept, or its next message would start a second,
+        # concurrent turn on a new session whose save overwrites this one's.
+        expired = []
+        for session_id, session in self._sessions.items():
+            if now - session.last_active <= self.session_ttl:
+                break
+            if not session.lock.locked():
+                expired.append(session_id)
+        for session_id in expired:
+            del self._sessions[session_id]
+        self.evicted_count += len(expired)
+        return len(expired)
+
+    def _evict_overflow(self):
+        # Least recently used first, skipping sessions with a turn in flight
+        overflow = len(self._sessions) - self.max_sessions
+        if overflow <= 0:
+            return
+        evicted = []
+        for session_id, session in self._sessions.items():
+            if len(evicted) == overflow:
+                break
+            if not session.lock.locked():
+                evicted.append(session_id)
+        for session_id in evicted:
+            del self._sessions[session_id]
+        self.evicted_count += len(evicted)
@@ -0,0 +1,374 @@
+"""
+Telemetry Utility
+Per-turn tracing and metrics for prompt building, model calls, tools and CRM delivery.
+
+Every span updates an in-process latency histogram, which can be exported in
+the Prometheus text format. A sampled fraction of turns is also written as
+one JSON line per turn, with its spans, chosen tools and token usage. Both
+paths only take a lock and append to a list, so telemetry can stay on in
+production.
+"""
+
+import bisect
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Union
+
+from agents.items import ModelResponse, TResponseStreamEvent
+from agents.models.interface import Model, ModelTracing
+
+from src.utils.prompt_cache import get_responses_model
+
+logger = logging.getLogger(__name__)
+
+# Latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Fraction of turns written to the JSONL trace log
+DEFAULT_SAMPLE_RATE = 0.1
+
+# Interface the /metrics endpoint listens on; only local scrapers by default
+DEFAULT_METRICS_HOST = "127.0.0.1"
+
+METRIC_PREFIX = "pare"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class TurnTrace:
+    """Spans, tools and token usage recorded during one chat turn."""
+
+    def __init__(self, session_id: str, sampled: bool):
+        self.trace_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.path = "model"
+        self.spans: List[Dict[str, Any]] = []
+        self.tools: List[str] = []
+        self.usage = {"requests": 0, "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "session_id": self.session_id,
+            "timestamp": self.started_at,
+            "duration_ms": round((time.perf_counter() - self.start) * 1000, 3),
+            "path": self.path,
+            "tools": self.tools,
+            "usage": self.usage,
+            "spans": self.spans,
+            "error": self.error,
+        }
+
+
+# Turn being recorded in the current task; run tasks copy it like current_session
+current_trace: ContextVar[Optional[TurnTrace]] = ContextVar("current_trace", default=None)
+
+# Telemetry recording that turn, for code shared by agents with different telemetry (e.g. tools)
+current_telemetry: ContextVar[Optional["Telemetry"]] = ContextVar("current_telemetry", default=None)
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+def _label_text(labels: Labels, extra: str = "") -> str:
+    parts = [f'{key}="{value}"' for key, value in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Telemetry:
+    """Thread-safe span histograms, counters and sampled per-turn traces."""
+
+    def __init__(
+        self,
+        sample_rate: float = DEFAULT_SAMPLE_RATE,
+        jsonl_path: Optional[str] = None,
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.sample_rate = sample_rate
+        self.jsonl_path = jsonl_path
+        self.buckets = buckets
+
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+        self._file = None
+        if jsonl_path:
+            directory = os.path.dirname(jsonl_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(jsonl_path, "a", encoding="utf-8")
+
+    # Recording
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        """Add a duration to the `name` histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.counts[index] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def increment(self, name: str, amount: float = 1, **labels: str):
+        """Add to the `name` counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def span(self, name: str, **labels: str) -> Iterator[None]:
+        """Time a block as a span of the current turn and in the span histogram."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe("span_seconds", elapsed, span=name, **labels)
+            trace = current_trace.get()
+            if trace is not None and trace.sampled:
+                trace.spans.append({
+                    "name": name,
+                    "labels": labels,
+                    "offset_ms": round((start - trace.start) * 1000, 3),
+                    "duration_ms": round(elapsed * 1000, 3),
+                })
+
+    def record_tool(self, tool: str):
+        """Record that a tool was chosen in the current turn."""
+        self.increment("tool_calls_total", tool=tool)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.tools.append(tool)
+
+    def record_usage(self, responses: List[ModelResponse], cached_input_tokens: int = 0):
+        """Add the token usage of a run's raw model responses, and its prompt cache hits, to the current turn."""
+        trace = current_trace.get()
+        self.increment("tokens_total", cached_input_tokens, type="cached_input")
+        if trace is not None:
+            trace.usage["cached_input_tokens"] += cached_input_tokens
+        for response in responses:
+            usage = response.usage
+            self.increment("tokens_total", usage.input_tokens, type="input")
+            self.increment("tokens_total", usage.output_tokens, type="output")
+            if trace is not None:
+                trace.usage["requests"] += usage.requests
+                trace.usage["input_tokens"] += usage.input_tokens
+                trace.usage["output_tokens"] += usage.output_tokens
+                trace.usage["total_tokens"] += usage.total_tokens
+
+    # Turns
+
+    def start_turn(self, session_id: str) -> TurnTrace:
+        """Start recording a turn. Whether it is written to the trace log is decided here."""
+        sampled = self._file is not None and random.random() < self.sample_rate
+        return TurnTrace(session_id, sampled)
+
+    @contextmanager
+    def activate(self, trace: TurnTrace) -> Iterator[TurnTrace]:
+        """Make `trace` the current turn for spans recorded in this block."""
+        token = current_trace.set(trace)
+        telemetry_token = current_telemetry.set(self)
+        try:
+            yield trace
+        finally:
+            current_telemetry.reset(telemetry_token)
+            current_trace.reset(token)
+
+    def finish_turn(self, trace: TurnTrace, error: Optional[BaseException] = None):
+        """Record the turn's duration and write it to the trace log if it was sampled."""
+        if error is not None:
+            trace.error = type(error).__name__
+        self.observe("turn_seconds", time.perf_counter() - trace.start, path=trace.path)
+        self.increment("turns_total", path=trace.path, outcome="error" if trace.error else "ok")
+        if trace.sampled:
+            line = json.dumps(trace.to_dict(), ensure_ascii=False)
+            with self._lock:
+                if self._file is not None:
+                    self._file.write(line + "\n")
+                    self._file.flush()
+
+    # Export
+
+    def prometheus_text(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for metric in sorted({name for name, _ in histograms}):
+            full_name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# TYPE {full_name} histogram")
+            for (name, labels), (counts, total, count) in sorted(histograms.items()):
+                if name != metric:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{full_name}_bucket{_label_text(labels, le)} {cumulative}")
+                le = 'le="+Inf"'
+                lines.append(f"{full_name}_bucket{_label_text(labels, le)} {count}")
+                lines.append(f"{full_name}_sum{_label_text(labels)} {total}")
+                lines.append(f"{full_name}_count{_label_text(labels)} {count}")
+
+        for metric in sorted({name for name, _ in counters}):
+            full_name = f"{METRIC_PREFIX}_{metric}"
+            lines.append(f"# TYPE {full_name} counter")
+            for (name, labels), value in sorted(counters.items()):
+                if name == metric:
+                    lines.append(f"{full_name}{_label_text(labels)} {value:g}")
+
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return span counts and mean durations (ms), and counter values, as a dict."""
+        with self._lock:
+            spans = {
+                "/".join([name] + [f"{k}={v}" for k, v in labels]): {
+                    "count": h.count,
+                    "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+                }
+                for (name, labels), h in self._histograms.items()
+            }
+            counters = {
+                "/".join([name] + [f"{k}={v}" for k, v in labels]): value
+                for (name, labels), value in self._counters.items()
+            }
+        return {"histograms": spans, "counters": counters}
+
+    def serve(self, port: int, host: str = DEFAULT_METRICS_HOST) -> ThreadingHTTPServer:
+        """Serve the Prometheus text at /metrics from a background thread."""
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        return server
+
+    def close(self):
+        if self._file is not None:
+            with self._lock:
+                self._file.close()
+                self._file = None
+
+
+class TracedModel(Model):
+    """Model wrapper that records each model call as a span."""
+
+    def __init__(self, model: Union[str, Model], telemetry: Optional[Telemetry] = None):
+        self._model = model
+        self._telemetry = telemetry
+
+    @property
+    def model(self) -> Model:
+        # Resolve model names lazily so that no API client is needed until the first call
+        if isinstance(self._model, str):
+            self._model = get_responses_model(self._model)
+        return self._model
+
+    @property
+    def telemetry(self) -> Telemetry:
+        return self._telemetry or get_telemetry()
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> ModelResponse:
+        with self.telemetry.span("model", mode="response"):
+            return await self.model.get_response(
+                system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+            )
+
+    async def stream_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        first_event = True
+        start = time.perf_counter()
+        with self.telemetry.span("model", mode="stream"):
+            async for event in self.model.stream_response(
+                system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+            ):
+                if first_event:
+                    self.telemetry.observe("model_first_event_seconds", time.perf_counter() - start)
+                    first_event = False
+                yield event
+
+
+_telemetry: Optional[Telemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    """
+    Return the process-wide telemetry, creating it on first use.
+
+    TELEMETRY_JSONL_PATH enables the per-turn trace log, TELEMETRY_SAMPLE_RATE
+    sets the fraction of turns written to it, and METRICS_PORT starts the
+    Prometheus /metrics endpoint on METRICS_HOST (default 127.0.0.1; set
+    0.0.0.0 for a scraper on another host). A port already taken, e.g. by
+    another worker process, is logged and skipped.
+    """
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = Telemetry(
+                sample_rate=float(os.getenv("TELEMETRY_SAMPLE_RATE", DEFAULT_SAMPLE_RATE)),
+                jsonl_path=os.getenv("TELEMETRY_JSONL_PATH") or None,
+            )
+            port = os.getenv("METRICS_PORT")
+            if port:
+                try:
+                    _telemetry.serve(int(port), host=os.getenv("METRICS_HOST", DEFAULT_METRICS_HOST))
+                except OSError as e:
+                    logger.warning("Not serving metrics on port %s: %s", port, e)
+    return _telemetry
@@ -0,0 +1,174 @@
+"""
+Tool Return Policy Utility
+Ends a run as soon as a direct-return tool has produced the reply.
+
+Most PARE tools return a canned template that is shown to the customer as-is,
+so asking the model to rephrase the tool result is a wasted round trip. Each
+tool is marked DIRECT (the tool's message is the reply) or REPHRASE (the model
+writes the reply from the tool result). DirectReturnModel wraps the real model:
+when every tool call in the previous step was DIRECT, it answers with the
+tool's message instead of calling the model again.
+"""
+
+import ast
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from agents.items import ModelResponse, TResponseInputItem, TResponseStreamEvent
+from agents.models.fake_id import FAKE_RESPONSES_ID
+from agents.models.interface import Model, ModelTracing
+from agents.usage import Usage
+from openai.types.responses import (
+    Response,
+    ResponseCompletedEvent,
+    ResponseOutputMessage,
+    ResponseOutputText,
+)
+
+from src.utils.memory import estimate_tokens
+from src.utils.prompt_cache import get_responses_model
+from src.utils.sessions import current_session
+
+# Return policies
+DIRECT = "direct"
+REPHRASE = "rephrase"
+
+
+def _get(item: Any, key: str) -> Any:
+    if isinstance(item, dict):
+        return item.get(key)
+    return getattr(item, key, None)
+
+
+def _item_text(item: Any) -> str:
+    for key in ("content", "output", "arguments"):
+        value = _get(item, key)
+        if value:
+            return str(value)
+    return ""
+
+
+def _tool_message(output: Any) -> str:
+    # Tools return a dict, which the SDK passes on as its str()
+    try:
+        value = ast.literal_eval(output) if isinstance(output, str) else output
+    except (ValueError, SyntaxError):
+        return str(output)
+    if isinstance(value, dict) and value.get("message"):
+        return str(value["message"])
+    return str(output)
+
+
+class DirectReturnModel(Model):
+    """Model wrapper that skips the follow-up call after direct-return tools."""
+
+    def __init__(self, model: Union[str, Model], policy: Dict[str, str], default_policy: str = REPHRASE):
+        self._model = model
+        self.policy = policy
+        self.default_policy = default_policy
+
+    @property
+    def model(self) -> Model:
+        # Resolve model names lazily so that no API client is needed until the first call
+        if isinstance(self._model, str):
+            self._model = get_responses_model(self._model)
+        return self._model
+
+    def direct_reply(self, input: Union[str, List[TResponseInputItem]]) -> Optional[str]:
+        """
+        Return the reply for this step if it can be answered without the model.
+
+        That is the case when the input ends with tool calls and their outputs,
+        and every one of those tools is a direct-return tool.
+        """
+        if isinstance(input, str):
+            return None
+
+        calls = []
+        outputs = []
+        for item in reversed(input):
+            item_type = _get(item, "type")
+            if item_type == "function_call":
+                calls.append(_get(item, "name"))
+            elif item_type == "function_call_output":
+                outputs.append(_get(item, "output"))
+            else:
+                break
+
+        if not calls or any(self.policy.get(name, self.default_policy) != DIRECT for name in calls):
+            return None
+
+        # Outputs were collected newest first
+        return "\n\n".join(_tool_message(output) for output in reversed(outputs))
+
+    def _record_skip(self, system_instructions: Optional[str], input: List[TResponseInputItem], reply: str):
+        session = current_session.get()
+        if session is None:
+            return
+        # Estimate what the skipped call would have cost: the full prompt plus the reply
+        skipped = estimate_tokens(system_instructions or "") + estimate_tokens(reply)
+        skipped += sum(estimate_tokens(_item_text(item)) for item in input)
+        session.saved_model_calls += 1
+        session.saved_tokens += skipped
+
+    def _record_call(self):
+        session = current_session.get()
+        if session is not None:
+            session.model_calls += 1
+
+    @staticmethod
+    def _message(reply: str) -> ResponseOutputMessage:
+        return ResponseOutputMessage(
+            id=FAKE_RESPONSES_ID,
+            content=[ResponseOutputText(text=reply, type="output_text", annotations=[])],
+            role="assistant",
+            status="completed",
+            type="message",
+        )
+
+    async def get_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> ModelResponse:
+        reply = self.direct_reply(input)
+        if reply is not None:
+            self._record_skip(system_instructions, input, reply)
+            return ModelResponse(output=[self._message(reply)], usage=Usage(), referenceable_id=None)
+
+        self._record_call()
+        return await self.model.get_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+        )
+
+    async def stream_response(
+        self,
+        system_instructions,
+        input,
+        model_settings,
+        tools,
+        output_schema,
+        handoffs,
+        tracing: ModelTracing,
+    ) -> AsyncIterator[TResponseStreamEvent]:
+        reply = self.direct_reply(input)
+        if reply is not None:
+            self._record_skip(system_instructions, input, reply)
+            # The tool message has already been streamed, so only complete the response
+            response = Response.model_construct(
+                id=FAKE_RESPONSES_ID,
+                output=[self._message(reply)],
+                usage=None,
+            )
+            yield ResponseCompletedEvent.model_construct(type="response.completed", response=response)
+            return
+
+        self._record_call()
+        async for event in self.model.stream_response(
+            system_instructions, input, model_settings, tools, output_schema, handoffs, tracing
+        ):
+            yield event
@@ -0,0 +1,71 @@
+"""
+Tool Results Utility
+Collects the replies and brochures that a turn's tools produce, in the order the model called them.
+
+When the model calls several tools in one step (product info, a brochure
+and a price estimate), each call gets its own slot, reserved as the call
+starts. Slots keep the model's call order even when the calls run
+concurrently and finish out of order. The turn's reply is the slots'
+messages joined in that order, and its brochures are every brochure sent,
+each listed once. Each slot also records how long its tool ran.
+"""
+
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+
+class ToolResult:
+    """Messages and brochures produced by one tool call, and its run time."""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.messages: List[str] = []
+        self.brochures: List[str] = []
+        self.elapsed: Optional[float] = None  # seconds, once the call has finished
+
+
+# Tool call running in the current task (and its worker thread); tools record their output into it
+current_tool_result: ContextVar[Optional[ToolResult]] = ContextVar("current_tool_result", default=None)
+
+
+class TurnResults:
+    """Tool results of one turn, in call order."""
+
+    def __init__(self):
+        self.calls: List[ToolResult] = []
+
+    def begin(self, tool: str) -> ToolResult:
+        """Reserve the next slot for a tool call that is starting."""
+        result = ToolResult(tool)
+        self.calls.append(result)
+        return result
+
+    def add(self, message: Optional[str] = None, brochure: Optional[str] = None):
+        """Record a reply message and/or brochure for the tool call that is running."""
+        result = current_tool_result.get()
+        if result is None:
+            # Called outside a traced tool call, e.g. a tool invoked directly
+            result = self.begin("direct")
+        if message:
+            result.messages.append(message)
+        if brochure:
+            result.brochures.append(brochure)
+
+    @property
+    def message(self) -> Optional[str]:
+        """The tools' messages joined in call order, without repeats, or None if no tool produced one."""
+        messages = list(dict.fromkeys(message for call in self.calls for message in call.messages))
+        return "\n\n".join(messages) if messages else None
+
+    @property
+    def brochures(self) -> List[str]:
+        """Brochures sent this turn, in call order, each once."""
+        return list(dict.fromkeys(brochure for call in self.calls for brochure in call.brochures))
+
+    def timings(self) -> List[Dict[str, object]]:
+        """Each finished tool call with its run time in milliseconds, in call order."""
+        return [
+            {"tool": call.tool, "elapsed_ms": round(call.elapsed * 1000, 3)}
+            for call in self.calls
+            if call.elapsed is not None
+        ]
@@ -5,7 +5,7 @@ Using OpenAI Agents SDK
 
 import os
 import streamlit as st
-from src.agent import PareAgent
+from src.client import ChatClient
 
 # Set page configuration
 st.set_page_config(
@@ -20,54 +20,68 @@ st.set_page_config(
 # </style>
 # """, unsafe_allow_html=True)
 
-# Initialize agent
+# Client of the chat API (shared across browser sessions; conversation state is kept by the API per session id)
 @st.cache_resource
-def get_agent():
-    return PareAgent()
+def get_client():
+    return ChatClient()
+
+def show_brochure(brochure_type):
+    """Show the brochure notice for a brochure type."""
+    st.info(f"📄 Sending {brochure_type} brochure")
+    
+    # Display brochure information
+    if brochure_type == "easy+":
+        st.caption("Wall panels brochure")
+    elif brochure_type == "innov+":
+        st.caption("Ceiling panels brochure")
+    elif brochure_type == "dura+":
+        st.caption("Facade panels brochure")
+    elif brochure_type == "company":
+        st.caption("Company brochure")
 
 # App title and description
 st.title("PARE India AI Assistant")
 
+# Give each browser session its own conversation id, kept in the URL so a reload resumes it
+if "session_id" not in st.session_state:
+    st.session_state.session_id = st.query_params.get("sid") or get_client().create_session()
+    st.query_params["sid"] = st.session_state.session_id
+
 # Initialize chat history in session state if it doesn't exist
 if "messages" not in st.session_state:
     st.session_state.messages = [
         {"role": "assistant", "content": "Hello! Welcome to PARE India. I'm your virtual assistant. How can I help you today?"}
     ]
+    
+    # Show the recent messages of a resumed conversation
+    try:
+        st.session_state.messages += get_client().get_session(st.session_state.session_id)["messages"]
+    except Exception:
+        pass
 
 # Display chat history
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
         st.write(message["content"])
         
-        # If there's a brochure to show
-        if message.get("brochure"):
-            brochure_type = message["brochure"]
-            st.info(f"📄 Sending {brochure_type} brochure")
-            
-            # Display brochure information
-            if brochure_type == "easy+":
-                st.caption("Wall panels brochure")
-            elif brochure_type == "innov+":
-                st.caption("Ceiling panels brochure")
-            elif brochure_type == "dura+":
-                st.caption("Facade panels brochure")
-            elif brochure_type == "company":
-                st.caption("Company brochure")
+        # If there are brochures to show
+        for brochure in message.get("brochures", []):
+            show_brochure(brochure)
 
 # Chat input
 user_input = st.chat_input("Type your message here...")
 
-# Handle agent initialization errors
+# Handle client initialization errors
 try:
-    agent = get_agent()
-    agent_initialized = True
+    client = get_client()
+    client_initialized = True
 except Exception as e:
-    st.error(f"Error initializing AI assistant: {str(e)}")
-    st.warning("Please make sure you have a valid OPENAI_API_KEY in your .env file")
-    agent_initialized = False
+    st.error(f"Error connecting to AI assistant: {str(e)}")
+    st.warning("Please make sure the API server is running (python server.py) and PARE_API_URL points to it")
+    client_initialized = False
 
-# When user inputs a message and agent is initialized
-if user_input and agent_initialized:
+# When user inputs a message and the client is initialized
+if user_input and client_initialized:
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": user_input})
     
@@ -80,38 +94,48 @@ if user_input and agent_initialized:
         thinking_placeholder = st.empty()
         thinking_placeholder.text("Thinking...")
         
+        brochure_placeholder = st.empty()
+        
         try:
-            # Get response from agent
-            response = agent.process_message(user_input)
+            # Stream the response from the agent as it is generated
+            response = None
+            text = ""
+            brochures = []
+            for event in client.stream_message(st.session_state.session_id, user_input):
+                if event["type"] == "text_delta":
+                    text += event["delta"]
+                    thinking_placeholder.write(text + "▌")
+                elif event["type"] == "message":
+                    text = event["message"]
+                    thinking_placeholder.write(text)
+                elif event["type"] == "brochure":
+                    # Show brochure notification as soon as a tool selects it
+                    brochures.append(event["brochure"])
+                    with brochure_placeholder.container():
+                        for brochure in brochures:
+                            show_brochure(brochure)
+                elif event["type"] == "done":
+                    response = event
             
             # Update assistant message
             thinking_placeholder.write(response["response"])
             
-            # Show brochure notification if applicable
-            if response.get("brochure"):
-                brochure_type = response["brochure"]
-                st.info(f"📄 Sending {brochure_type} brochure")
-                
-                # Display brochure information
-                if brochure_type == "easy+":
-                    st.caption("Wall panels brochure")
-                elif brochure_type == "innov+":
-                    st.caption("Ceiling panels brochure")
-                elif brochure_type == "dura+":
-                    st.caption("Facade panels brochure")
-                elif brochure_type == "company":
-                    st.caption("Company brochure")
+            # Show brochure notifications if applicable
+            if response.get("brochures"):
+                with brochure_placeholder.container():
+                    for brochure in response["brochures"]:
+                        show_brochure(brochure)
             
             # Add assistant response to chat history
             st.session_state.messages.append({
                 "role": "assistant",
                 "content": response["response"],
-                "brochure": response.get("brochure")
+                "brochures": response.get("brochures", [])
             })
             
         except Exception as e:
             thinking_placeholder.error(f"Error: {str(e)}")
-            st.error("Please make sure your OpenAI API key is valid and has access to the required models.")
+            st.error("Please make sure the API server is running and its OpenAI API key is valid.")
 
 # # Sidebar with information
 # with st.sidebar:
@@ -137,6 +161,9 @@ if user_input and agent_initialized:
     
 #     # Add a reset button to clear the conversation
 #     if st.button("Reset Conversation"):
+#         get_client().reset_session(st.session_state.session_id)
+#         st.session_state.session_id = get_client().create_session()
+#         st.query_params["sid"] = st.session_state.session_id
 #         st.session_state.messages = [
 #             {"role": "assistant", "content": "Hello! Welcome to PARE India. I'm your virtual assistant. How can I help you today?"}
 #         ]
@@ -3,14 +3,88 @@ PARE India AI Assistant
 Simple test script for module functionality.
 """
 
+import asyncio
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
 from src.modules.company_info import handle_company_query
 from src.modules.product_info import handle_product_query
-from src.modules.lead_capture import handle_lead_capture
+from src.modules.lead_capture import LEAD_FORM, handle_lead_capture
+from src.modules.lead_extraction import extract_quantity, spoken_numbers
 from src.modules.support import get_pricing_info, handle_support_request
+from src.modules.router import IntentRouter, classify_intent
+from src.modules.catalog import get_catalog
+from src.modules.localization import detect_language
+from src.modules.pricing import PriceTable, get_price_table, itemize, requote_leads
+from src.utils.memory import ConversationMemory
+from src.utils.sessions import SessionManager
+from src.utils.session_store import InMemorySessionStore, SessionConflict, SQLiteSessionStore
+from src.utils.telemetry import Telemetry
+from src.utils.crm import LeadDeliveryPipeline
+from src.utils.lead_index import LeadIndex
+from src.utils.brochure_search import BrochureIndex, build_index, search_brochures
+from src.utils.mock_model import MockModel, tool_call
+from backfill_leads import run_backfill
+
+
+class StandInCRMHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the CRM API that fails the first request with a 503."""
+    
+    received = []
+    
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not StandInCRMHandler.received:
+            StandInCRMHandler.received.append(None)
+            self.send_response(503)
+        else:
+            StandInCRMHandler.received.append(body)
+            self.send_response(200)
+        self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+class RejectingCRMHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the CRM API that rejects every lead with a 400."""
+    
+    requests = 0
+    
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        RejectingCRMHandler.requests += 1
+        self.send_response(400)
+        self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+async def asgi_request(app, method, path, body=None):
+    """Send one request to an ASGI app and return its status and body."""
+    request = json.dumps(body).encode() if body is not None else b""
+    received = []
+    
+    async def receive():
+        return {"type": "http.request", "body": request, "more_body": False}
+    
+    async def send(message):
+        received.append(message)
+    
+    await app({"type": "http", "method": method, "path": path, "headers": []}, receive, send)
+    status = received[0]["status"]
+    return status, b"".join(m.get("body", b"") for m in received[1:])
+
 
 def run_test():
     """Run basic tests on all modules."""
     print("\n=== Testing Modules ===")
+    # Leads sent by the agents' tools are spooled outside the working tree
+    os.environ["CRM_SPOOL_PATH"] = os.path.join(tempfile.mkdtemp(), "crm_spool.jsonl")
     
     # Test company info
     print("\nCompany Info:")
@@ -35,16 +109,524 @@ def run_test():
     result = handle_lead_capture(lead_data)
     print(f"Next Field: {result['next_field']}")
     
+    # Test the lead form: typed answers are parsed locally, several fields come from one message
+    print("\nLead Form:")
+    lead_data = {"location": None, "requirement_type": None, "quantity": None}
+    result = handle_lead_capture(lead_data, field="quantity", value="around 2k sqft, our office in Pune")
+    print(f"Captured: {lead_data}, next field: {result['next_field']}")
+    result = handle_lead_capture(lead_data, field="space_type", value="a small cafe")
+    print(f"Space type: {lead_data['space_type']}, complete: {result['is_complete']}")
+    result = handle_lead_capture(lead_data, field="phone", value="call me at 12345")
+    print(f"Invalid phone: {result['message']!r}")
+    handle_lead_capture(lead_data, field="phone", value="098765 43210")
+    print(f"Contact kept: {({field: lead_data.get(field) for field in ['name', 'phone']})}")
+    for field, text in [("quantity", "do hazaar square feet"), ("quantity", "120 sq m"), ("requirement_type", "mera ghar hai"), ("name", "I'm Priya")]:
+        print(f"{field} {text!r}: {LEAD_FORM.parse(field, text, asked=True)}")
+    # Hedges and non-answers are not values, and only a real introduction gives a name
+    for field, text in [("location", "Not sure yet"), ("location", "idk"), ("name", "same as before"), ("space_type", "not sure")]:
+        assert LEAD_FORM.parse(field, text, asked=True) is None, (field, text)
+    for text in ["this is great", "my name is in the form"]:
+        assert LEAD_FORM.parse("name", text) is None, text
+    print("Hedges and non-answers are not captured")
+    # Number words next to digits are plain words, never added to them
+    for text, expected in [("can you do 1200 sqft", 1200), ("ek 1000 sq ft office", 1000), ("das 1200 sq ft", 1200), ("we need to do 500 sq ft", 500), ("2 hazaar sq ft", 2000)]:
+        assert extract_quantity(text) == expected, (text, extract_quantity(text))
+    assert spoken_numbers("can you do 1200 sqft") == "can you do 1200 sqft"
+    print("Digits are not merged with number words")
+    
     # Test pricing info
     print("\nPricing Info:")
     result = get_pricing_info()
     print(f"Response: {result['message']}")
     
+    # Test the pricing engine: an estimate from captured lead data, and a batch re-quote
+    print("\nPricing Engine:")
+    result = get_pricing_info({"quantity": "1,200 sq ft", "requirement_type": "Residential"}, product="Linea", finish="wood")
+    print(f"Itemized: {result['message']}")
+    result = get_pricing_info({"quantity": "2000", "requirement_type": "Commercial"})
+    print(f"By category: {result['message']}")
+    leads = [
+        {"product": "soffit", "quantity": "5000 sqft", "finish": "marble"},
+        {"product": "easy plus", "quantity": 450},
+        {"product": "dura+", "quantity": "100 sq m"},
+        {"product": "unknown", "quantity": "800"},
+    ]
+    print(f"Re-quoted totals: {[lead['total'] for lead in requote_leads(leads)]}")
+    # A finish that is not offered gets no quote, rather than the cheapest finish
+    table = get_price_table()
+    assert table.quote("linea", 1000, "glossy") is None
+    assert math.isnan(table.quote_batch(["linea"], [1000], ["glossy"])["total"][0])
+    assert table.quote("linea", 1000).finish == "pastel"
+    print("Unknown finish: no quote")
+    # Prices follow the catalog: only offered finishes, and no finish label where it lists none
+    assert table.quote("soffit", 1000).finish == "wooden" and table.quote("soffit", 1000, "pastel") is None
+    assert table.quote("baffle", 1000).finish is None and "finish" not in itemize(table.quote("baffle", 1000)).splitlines()[0]
+    assert table.product_id("innov+") is None
+    checked = PriceTable.from_dict({"rates": {"innov+": {"wooden": 260}, "soffit": {"wooden": 275, "marble": 295}}}, catalog=get_catalog())
+    assert checked.rates == {"soffit": {"wooden": 275}}
+    print(f"Soffit: {get_pricing_info(product='soffit')['message'].strip().splitlines()[0]}")
+    
+    # Test lead extraction from transcripts: a missed lead is recovered, a captured one is not re-sent
+    print("\nLead Backfill:")
+    transcript_path = os.path.join(tempfile.mkdtemp(), "transcripts.jsonl")
+    quantity_prompt = LEAD_FORM.spec("quantity")["prompt"]["en"]
+    transcripts = [
+        {"session_id": "a", "lead_data": {"location": "Pune", "requirement_type": "Residential", "quantity": "900"},
+         "messages": [{"role": "user", "content": "Pune, 900 sq ft for my flat"}]},
+        {"session_id": "b", "lead_data": {"location": None, "requirement_type": None, "quantity": None},
+         "messages": [{"role": "user", "content": "हमारा ऑफिस बंबई में है"}]},
+        {"session_id": "b", "lead_data": {"location": None, "requirement_type": "Commercial", "quantity": None},
+         "messages": [{"role": "user", "content": "हमारा ऑफिस बंबई में है"},
+                      {"role": "assistant", "content": f"Got it. {quantity_prompt}"},
+                      {"role": "user", "content": "around 1.5k"}]},
+        "not json",
+    ]
+    with open(transcript_path, "w", encoding="utf-8") as f:
+        for transcript in transcripts:
+            f.write((transcript if isinstance(transcript, str) else json.dumps(transcript, ensure_ascii=False)) + "\n")
+    leads, report = run_backfill([transcript_path], workers=1, chunk_size=2)
+    print(f"Recovered: {leads}")
+    report = report.to_dict()
+    print(f"Complete live/merged: {report['complete_live']}/{report['complete_merged']}, invalid: {report['invalid_lines']}")
+    print(f"Recall vs live: {({field: stats['recall_vs_live'] for field, stats in report['fields'].items()})}")
+    
     # Test support request
     print("\nSupport Request (Callback):")
     result = handle_support_request("callback")
     print(f"Response: {result['message']}")
     
+    # Test localization: language detection and the same handlers answering in Hindi and Hinglish
+    print("\nLocalization:")
+    for text in ["What panels do you have for walls?", "मुझे दीवार पैनल चाहिए", "mujhe ceiling panel ka price batao", "ok", "Pune"]:
+        print(f"{text!r}: {detect_language(text)}")
+    print(f"Hindi company info: {handle_company_query(language='hi')['message'][:60]!r}")
+    print(f"Hinglish callback: {handle_support_request('callback', language='hinglish')['message'].strip()[:60]!r}")
+    print(f"Hindi estimate: {get_pricing_info({'quantity': '1200'}, product='Linea', language='hi')['message'].splitlines()[0]!r}")
+    
+    # Test catalog lookups, including misspelled and transliterated names
+    print("\nProduct Catalog:")
+    catalog = get_catalog()
+    for name in ["easy plus", "soffitt", "Linea", "लीनिया", "louvre"]:
+        product = catalog.find(name)
+        print(f"{name!r}: {product.name if product else None}")
+    print(f"Marble finish: {[product.name for product in catalog.by_finish('marble')]}")
+    print(f"Exterior: {[product.name for product in catalog.by_application('exterior')]}")
+    
+    # Test brochure search over a small text brochure
+    print("\nBrochure Search:")
+    brochure_dir = tempfile.mkdtemp()
+    index_dir = os.path.join(tempfile.mkdtemp(), "brochure_index")
+    with open(os.path.join(brochure_dir, "innov+.txt"), "w") as f:
+        f.write("Soffit ceiling panels have a real wood look, suit outdoor verandahs and need no polishing.")
+    print(f"Build: {build_index(brochure_dir, index_dir)}")
+    print(f"Rebuild: {build_index(brochure_dir, index_dir)}")
+    index = BrochureIndex(index_dir)
+    print(f"Results: {index.search('soffit outdoor polishing', top_k=1)}")
+    index.close()
+    # A rebuild keeps the previous generation for readers of the old manifest
+    os.environ["BROCHURE_INDEX_PATH"] = index_dir
+    assert search_brochures("soffit", top_k=1)
+    build_index(brochure_dir, index_dir)
+    generations = sorted({name.split(".")[1] for name in os.listdir(index_dir) if name.endswith(".bin")})
+    assert generations == ["2", "3"], generations
+    assert search_brochures("soffit", top_k=1)
+    del os.environ["BROCHURE_INDEX_PATH"]
+    print(f"Generations kept: {generations}")
+    
+    # Test intent router
+    print("\nIntent Router:")
+    router = IntentRouter()
+    for query in ["price?", "tell me about the company", "दीवार पैनल", "send ceiling brochure", "price of wall panels for 2000 sqft"]:
+        print(f"{query!r}: {router.route(query)}")
+    # Negated keywords do not count, and specific questions go to the model
+    for query in ["don't call me", "I don't need a brochure", "no thanks, not the price", "brochure nahi chahiye"]:
+        assert classify_intent(query)["intent"] is None, query
+    for query in ["what is the cost of installation?", "is it waterproof for my bathroom wall?"]:
+        assert router.route(query) is None, query
+    assert router.route("what is the price?")["intent"] == "pricing"
+    assert router.route("no, send the brochure")["intent"] == "brochure"
+    print("Negations and specific questions are not routed")
+    print(f"Stats: {router.stats()}")
+    
+    # Test session manager
+    print("\nSession Manager:")
+    sessions = SessionManager(max_sessions=2)
+    sessions.get("a").lead_data["location"] = "Mumbai"
+    sessions.get("b")
+    sessions.get("c")
+    print(f"Stats: {sessions.stats()}")
+    print(f"Session 'a' evicted: {'a' not in sessions}")
+    print(f"New session 'a' lead data: {sessions.get('a').lead_data}")
+    # A session with a turn in flight is not evicted
+    async def evict_during_turn():
+        busy = sessions.get("d")
+        async with busy.lock:
+            for session_id in ["e", "f", "g"]:
+                sessions.get(session_id)
+            assert sessions.peek("d") is busy
+        sessions.get("h")
+        assert "d" not in sessions
+    asyncio.run(evict_during_turn())
+    print("Busy session kept until its turn ended")
+    
+    # Test conversation memory
+    print("\nConversation Memory:")
+    memory = ConversationMemory(keep_turns=1, token_budget=200)
+    for i in range(5):
+        memory.add_message("user", f"Question {i} about wall panels for my office")
+        memory.add_message("assistant", f"Answer {i}. We have Linea, Pyramid and Arch panels.")
+    text, tokens = memory.render({"location": "Pune", "requirement_type": None})
+    print(f"Memory ({tokens} tokens):\n{text}")
+    items, tokens = memory.render_items({"location": "Pune", "requirement_type": None})
+    print(f"Memory as input items ({tokens} tokens): {[item['role'] for item in items]}")
+    
+    # Test CRM delivery pipeline against a local stand-in server
+    print("\nCRM Delivery Pipeline:")
+    server = HTTPServer(("127.0.0.1", 0), StandInCRMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    spool_path = os.path.join(tempfile.mkdtemp(), "crm_spool.jsonl")
+    pipeline = LeadDeliveryPipeline(
+        api_url=f"http://127.0.0.1:{server.server_port}/leads",
+        api_key="test",
+        spool_path=spool_path,
+        batch_size=2,
+        batch_wait=0.1,
+        backoff=0.01,
+    ).start()
+    pipeline.submit({"location": "Pune", "requirement_type": "Residential", "quantity": "1200"})
+    pipeline.submit({"location": "Delhi", "requirement_type": "Commercial", "quantity": None})
+    pipeline.stop()
+    print(f"Received by CRM: {StandInCRMHandler.received[1:]}")
+    print(f"Pending in spool: {len(pipeline.spool.pending())}")
+    print(f"Metrics: {pipeline.metrics()}")
+    # A lead whose delivery failed is retried while the pipeline keeps running
+    StandInCRMHandler.received = []
+    pipeline = LeadDeliveryPipeline(
+        api_url=f"http://127.0.0.1:{server.server_port}/leads",
+        api_key="test",
+        spool_path=os.path.join(tempfile.mkdtemp(), "crm_spool.jsonl"),
+        max_retries=0,
+        redelivery_interval=0.1,
+    ).start()
+    pipeline.submit({"location": "Nashik", "requirement_type": "Residential", "quantity": "800"})
+    for _ in range(50):
+        if pipeline.metrics()["delivered"]:
+            break
+        time.sleep(0.05)
+    pipeline.stop()
+    server.shutdown()
+    assert pipeline.metrics()["failed"] == 1 and pipeline.metrics()["delivered"] == 1
+    assert not pipeline.spool.pending()
+    print(f"Failed lead redelivered: {StandInCRMHandler.received[1:]}")
+    # A lead the CRM rejects is dead-lettered, not sent again by later redelivery passes
+    server = HTTPServer(("127.0.0.1", 0), RejectingCRMHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pipeline = LeadDeliveryPipeline(
+        api_url=f"http://127.0.0.1:{server.server_port}/leads",
+        api_key="test",
+        spool_path=os.path.join(tempfile.mkdtemp(), "crm_spool.jsonl"),
+        redelivery_interval=0.05,
+    ).start()
+    pipeline.submit({"location": "Thane", "requirement_type": "Commercial", "quantity": "bad"})
+    time.sleep(0.5)
+    pipeline.stop()
+    server.shutdown()
+    assert RejectingCRMHandler.requests == 1 and pipeline.metrics()["rejected"] == 1
+    assert not pipeline.spool.pending()
+    with open(pipeline.spool.rejected_path) as f:
+        assert [json.loads(line)["lead"]["location"] for line in f] == ["Thane"]
+    print(f"Rejected lead dead-lettered after {RejectingCRMHandler.requests} request")
+    
+    # Test the lead index: the same customer written differently is merged into one lead
+    print("\nLead Index:")
+    index_path = os.path.join(tempfile.mkdtemp(), "lead_index.db")
+    index = LeadIndex(index_path, bloom_capacity=100)
+    for session_id, lead in [
+        ("s1", {"location": "Bombay", "requirement_type": "Residential", "quantity": "1200"}),
+        ("s1", {"location": "Mumbai", "requirement_type": "Residential", "quantity": "1200", "phone": "098765 43210"}),
+        ("s2", {"location": "mumbai", "phone": "+91-98765-43210", "email": "Asha.K+pare@gmail.com"}),
+        ("s3", {"email": "ashak@googlemail.com"}),
+    ]:
+        outcome, posted = index.resolve(lead, session_id=session_id)
+        print(f"{session_id} {outcome}: {posted and {k: v for k, v in posted.items() if k != 'lead_id'}}")
+    index.close()
+    index = LeadIndex(index_path, bloom_capacity=100)
+    print(f"After restart: {index.stats()['leads']} lead, known phone: {index.contains({'phone': '919876543210'})}")
+    index.close()
+    
+    # Test durable session store: a conversation survives a restart
+    print("\nSession Store:")
+    db_path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+    sessions = SessionManager(store=SQLiteSessionStore(db_path))
+    session = sessions.get("resume-me")
+    session.lead_data.update({"location": "Jaipur", "requirement_type": "Commercial"})
+    session.add_to_history("user", "Need ceiling panels for a showroom in Jaipur")
+    sessions.save(session)
+    sessions.store.close()
+    sessions = SessionManager(store=SQLiteSessionStore(db_path))
+    restored = sessions.get("resume-me")
+    print(f"Restored lead data: {restored.lead_data}")
+    print(f"Restored messages: {restored.memory.recent}")
+    print(f"Sessions with 2+ lead fields: {sessions.store.find_by_completeness(2)}")
+    print(f"Stats: {sessions.stats()}")
+    sessions.store.close()
+    # A pending write is visible to loads before it is flushed, and to other connections after
+    store = SQLiteSessionStore(db_path, flush_interval=60)
+    other = SQLiteSessionStore(db_path, flush_interval=0)
+    store.save("pending", {"lead_data": {"location": "Surat"}})
+    assert store.load("pending") == {"lead_data": {"location": "Surat"}}
+    assert other.load("pending") is None
+    store.flush()
+    assert store.load("pending") == other.load("pending") == {"lead_data": {"location": "Surat"}}
+    print("Pending state visible before and after a flush")
+    store.close()
+    other.close()
+    # Two processes answering the same conversation: the later save conflicts instead of overwriting
+    shared_path = os.path.join(tempfile.mkdtemp(), "shared.db")
+    first, second = (SessionManager(store=SQLiteSessionStore(shared_path, flush_interval=0), shared=True) for _ in range(2))
+    ours, theirs = first.get("shared"), second.get("shared")
+    theirs.lead_data["location"] = "Nagpur"
+    second.save(theirs)
+    ours.lead_data["location"] = "Indore"
+    try:
+        first.save(ours)
+        raise AssertionError("Stale save was not rejected")
+    except SessionConflict:
+        pass
+    assert ours.lead_data["location"] == "Nagpur" and ours.version == 1
+    first.save(ours)
+    print(f"Conflicting save rejected: {first.stats()['session_conflicts']}, then saved as version {ours.version}")
+    first.store.close()
+    second.store.close()
+    
+    # Test telemetry: spans, tool counts and a sampled turn trace
+    print("\nTelemetry:")
+    trace_path = os.path.join(tempfile.mkdtemp(), "traces.jsonl")
+    telemetry = Telemetry(sample_rate=1.0, jsonl_path=trace_path)
+    trace = telemetry.start_turn("demo")
+    with telemetry.activate(trace):
+        with telemetry.span("tool", tool="tool_pricing_info"):
+            get_pricing_info()
+        telemetry.record_tool("tool_pricing_info")
+    telemetry.finish_turn(trace)
+    print(telemetry.prometheus_text().splitlines()[-1])
+    with open(trace_path) as f:
+        print(f"Trace: {json.loads(f.readline())['spans']}")
+    telemetry.close()
+    
+    # Test the model cascade with mock small and large models
+    print("\nModel Cascade:")
+    from agents import set_tracing_disabled
+    from src.agent import PareAgent
+    set_tracing_disabled(True)
+    small = MockModel(script=[
+        tool_call("tool_lead_capture", field="location", value="Pune"),
+        tool_call("tool_lead_capture", value="Mumbai"),
+        "I'm not sure which panel fits.",
+    ])
+    large = MockModel(responder=lambda input: "Our Linea panels suit living rooms well.")
+    agent = PareAgent(model=large, small_model=small, session_store=InMemorySessionStore(), telemetry=Telemetry())
+    for message in [
+        "Pune",
+        "actually the site is in Mumbai",
+        "which panel for my living room",
+        "We are renovating a villa. Which panels suit the facade? And do they fade in the sun?",
+    ]:
+        result = agent.process_message("cascade", message)
+        print(f"{message!r} -> {result['model_tier']}: {result['response'][:60]!r}")
+    print(f"Stats: {agent.cascade.stats()}")
+    streamed = PareAgent(
+        model=MockModel(responder=lambda input: "Large answer."),
+        small_model=MockModel(script=["Our Linea panels suit living rooms well, and they come in wooden and pastel finishes for every budget."]),
+        session_store=InMemorySessionStore(),
+        telemetry=Telemetry(),
+    )
+    events = list(streamed.stream_message("cascade-stream", "which panel for my living room"))
+    deltas = [event for event in events if event["type"] == "text_delta"]
+    assert len(deltas) > 1 and events[-1]["model_tier"] == "small"
+    print(f"Streamed small-model reply in {len(deltas)} deltas")
+    for message in ["कंपनी के बारे में बताइए", "ok", "price?"]:
+        result = agent.process_message("localized", message)
+        print(f"{message!r} -> {result['response'].strip()[:50]!r}")
+    
+    # Test tool results: three tool calls in one model step are merged in call order, with timings
+    print("\nTool Results:")
+    agent = PareAgent(
+        model=MockModel(script=[[
+            tool_call("tool_product_info", product_category="wall"),
+            tool_call("tool_send_brochure", brochure_type="easy+"),
+            tool_call("tool_pricing_info", product="wall"),
+        ]]),
+        small_model=None,
+        session_store=InMemorySessionStore(),
+        telemetry=Telemetry(),
+    )
+    result = agent.process_message("results", "Tell me about wall panels, send the brochure and the price")
+    print(f"Reply: {[line for line in result['response'].splitlines() if line.strip()]}")
+    print(f"Brochures: {result['brochures']}")
+    print(f"Timed tools: {[timing['tool'] for timing in result['tool_timings']]}")
+    
+    # Test the local lead form in a conversation: a plain answer to a lead prompt needs no model call
+    print("\nLead Form Turns:")
+    os.environ["LEAD_INDEX_PATH"] = os.path.join(tempfile.mkdtemp(), "lead_index.db")
+    agent = PareAgent(
+        model=MockModel(script=[tool_call("tool_lead_capture", field="requirement_type", value="a commercial project in Pune")]),
+        small_model=None,
+        session_store=InMemorySessionStore(),
+        telemetry=Telemetry(),
+    )
+    for message in ["We need panels for a commercial project in Pune", "a restaurant", "around do hazaar sq ft"]:
+        result = agent.process_message("lead-form", message)
+        print(f"{message!r} -> fast path {result['fast_path']}, model calls {result['usage']['model_calls']}: {result['response']!r}")
+    
+    # Test admission control: a 429 is retried, and lead-capture calls are admitted first
+    print("\nAdmission Control:")
+    import httpx
+    import openai
+    from src.utils.admission import AdmissionController, LEAD_CAPTURE, NEW_CONVERSATION
+    rate_limited = openai.RateLimitError(
+        "Rate limit reached",
+        response=httpx.Response(429, headers={"retry-after": "0"}, request=httpx.Request("POST", "https://api.openai.com/v1/responses")),
+        body=None,
+    )
+    admission = AdmissionController(requests_per_minute=600, max_concurrency=4, telemetry=Telemetry())
+    agent = PareAgent(
+        model=MockModel(script=[rate_limited, "Happy to help with your project!"]),
+        small_model=None,
+        session_store=InMemorySessionStore(),
+        telemetry=Telemetry(),
+        admission=admission,
+    )
+    result = agent.process_message("admission", "which panel for my living room")
+    print(f"After a 429: {result['response']!r}, concurrency limit {admission.limit}")
+    
+    async def admit_in_order():
+        controller = AdmissionController(max_concurrency=1, telemetry=Telemetry())
+        held = await controller.acquire(NEW_CONVERSATION, 100)
+        order = []
+        
+        async def call(priority):
+            ticket = await controller.acquire(priority, 100)
+            order.append(priority)
+            controller.release(ticket, used_tokens=100)
+        
+        waiting = [asyncio.create_task(call(NEW_CONVERSATION)), asyncio.create_task(call(LEAD_CAPTURE))]
+        await asyncio.sleep(0.01)
+        controller.release(held, used_tokens=100)
+        await asyncio.gather(*waiting)
+        print(f"Admitted in order: {order}")
+        print(f"Stats: {controller.stats()['priorities']}")
+    
+    asyncio.run(admit_in_order())
+    
+    # Test the turn deadline: a slow model is given up on and the turn is answered locally,
+    # the circuit opens after repeated misses, and a slow call is hedged
+    print("\nDeadline and Degraded Mode:")
+    import itertools
+    from agents import ModelSettings
+    from agents.models.interface import ModelTracing
+    from src.utils.deadline import CircuitBreaker
+    from src.utils.hedging import HedgedModel
+    telemetry = Telemetry()
+    agent = PareAgent(
+        model=MockModel(responder=lambda input: "Sorry for the wait!", latency=0.5),
+        small_model=None,
+        session_store=InMemorySessionStore(),
+        telemetry=telemetry,
+        turn_deadline=0.1,
+        circuit_breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60, telemetry=telemetry),
+    )
+    for message in ["We are renovating our office in Pune", "hmm, what would you suggest", "tell me more"]:
+        start = time.perf_counter()
+        result = agent.process_message("deadline", message)
+        print(f"{message!r} -> degraded {result['degraded']} in {time.perf_counter() - start:.1f}s: {result['response']!r}")
+    events = list(agent.stream_message("deadline-stream", "what would you suggest"))
+    print(f"Streamed: {[event['type'] for event in events]}, degraded {events[-1]['degraded']}")
+    print(f"Breaker: {agent.breaker.stats()}")
+    counters = telemetry.snapshot()["counters"]
+    print(f"Metrics: {({name: value for name, value in counters.items() if 'deadline' in name or 'degraded' in name or 'circuit' in name})}")
+    
+    latencies = itertools.chain([0.01] * 20, [0.5], itertools.repeat(0.01))
+    telemetry = Telemetry()
+    hedged = HedgedModel(MockModel(responder=lambda input: "ok", latency=lambda: next(latencies)), telemetry=telemetry)
+    
+    async def hedge():
+        for _ in range(21):
+            start = time.perf_counter()
+            await hedged.get_response(None, "hi", ModelSettings(), [], None, [], ModelTracing.DISABLED)
+        print(f"Slow call answered in {time.perf_counter() - start:.2f}s after a hedge at {hedged.hedge_delay():.2f}s")
+        print(f"Hedges: {telemetry.snapshot()['counters']}")
+    
+    asyncio.run(hedge())
+    
+    # Behind admission control, a slow call is not hedged while another call waits for admission
+    from src.utils.admission import AdmissionModel
+    latencies = itertools.chain([0.01] * 20, [0.5], itertools.repeat(0.01))
+    telemetry = Telemetry()
+    controller = AdmissionController(max_concurrency=1, telemetry=telemetry)
+    hedged = HedgedModel(MockModel(responder=lambda input: "ok", latency=lambda: next(latencies)), telemetry=telemetry, admission=controller)
+    admitted = AdmissionModel(hedged, controller)
+    
+    async def saturated():
+        call = lambda: admitted.get_response(None, "hi", ModelSettings(), [], None, [], ModelTracing.DISABLED)
+        for _ in range(20):
+            await call()
+        await asyncio.gather(call(), call())
+        assert "model_hedges_total" not in telemetry.snapshot()["counters"]
+        print("No hedges while the admission queue is non-empty")
+    
+    asyncio.run(saturated())
+    
+    # Test the chat API: two workers sharing one session database serve the same conversation
+    print("\nChat API:")
+    from src.api import ChatAPI
+    db_path = os.path.join(tempfile.mkdtemp(), "sessions.db")
+    workers = [
+        ChatAPI(lambda: PareAgent(
+            model=MockModel(responder=lambda input: "Noted, thank you!"),
+            session_store=SQLiteSessionStore(db_path, flush_interval=0),
+            shared_sessions=True,
+            telemetry=Telemetry(),
+        ))
+        for _ in range(2)
+    ]
+    
+    async def chat():
+        status, body = await asgi_request(workers[0], "POST", "/sessions")
+        session_id = json.loads(body)["session_id"]
+        print(f"POST /sessions -> {status}")
+        status, body = await asgi_request(workers[0], "POST", f"/sessions/{session_id}/messages", {"message": "We need it for our office"})
+        print(f"Worker 1 message -> {status}: {json.loads(body)['response']}")
+        status, body = await asgi_request(workers[1], "POST", f"/sessions/{session_id}/messages", {"message": "Pune", "stream": True})
+        print(f"Worker 2 streamed events -> {status}: {[line[7:] for line in body.decode().splitlines() if line.startswith('event: ')]}")
+        status, body = await asgi_request(workers[0], "GET", f"/sessions/{session_id}")
+        print(f"Worker 1 sees {len(json.loads(body)['messages'])} messages")
+        status, _ = await asgi_request(workers[1], "POST", f"/sessions/{session_id}/reset")
+        status, body = await asgi_request(workers[0], "GET", f"/sessions/{session_id}")
+        print(f"After reset on worker 2, worker 1 GET -> {status}")
+        assert status == 404
+        # Concurrent messages on two workers: the slower, streamed one ends with a conflict event
+        status, body = await asgi_request(workers[0], "POST", f"/sessions/{session_id}/messages", {"message": "tell me more"})
+        slow = ChatAPI(lambda: PareAgent(
+            model=MockModel(responder=lambda input: "Let me check.", latency=0.3),
+            session_store=SQLiteSessionStore(db_path, flush_interval=0),
+            shared_sessions=True,
+            telemetry=Telemetry(),
+        ))
+        (_, streamed), (status, _) = await asyncio.gather(
+            asgi_request(slow, "POST", f"/sessions/{session_id}/messages", {"message": "hmm, what would you suggest", "stream": True}),
+            asgi_request(workers[1], "POST", f"/sessions/{session_id}/messages", {"message": "hmm, anything else?"}),
+        )
+        events = [line[7:] for line in streamed.decode().splitlines() if line.startswith("event: ")]
+        assert status == 200 and events[-1] == "conflict", events
+        print(f"Concurrent streamed message -> {events}")
+        status, body = await asgi_request(workers[0], "POST", f"/sessions/{session_id}/messages", {})
+        print(f"Empty message -> {status}: {json.loads(body)['error']}")
+        status, body = await asgi_request(workers[0], "GET", "/health")
+        print(f"GET /health -> {status}: {json.loads(body)['status']}")
+    
+    asyncio.run(chat())
+    
     print("\n=== All Tests Complete ===")
 
 if __name__ == "__main__":